@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+from signal_codes import CASH_CODE, NIL_CODE, CodedSignals
+
+
+@dataclass
+class AlignmentReport:
+    n_prices: int
+    n_signals: int
+    matched: int  # price bars with a signal at exactly the same timestamp
+    filled: int  # price bars carried forward from an earlier signal
+    stale: int  # price bars whose last signal was older than max_staleness
+    unmatched_prices: int  # price bars left without any signal
+    unmatched_signals: int  # signal timestamps that never hit a price bar
+    duplicate_signals: int  # signal rows dropped because their timestamp repeats
+    offset: int = 0  # signal timestamps look shifted by this much from the price timestamps
+    early_signals: int = 0  # signals timestamped before the first price bar
+
+    def has_issues(self) -> bool:
+        return bool(
+            self.unmatched_prices or self.unmatched_signals or self.duplicate_signals or self.offset or self.early_signals
+        )
+
+    def describe(self) -> str:
+        text = (
+            f"aligned {self.n_signals} signals to {self.n_prices} bars | "
+            f"matched: {self.matched} | filled: {self.filled} | stale: {self.stale} | "
+            f"unmatched bars: {self.unmatched_prices} | unmatched signals: {self.unmatched_signals} | "
+            f"duplicates: {self.duplicate_signals}"
+        )
+        if self.offset:
+            text += (
+                f"\nwarning: signal timestamps look shifted by {self.offset:+d} from the price timestamps, "
+                "so signals land on the wrong bars; relabel them, or drop their timestamp column to align by row"
+            )
+        if self.early_signals:
+            text += f"\nwarning: {self.early_signals} signals are timestamped before the first price bar"
+        return text
+
+
+def timestamp_offset(price_ts: np.ndarray, signal_ts: np.ndarray) -> int:
+    """
+    Constant shift d such that signal_ts - d lands on more price bars than
+    signal_ts itself, or 0 if there is none.
+
+    Candidates are the difference shared by most pairs of i-th signal and
+    i-th price timestamp, counted from the start and from the end. Both
+    arrays must be sorted and free of repeats.
+    """
+    m = min(len(price_ts), len(signal_ts))
+    if not m:
+        return 0
+    best, best_hits = 0, int(np.isin(signal_ts, price_ts).sum())
+    for diffs in (signal_ts[:m] - price_ts[:m], signal_ts[-m:] - price_ts[-m:]):
+        values, counts = np.unique(diffs, return_counts=True)
+        if counts.max() * 2 <= m:  # no difference shared by most pairs: sparse or irregular signals
+            continue
+        d = int(values[counts.argmax()])
+        hits = int(np.isin(signal_ts - d, price_ts).sum())
+        if d and hits > best_hits:
+            best, best_hits = d, hits
+    return best
+
+
+def align_signals(
+    price_ts: np.ndarray,
+    signal_ts: np.ndarray,
+    signal_codes: np.ndarray,
+    ffill: bool = False,
+    max_staleness: Optional[int] = None,
+    fill_code: int = NIL_CODE,
+) -> Tuple[np.ndarray, AlignmentReport]:
+    """
+    Merge-asof style join of coded signals onto the price timestamps.
+
+    Signals are sorted once (stable, so the last row wins for a repeated
+    timestamp) and every price bar is located with a binary search, which
+    keeps the whole join at O((n + m) log m).
+
+    With ffill=False only exact timestamp matches are used. With ffill=True
+    the most recent earlier signal is carried forward, unless it is more than
+    max_staleness timestamp units old. Bars without a usable signal get
+    fill_code. Signals whose timestamps sit a constant offset away from the
+    prices, or start before the first bar, are flagged in the report: the
+    join would silently move them onto other bars.
+    """
+    price_ts = np.asarray(price_ts, dtype=np.int64)
+    signal_ts = np.asarray(signal_ts, dtype=np.int64)
+    signal_codes = np.asarray(signal_codes, dtype=np.int8)
+    if signal_ts.shape != signal_codes.shape:
+        raise ValueError("Signal timestamps and codes must have the same length")
+
+    order = np.argsort(signal_ts, kind="stable")
+    sorted_ts = signal_ts[order]
+    sorted_codes = signal_codes[order]
+    # keep the last row of each run of equal timestamps
+    last_of_run = np.ones(len(sorted_ts), dtype=bool)
+    last_of_run[:-1] = sorted_ts[1:] != sorted_ts[:-1]
+    uniq_ts = sorted_ts[last_of_run]
+    uniq_codes = sorted_codes[last_of_run]
+    duplicates = len(sorted_ts) - len(uniq_ts)
+
+    aligned = np.full(len(price_ts), fill_code, dtype=np.int8)
+    pos = np.searchsorted(uniq_ts, price_ts, side="right") - 1
+    has_prev = pos >= 0
+    safe_pos = np.where(has_prev, pos, 0)
+    exact = has_prev & (uniq_ts[safe_pos] == price_ts) if len(uniq_ts) else has_prev
+    aligned[exact] = uniq_codes[safe_pos[exact]]
+
+    filled = 0
+    stale = 0
+    if ffill and len(uniq_ts):
+        carry = has_prev & ~exact
+        if max_staleness is not None:
+            too_old = carry & (price_ts - uniq_ts[safe_pos] > max_staleness)
+            stale = int(too_old.sum())
+            carry &= ~too_old
+        aligned[carry] = uniq_codes[safe_pos[carry]]
+        filled = int(carry.sum())
+
+    matched = int(exact.sum())
+    # signals whose timestamp never appears on the price timeline
+    sorted_prices = np.sort(price_ts)
+    offset = timestamp_offset(np.unique(sorted_prices), uniq_ts)
+    early = int((uniq_ts < sorted_prices[0]).sum()) if len(sorted_prices) else 0
+    hit = np.searchsorted(sorted_prices, uniq_ts, side="left")
+    hit_ok = hit < len(sorted_prices)
+    hit_ok[hit_ok] = sorted_prices[hit[hit_ok]] == uniq_ts[hit_ok]
+
+    report = AlignmentReport(
+        n_prices=len(price_ts),
+        n_signals=len(signal_ts),
+        matched=matched,
+        filled=filled,
+        stale=stale,
+        unmatched_prices=len(price_ts) - matched - filled,
+        unmatched_signals=int((~hit_ok).sum()),
+        duplicate_signals=int(duplicates),
+        offset=offset,
+        early_signals=early,
+    )
+    return aligned, report
+
+
+def align_positional(
+    n_prices: int,
+    signal_codes: np.ndarray,
+    pad_code: int,
+) -> Tuple[np.ndarray, AlignmentReport]:
+    """
+    Align signals that carry no timestamp column by row order.
+
+    Shorter signal arrays are padded with pad_code, longer ones truncated.
+    """
+    signal_codes = np.asarray(signal_codes, dtype=np.int8)
+    aligned = np.full(n_prices, pad_code, dtype=np.int8)
+    n = min(n_prices, len(signal_codes))
+    aligned[:n] = signal_codes[:n]
+    report = AlignmentReport(
+        n_prices=n_prices,
+        n_signals=len(signal_codes),
+        matched=n,
+        filled=0,
+        stale=0,
+        unmatched_prices=n_prices - n,
+        unmatched_signals=len(signal_codes) - n,
+        duplicate_signals=0,
+    )
+    return aligned, report
+
+
+def align_to_prices(
+    price_ts: np.ndarray,
+    signals: CodedSignals,
+    ffill: bool = False,
+    max_staleness: Optional[int] = None,
+) -> Tuple[np.ndarray, AlignmentReport]:
+    """Join on timestamp when signals have one, else align by row order padding with cash."""
+    if signals.timestamps is not None:
+        return align_signals(price_ts, signals.timestamps, signals.codes, ffill=ffill, max_staleness=max_staleness)
+    return align_positional(len(price_ts), signals.codes, pad_code=CASH_CODE)
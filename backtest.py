@@ -1,31 +1,69 @@
+from __future__ import annotations
+
 import argparse
 from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional, Tuple, Union
+
+import instrument
 
-import pandas as pd
+# pandas/numpy and the engine modules are imported where they are used, so
+# `--help` and argument errors return without paying their import cost.
+if TYPE_CHECKING:
+    import pandas as pd
 
-from utils import Portfolio, TradeExecutor, Evaluator
+    from execution import FillPrices
+    from results_io import ResultColumns, ResultWriter
+    from signal_codes import CodedSignals, SymbolTable
 
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Multi-product trading simulation")
     p.add_argument("--prices", required=True, help="Path to prices CSV")
-    p.add_argument("--signals", required=True, help="Path to signals CSV")
+    p.add_argument("--signals", required=True, help="Path to signals CSV (or .npz codes)")
     p.add_argument("--initial_capital", type=float, default=1000.0, help="Initial capital in base currency")
     p.add_argument("--tx_cost", type=float, default=0.0, help="Transaction cost as fraction (e.g. 0.001)")
     p.add_argument("--cash_symbol", type=str, default="ORBS", help="Symbol representing cash")
-    p.add_argument("--output_csv", type=str, default="results/results.csv", help="Output results CSV path")
+    p.add_argument("--output_csv", type=str, default="results/results.csv", help="Output results path (.csv, .npz, .npy memmap, .parquet or .rec append-only store)")
+    p.add_argument("--chunk_size", type=int, default=100_000, help="Bars per chunk streamed to the results file")
     p.add_argument("--summary", type=str, default="results/summary.txt", help="Summary report output path")
     p.add_argument("--risk_free", type=float, default=0.0, help="Annual risk-free rate for Sharpe")
     p.add_argument("--log", type=bool, default=False, help="Turn on logging")
+    p.add_argument("--execution", choices=("close", "next_open", "vwap"), default="close", help="Fill trades at close, the next bar's open, or the next bar's typical price")
+    p.add_argument("--slippage", type=float, default=0.0, help="Slippage as a fraction of the fill bar's high-low range")
+    p.add_argument("--ffill", action="store_true", help="Carry the last signal forward onto bars without one")
+    p.add_argument("--max_staleness", type=int, default=None, help="With --ffill, max timestamp gap a signal is carried over")
+    p.add_argument("--start", type=float, default=None, help="Only backtest bars with timestamp >= start (reads just that part of the prices)")
+    p.add_argument("--end", type=float, default=None, help="Only backtest bars with timestamp <= end")
+    p.add_argument("--rolling", type=int, nargs="+", default=None, help="Window lengths for rolling metrics, written next to the results as *_rolling.csv")
+    instrument.add_argument(p)
     return p.parse_args()
 
 
-def load_prices(path: str) -> pd.DataFrame:
-    df = pd.read_csv(path)
+def load_raw_prices(path: str, start: Optional[float] = None, end: Optional[float] = None) -> pd.DataFrame:
+    """
+    Every column of a prices file, optionally only the rows with
+    start <= timestamp <= end (read through price_index), indexed from 0.
+    """
+    from price_index import read_price_range
+
+    raw = read_price_range(path, start, end).reset_index(drop=True)
+    if raw.empty and (start is not None or end is not None):
+        raise ValueError(f"No price rows between {start} and {end}")
+    return raw
+
+
+def load_prices(path: str, start: Optional[float] = None, end: Optional[float] = None) -> pd.DataFrame:
+    """CLOSE prices of load_raw_prices."""
+    return close_prices(load_raw_prices(path, start, end))
+
+
+def close_prices(df: pd.DataFrame) -> pd.DataFrame:
+    from signal_codes import PRODUCTS
+
     if "timestamp" not in df.columns:
         raise ValueError("Prices CSV must contain a 'timestamp' column")
 
-    allproducts = ["PHOENIX_FEATHERS", "UNICORN_HORNS", "ELVEN_WINE", "VAMPIRE_BLOOD"]
+    allproducts = PRODUCTS
 
     # Pick out only CLOSE columns we care about
     close_cols = [f"CLOSE_{p}" for p in allproducts if f"CLOSE_{p}" in df.columns]
@@ -36,21 +74,18 @@ def load_prices(path: str) -> pd.DataFrame:
     # Rename CLOSE_P1 → P1, CLOSE_P2 → P2, etc.
     rename_map = {f"CLOSE_{p}": p for p in allproducts if f"CLOSE_{p}" in df.columns}
     df = df[["timestamp"] + close_cols].rename(columns=rename_map)
-    # print(df)
     return df
 
 
-def load_signals(path: str) -> pd.DataFrame:
-    sdf = pd.read_csv(path)
-    # support either a single 'signal' column or (timestamp, signal)
-    if "signal" not in sdf.columns:
-        raise ValueError("Signals CSV must contain a 'signal' column")
+def load_signals(path: str, table: SymbolTable) -> CodedSignals:
+    # support either a single 'signal' column or (timestamp, signal), as CSV or .npz codes
     # If there is a timestamp column, use it to align; else index assumes same order as prices
-    sdf["signal"] = sdf["signal"].astype(str)
-    return sdf
+    from signal_codes import read_signals
 
+    return read_signals(path, table)
 
-def write_summary(summary_path: str, metrics: dict) -> None:
+
+def format_summary(metrics: dict) -> str:
     lines = [
         f"final_value: {metrics['final_value']:.6f}",
         f"total_trades: {metrics['total_trades']}",
@@ -58,35 +93,108 @@ def write_summary(summary_path: str, metrics: dict) -> None:
         f"volatility: {metrics['volatility']:.6f}",
         f"sharpe: {metrics['sharpe']:.6f}",
     ]
-    Path(summary_path).write_text("\n".join(lines), encoding="utf-8")
-    print("\n".join(lines))
+    return "\n".join(lines)
+
+
+def write_summary(summary_path: str, metrics: dict) -> None:
+    text = format_summary(metrics)
+    Path(summary_path).write_text(text, encoding="utf-8")
+    print(text)
+
+
+def run_backtest(
+    prices: pd.DataFrame,
+    signals: Union[pd.DataFrame, CodedSignals],
+    initial_capital: float = 1000.0,
+    tx_cost: float = 0.0,
+    cash_symbol: str = "ORBS",
+    risk_free: float = 0.0,
+    log: bool = False,
+    ffill: bool = False,
+    max_staleness: Optional[int] = None,
+    writer: Optional[ResultWriter] = None,
+    chunk_size: int = 100_000,
+    verbose: bool = False,
+    fills: Optional[FillPrices] = None,
+) -> Tuple[Dict[str, float], ResultColumns]:
+    """Backtest in-memory prices and signals; returns the summary metrics and result columns."""
+    import pandas as pd
+
+    from utils import Evaluator, Portfolio, TradeExecutor
+
+    portfolio = Portfolio(initial_capital=initial_capital, transaction_cost=tx_cost, cash_symbol=cash_symbol,log = log)
+    # Signals are joined to prices on timestamp (or by row order if they have none)
+    executor = TradeExecutor(
+        portfolio=portfolio,
+        price_df=prices,
+        signal_df=signals,
+        cash_symbol=cash_symbol,
+        ffill=ffill,
+        max_staleness=max_staleness,
+        fills=fills,
+    )
+    if verbose and executor.alignment.has_issues():
+        print(executor.alignment.describe())
+    results = executor.run_columns(writer=writer, chunk_size=chunk_size)
+    evaluator = Evaluator(pd.Series(results.value), timestamps=results.timestamp)
+    metrics = evaluator.summary(portfolio, risk_free_rate=risk_free)
+    return metrics, results
 
 
 def main() -> None:
     args = parse_args()
     Path(args.output_csv).parent.mkdir(parents=True, exist_ok=True)
     Path(args.summary).parent.mkdir(parents=True, exist_ok=True)
+    with instrument.session(args.instrument, args.instrument_top):
+        _run(args)
+
+
+def _run(args: argparse.Namespace) -> None:
+    from results_io import open_result_writer
+    from signal_codes import SymbolTable
+
+    with instrument.stage("load_prices"):
+        # the OHLC fills below need the other columns of the same rows
+        raw = load_raw_prices(args.prices, args.start, args.end)
+        prices = close_prices(raw)
+    product_cols = [c for c in prices.columns if c != "timestamp"]
+    table = SymbolTable(product_cols, cash_symbol=args.cash_symbol)
+    with instrument.stage("load_signals"):
+        signals = load_signals(args.signals, table)
+
+    fills = None
+    if args.execution != "close" or args.slippage:
+        from execution import fill_prices, load_ohlc
+
+        fills = fill_prices(load_ohlc(raw, product_cols), args.execution, args.slippage)
+
+    # Save results, streamed in chunks in the format picked by the extension
+    with instrument.stage("simulate"), open_result_writer(args.output_csv, table, len(prices)) as writer:
+        metrics, results = run_backtest(
+            prices,
+            signals,
+            initial_capital=args.initial_capital,
+            tx_cost=args.tx_cost,
+            cash_symbol=args.cash_symbol,
+            risk_free=args.risk_free,
+            log=args.log,
+            ffill=args.ffill,
+            max_staleness=args.max_staleness,
+            writer=writer,
+            chunk_size=args.chunk_size,
+            verbose=True,
+            fills=fills,
+        )
+    write_summary(args.summary, metrics)
 
+    if args.rolling:
+        from rolling import rolling_from_results
 
-    prices = load_prices(args.prices)
-    signals = load_signals(args.signals)
-
-    # Align lengths: if signals shorter, reindex; if longer, truncate
-    if len(signals) < len(prices):
-        # forward fill last signal if desired; here we align by index and pad with ORBS
-        signals = signals.reindex(range(len(prices))).fillna("ORBS")
-    elif len(signals) > len(prices):
-        signals = signals.iloc[: len(prices)]
-
-    portfolio = Portfolio(initial_capital=args.initial_capital, transaction_cost=args.tx_cost, cash_symbol=args.cash_symbol,log = args.log)
-    executor = TradeExecutor(portfolio=portfolio, price_df=prices, signal_df=signals, cash_symbol=args.cash_symbol)
-    results = executor.run()
-
-    # Save results CSV
-    results.to_csv(args.output_csv, index=False)  
-    evaluator = Evaluator(results["new_portfolio_value"]) 
-    metrics = evaluator.summary(portfolio, risk_free_rate=args.risk_free)
-    write_summary(args.summary, metrics)
+        with instrument.stage("rolling"):
+            out = Path(args.output_csv)
+            rolling_from_results(results, args.rolling, risk_free=args.risk_free).to_csv(
+                out.with_name(f"{out.stem}_rolling.csv"), index=False
+            )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import itertools
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import instrument
+
+# Backtest parameters a batch may vary per job.
+PARAM_NAMES = ("initial_capital", "tx_cost", "cash_symbol", "risk_free", "ffill", "max_staleness")
+
+LEDGER = "completed.jsonl"
+
+
+def expand_prices(patterns: Sequence[str], manifest: Optional[str] = None) -> List[str]:
+    """Price files from glob patterns and/or a manifest (one path per line, '#' comments)."""
+    paths: List[str] = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches and not glob.has_magic(pattern):
+            matches = [pattern]
+        paths.extend(matches)
+    if manifest:
+        base = Path(manifest).resolve().parent
+        for line in Path(manifest).read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                path = Path(line)
+                paths.append(str(path if path.is_absolute() else base / path))
+    # keep the first occurrence of each file
+    seen = set()
+    unique = []
+    for p in paths:
+        resolved = str(Path(p).resolve())
+        if resolved not in seen:
+            seen.add(resolved)
+            unique.append(resolved)
+    return unique
+
+
+def expand_params(grid: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Cartesian product of a {param: value or [values]} grid."""
+    unknown = set(grid) - set(PARAM_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown backtest parameters: {sorted(unknown)}")
+    names = sorted(grid)
+    values = [v if isinstance(v, list) else [v] for v in (grid[n] for n in names)]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+def _fingerprint(path: str) -> str:
+    st = os.stat(path)
+    return f"{path}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def job_key(prices: str, strategy: str, params: Dict[str, Any]) -> str:
+    """Identifies a job by its inputs; an edited price or strategy file gets a new key."""
+    payload = json.dumps([_fingerprint(prices), _fingerprint(strategy), params], sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def read_ledger(path: Path) -> Dict[str, Dict[str, Any]]:
+    """Finished jobs by key; the last record of a key wins, a torn last line is ignored."""
+    records: Dict[str, Dict[str, Any]] = {}
+    if not path.exists():
+        return records
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record["key"]] = record
+    return records
+
+
+def _summary_name(record: Dict[str, Any]) -> str:
+    return f"{Path(record['prices']).stem}-{Path(record['strategy']).stem}-{record['key'][:10]}.txt"
+
+
+def run_batch(
+    prices: Sequence[str],
+    strategy: str,
+    param_sets: Sequence[Dict[str, Any]],
+    out_dir: str,
+    workers: Optional[int] = None,
+    max_tasks_per_child: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run strategy + backtest for every (price file, params) pair and record each as it finishes.
+
+    Jobs already in out_dir's ledger with status "ok" are skipped, so a killed
+    run picks up where it stopped. Workers evict each price file once its job
+    is done, so memory stays at about one file per worker.
+    """
+    from backtest import format_summary
+    from worker_pool import StrategyWorkerPool
+
+    out = Path(out_dir)
+    (out / "summaries").mkdir(parents=True, exist_ok=True)
+    ledger_path = out / LEDGER
+    done = {k for k, r in read_ledger(ledger_path).items() if r["status"] == "ok"}
+
+    strategy = str(Path(strategy).resolve())
+    pending = []
+    for path in prices:
+        for params in param_sets:
+            key = job_key(path, strategy, params)
+            if key not in done:
+                pending.append({"key": key, "prices": path, "strategy": strategy, "params": params})
+    print(f"{len(pending)} jobs to run, {len(prices) * len(param_sets) - len(pending)} already done")
+
+    if pending:
+        jobs = (
+            {"op": "pipeline", "strategy": strategy, "prices": j["prices"], "params": j["params"], "evict": True}
+            for j in pending
+        )
+        with StrategyWorkerPool(workers, preload_strategies=[strategy], maxtasksperchild=max_tasks_per_child) as pool, \
+                ledger_path.open("a", encoding="utf-8") as ledger:
+            for n, (i, status, payload) in enumerate(pool.imap(jobs), 1):
+                record = dict(pending[i], status=status)
+                if status == "ok":
+                    record["metrics"] = payload
+                    (out / "summaries" / _summary_name(record)).write_text(format_summary(payload), encoding="utf-8")
+                else:
+                    record["error"] = payload
+                ledger.write(json.dumps(record) + "\n")
+                ledger.flush()
+                os.fsync(ledger.fileno())
+                print(f"[{n}/{len(pending)}] {status} {Path(record['prices']).name} {record['params']}")
+
+    return write_aggregate(out)
+
+
+def _rows(records: Dict[str, Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    for r in records.values():
+        row = {"prices": r["prices"], "strategy": r["strategy"], "status": r["status"], "key": r["key"]}
+        row.update({f"param_{k}": v for k, v in r["params"].items()})
+        row.update(r.get("metrics") or {})
+        if r["status"] != "ok":
+            row["error"] = r.get("error")
+        yield row
+
+
+def write_aggregate(out_dir: Path) -> List[Dict[str, Any]]:
+    """Rebuild summary.csv from every job in the ledger, including earlier runs."""
+    import pandas as pd
+
+    rows = list(_rows(read_ledger(out_dir / LEDGER)))
+    if rows:
+        pd.DataFrame(rows).to_csv(out_dir / "summary.csv", index=False)
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a strategy and backtest over many price files")
+    parser.add_argument("--prices", nargs="*", default=[], help="Price files or glob patterns (quote globs)")
+    parser.add_argument("--manifest", default=None, help="Text file listing price files, one per line")
+    parser.add_argument("--strategy", required=True, help="Strategy script (build_signals or --input/--output)")
+    parser.add_argument("--params", default="{}", help='Backtest parameter grid as JSON, e.g. \'{"tx_cost": [0, 0.001]}\'')
+    parser.add_argument("--out_dir", default="results/batch", help="Where summaries, the ledger and summary.csv go")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--max_tasks_per_child", type=int, default=None, help="Recycle workers after this many jobs")
+    parser.add_argument("--restart", action="store_true", help="Ignore the ledger and rerun every job")
+    instrument.add_argument(parser)
+    args = parser.parse_args()
+
+    with instrument.session(args.instrument, args.instrument_top):
+        prices = expand_prices(args.prices, args.manifest)
+        if not prices:
+            parser.error("no price files given (use --prices and/or --manifest)")
+        param_sets = expand_params(json.loads(args.params))
+        if args.restart:
+            Path(args.out_dir, LEDGER).unlink(missing_ok=True)
+
+        rows = run_batch(prices, args.strategy, param_sets, args.out_dir, args.workers, args.max_tasks_per_child)
+        failed = sum(r["status"] != "ok" for r in rows)
+        print(f"{len(rows)} jobs recorded in {Path(args.out_dir) / 'summary.csv'}" + (f", {failed} failed" if failed else ""))
+
+
+if __name__ == "__main__":
+    main()
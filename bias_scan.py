@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import argparse
+import heapq
+import json
+import os
+import queue
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import instrument
+
+# numpy, tqdm and the worker pool are imported where they are used, so `--help` stays cheap.
+if TYPE_CHECKING:
+    import numpy as np
+
+    from signal_codes import CodedSignals
+
+# Smallest prefix checked, as in forward_bias.test_forward_bias.
+FIRST_CHECKPOINT = 10
+
+
+def base_checkpoints(n_rows: int, precision: int, start: int = FIRST_CHECKPOINT) -> List[int]:
+    """The evenly spaced prefix lengths test_forward_bias checks."""
+    return list(range(start, n_rows, max(1, n_rows // precision)))
+
+
+def bisection_depths(m: int) -> List[int]:
+    """
+    Depth of each of m sorted points in a coarse-to-fine bisection: the two
+    ends at depth 0, the midpoint at 1, the quarter points at 2, and so on.
+    """
+    depth = [0] * m
+    if m < 3:
+        return depth
+    spans = [(0, m - 1)]
+    level = 1
+    while spans:
+        nxt = []
+        for lo, hi in spans:
+            if hi - lo < 2:
+                continue
+            mid = (lo + hi) // 2
+            depth[mid] = level
+            nxt.extend(((lo, mid), (mid, hi)))
+        spans = nxt
+        level += 1
+    return depth
+
+
+def change_rows(codes: np.ndarray) -> np.ndarray:
+    """Rows where the signal differs from the row before."""
+    import numpy as np
+
+    return np.flatnonzero(codes[1:] != codes[:-1]) + 1
+
+
+def dense_checkpoints(grid: Sequence[int], n_rows: int, changes: np.ndarray, budget: int) -> List[int]:
+    """
+    Up to budget extra prefix lengths, shared between the gaps of grid in
+    proportion to how often the full-run signal changes inside each gap.
+
+    A prefix run can only disagree with the full run where the signal could
+    have come out differently, so busy stretches get looked at more closely.
+    """
+    import numpy as np
+
+    if budget <= 0 or not len(changes) or not len(grid):
+        return []
+    edges = np.append(np.asarray(grid), n_rows)
+    counts = np.diff(np.searchsorted(changes, edges))
+    total = counts.sum()
+    if total == 0:
+        return []
+    raw = budget * counts / total
+    shares = np.floor(raw).astype(int)
+    # hand what flooring left over to the largest remainders
+    shares[np.argsort(shares - raw)[: budget - shares.sum()]] += 1
+    taken = set(grid)
+    extra = []
+    for lo, hi, k in zip(edges[:-1], edges[1:], shares):
+        for p in np.linspace(lo, hi, k + 2)[1:-1].round().astype(int):
+            p = int(p)
+            if p not in taken:
+                taken.add(p)
+                extra.append(p)
+    return sorted(extra)
+
+
+def state_key(strategy: str, prices: str, buffer: int) -> str:
+    from batch import job_key
+
+    return job_key(prices, strategy, {"forward_bias_buffer": buffer})
+
+
+def read_state(path: Path, key: str) -> Dict[int, Dict[str, Any]]:
+    """Finished checkpoints for key, by prefix length; a torn last line is ignored."""
+    records: Dict[int, Dict[str, Any]] = {}
+    if not path.exists():
+        return records
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("key") == key:
+                records[record["n"]] = record
+    return records
+
+
+@dataclass
+class ScanResult:
+    biased: bool
+    checkpoint: Optional[int] = None  # prefix length whose signals disagreed with the full run
+    row: Optional[int] = None  # first row where they disagreed
+    checked: int = 0
+    resumed: int = 0
+    skipped: List[int] = field(default_factory=list)  # checkpoints cancelled after a mismatch
+
+
+def scan_forward_bias(
+    strategy: str,
+    prices: str,
+    precision: int = 250,
+    buffer: int = 5,
+    densify: Optional[int] = None,
+    workers: Optional[int] = None,
+    state: Optional[str] = None,
+) -> ScanResult:
+    """
+    Forward-bias test over prefix runs spread across a worker pool.
+
+    Checks the same checkpoints as test_forward_bias plus up to densify more
+    (default precision // 2) placed where the full-run signal changes most.
+    Checkpoints go out coarse to fine, so a bias anywhere in the file tends to
+    surface within the first few rounds; the first mismatch cancels the rest.
+    With state, every finished checkpoint is appended there and a rerun on
+    unchanged inputs skips them.
+    """
+    import numpy as np
+    from tqdm import tqdm
+
+    from worker_pool import StrategyWorkerPool, price_frame
+
+    strategy = str(Path(strategy).resolve())
+    prices = str(Path(prices).resolve())
+    n_rows = len(price_frame(prices))
+    densify = precision // 2 if densify is None else densify
+    grid = base_checkpoints(n_rows, precision)
+
+    key = state_key(strategy, prices, buffer)
+    state_path = Path(state) if state else None
+    done = read_state(state_path, key) if state_path else {}
+    for n, record in sorted(done.items()):
+        if record["status"] == "bias":
+            return ScanResult(True, n, record.get("row"), resumed=len(done))
+    done = {n: r for n, r in done.items() if r["status"] == "ok"}
+
+    # (depth, -busyness, n): coarse levels first, busy stretches first within a level
+    heap: List[Tuple[int, int, int]] = []
+    depths = bisection_depths(len(grid))
+    for n, depth in zip(grid, depths):
+        if n not in done:
+            heapq.heappush(heap, (depth, 0, n))
+    finest = max(depths, default=0)
+
+    results: queue.Queue = queue.Queue()
+    full: Optional[CodedSignals] = None
+    waiting: Dict[int, CodedSignals] = {}
+    in_flight: set = set()
+    result = ScanResult(False, resumed=len(done))
+    ledger = state_path.open("a", encoding="utf-8") if state_path else None
+
+    def record(entry: Dict[str, Any]) -> None:
+        if ledger is None:
+            return
+        ledger.write(json.dumps(dict(entry, key=key)) + "\n")
+        ledger.flush()
+        os.fsync(ledger.fileno())
+
+    def check(n: int, partial: CodedSignals) -> Optional[int]:
+        m = n - buffer
+        if m <= 0:
+            return None
+        return full.head(m).first_divergence(partial.head(m))
+
+    def reprioritise(changes: np.ndarray) -> None:
+        window = max(1, n_rows // precision)
+        entries = [(d, n) for d, _, n in heap]
+        extra = [n for n in dense_checkpoints(grid, n_rows, changes, densify) if n not in done]
+        entries += [(finest + 1, n) for n in extra]
+        busy = np.searchsorted(changes, [n for _, n in entries]) - np.searchsorted(
+            changes, [n - window for _, n in entries]
+        )
+        heap[:] = [(d, -int(b), n) for (d, n), b in zip(entries, busy)]
+        heapq.heapify(heap)
+        bar.total += len(extra)
+        bar.refresh()
+
+    with StrategyWorkerPool(workers, preload_strategies=[strategy], preload_prices=[prices]) as pool:
+
+        def submit(n: Optional[int]) -> None:
+            job = {"op": "strategy", "strategy": strategy, "prices": prices, "n_rows": n}
+            in_flight.add(n)
+            pool.submit(
+                job,
+                callback=lambda signals, n=n: results.put((n, "ok", signals)),
+                error_callback=lambda e, n=n: results.put((n, "error", f"{type(e).__name__}: {e}")),
+            )
+
+        # a couple of jobs per worker in flight keeps everyone busy without queueing work a mismatch would waste
+        limit = 2 * pool.workers
+        bar = tqdm(total=len(heap), desc="Forward Bias Check", unit="steps")
+        try:
+            submit(None)
+            while in_flight:
+                while heap and len(in_flight) < limit:
+                    submit(heapq.heappop(heap)[2])
+                n, status, payload = results.get()
+                in_flight.discard(n)
+                if status == "error":
+                    record({"n": n, "status": "error", "error": payload})
+                    raise RuntimeError(f"Strategy failed on {'all' if n is None else f'the first {n}'} rows: {payload}")
+                if n is None:
+                    full = payload
+                    reprioritise(change_rows(full.codes))
+                    pending = waiting.items()
+                else:
+                    waiting[n] = payload
+                    if full is None:
+                        continue
+                    pending = [(n, waiting[n])]
+                for m, partial in list(pending):
+                    waiting.pop(m, None)
+                    row = check(m, partial)
+                    result.checked += 1
+                    bar.update()
+                    if row is not None:
+                        record({"n": m, "status": "bias", "row": row})
+                        result.biased, result.checkpoint, result.row = True, m, row
+                        result.skipped = sorted(x for x in in_flight if x is not None) + sorted(x for *_, x in heap)
+                        return result
+                    record({"n": m, "status": "ok"})
+        finally:
+            bar.close()
+            if ledger is not None:
+                ledger.close()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Parallel, resumable forward-bias scan")
+    parser.add_argument("--strategy", required=True, help="Path to strategy script")
+    parser.add_argument("--prices", required=True, help="Path to prices CSV")
+    parser.add_argument("--precision", type=int, default=100, help="Number of evenly spaced checkpoints")
+    parser.add_argument("--densify", type=int, default=None, help="Extra checkpoints where the signal changes most (default: precision/2)")
+    parser.add_argument("--buffer", type=int, default=5, help="Trailing rows of each prefix run that are not compared")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--state", default=None, help="JSONL file recording finished checkpoints; rerun to resume")
+    instrument.add_argument(parser)
+    args = parser.parse_args()
+
+    with instrument.session(args.instrument, args.instrument_top):
+        result = scan_forward_bias(
+            args.strategy, args.prices, args.precision, args.buffer, args.densify, args.workers, args.state
+        )
+        if result.resumed:
+            print(f"{result.resumed} checkpoints taken from {args.state}")
+        if result.biased:
+            print(f"⚠️ Forward bias detected at index {result.checkpoint}: signals differ from row {result.row}")
+            if result.skipped:
+                print(f"{len(result.skipped)} outstanding checkpoints cancelled")
+            print("❌ Forward bias detected!")
+        else:
+            print("✅ No forward bias detected.")
+
+
+if __name__ == "__main__":
+    main()
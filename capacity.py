@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional, Sequence
+
+import numpy as np
+
+import instrument
+from kernels import target_codes
+from metrics import DEFAULT_FREQ_PER_YEAR, infer_freq_per_year
+from signal_codes import CASH_CODE
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from execution import FillPrices
+
+
+@dataclass
+class CapacityCurve:
+    """
+    Equity curves of one strategy run at several starting capitals.
+
+    values is (capital, bar). fills counts the trades that executed (a
+    position unwound over three bars is three fills), behind counts the
+    bars that ended away from the target holding because volume ran out.
+    """
+
+    capitals: np.ndarray
+    values: np.ndarray
+    fills: np.ndarray
+    behind: np.ndarray
+    fees: np.ndarray
+    impact: np.ndarray
+
+    def summary(self, risk_free: float = 0.0, freq_per_year: int = DEFAULT_FREQ_PER_YEAR) -> pd.DataFrame:
+        """
+        Evaluator's metrics for every capital level, computed across the whole
+        matrix at once; pass metrics.infer_freq_per_year of the bar timestamps
+        to annualize like the backtest does.
+        """
+        import pandas as pd
+
+        values = self.values
+        returns = np.zeros_like(values)
+        returns[:, 1:] = values[:, 1:] / values[:, :-1] - 1.0
+        rf_period = (1 + risk_free) ** (1 / freq_per_year) - 1
+        excess = returns - rf_period
+        std = excess.std(axis=1)
+        safe_std = np.where(std == 0, 1.0, std)
+        sharpe = np.where(std == 0, 0.0, excess.mean(axis=1) / safe_std * np.sqrt(freq_per_year))
+        cum_max = np.maximum.accumulate(values, axis=1)
+        final = values[:, -1]
+        return pd.DataFrame(
+            {
+                "initial_capital": self.capitals,
+                "final_value": final,
+                "return_multiple": final / self.capitals,
+                "sharpe": sharpe,
+                "volatility": returns.std(axis=1) * np.sqrt(freq_per_year),
+                "max_drawdown": ((values - cum_max) / cum_max).min(axis=1) * 100,
+                "fills": self.fills,
+                "bars_behind_target": self.behind,
+                "fees": self.fees,
+                "impact_cost": self.impact,
+            }
+        )
+
+
+def _impact(qty: np.ndarray, volume: float, coefficient: float) -> np.ndarray:
+    # square-root law: price moves coefficient * sqrt(qty / bar volume) against the trade
+    if coefficient == 0.0 or not np.isfinite(volume):
+        return np.zeros_like(qty)
+    if volume <= 0.0:  # nothing trades on such a bar: its limit is zero
+        return np.zeros_like(qty)
+    return coefficient * np.sqrt(qty / volume)
+
+
+def simulate_capacity(
+    capitals: Sequence[float],
+    signal_codes: np.ndarray,
+    prices: np.ndarray,
+    volume: np.ndarray,
+    tx_cost: float = 0.0,
+    participation: Optional[float] = 0.1,
+    impact: float = 0.02,
+    fills: Optional[FillPrices] = None,
+) -> CapacityCurve:
+    """
+    Run one signal path at every capital level in a single pass over the bars.
+
+    Each bar moves every capital level toward the target holding: units not
+    in the target are sold and cash buys the target, but no more than
+    participation * bar volume of a product trades per bar. Whatever is left
+    carries over to the next bars. Fills pay the square-root impact on top of
+    the fill price and tx_cost on the notional. participation=None removes
+    the volume cap; bars or products without volume data are uncapped and
+    free of impact, while bars with zero volume fill nothing. With no cap and no impact this reproduces TradeExecutor exactly.
+    """
+    if not 0.0 <= tx_cost < 1.0:
+        raise ValueError("tx_cost must be in [0, 1)")
+    if participation is not None and participation <= 0:
+        raise ValueError("participation must be positive")
+    if impact < 0:
+        raise ValueError("impact must be non-negative")
+    caps = np.asarray(capitals, dtype=float)
+    if caps.ndim != 1 or not len(caps) or (caps <= 0).any():
+        raise ValueError("capitals must be a non-empty list of positive amounts")
+    prices = np.asarray(prices, dtype=float)
+    volume = np.asarray(volume, dtype=float)
+    if volume.shape != prices.shape:
+        raise ValueError("volume must have one row per bar and one column per product")
+    sell = prices if fills is None else fills.sell
+    buy = prices if fills is None else fills.buy
+    if fills is not None:
+        signal_codes = fills.schedule(signal_codes)
+
+    target = target_codes(signal_codes)
+    n, n_products = prices.shape
+    if participation is None:
+        limit = np.full(prices.shape, np.inf)
+    else:
+        limit = np.where(np.isfinite(volume), participation * volume, np.inf)
+    # a bar that traded nothing fills nothing; the order waits for one that did
+    limit[np.isfinite(volume) & (volume <= 0.0)] = 0.0
+
+    k = len(caps)
+    cash = caps.copy()
+    units = np.zeros((k, n_products))
+    values = np.empty((k, n))
+    n_fills = np.zeros(k, dtype=np.int64)
+    behind = np.zeros(k, dtype=np.int64)
+    fees = np.zeros(k)
+    impact_cost = np.zeros(k)
+
+    for i in range(n):
+        goal = int(target[i])
+        for j in range(n_products):
+            if j + 1 == goal:
+                continue
+            held = units[:, j]
+            selling = held > 0.0
+            if not selling.any():
+                continue
+            qty = np.minimum(held, limit[i, j])
+            price = sell[i, j] * np.maximum(1.0 - _impact(qty, volume[i, j], impact), 0.0)
+            notional = qty * price
+            fee = np.abs(notional) * tx_cost
+            cash += notional - fee
+            units[:, j] = held - qty
+            fees += fee
+            impact_cost += qty * sell[i, j] - notional
+            n_fills += selling & (qty > 0.0)
+
+        if goal != CASH_CODE:
+            j = goal - 1
+            buying = cash > 0.0
+            if buying.any():
+                ref = buy[i, j]
+                wanted = np.where(buying, cash * (1.0 - tx_cost) / ref, 0.0)
+                # impact is priced off the quantity we would take at the reference price
+                price = ref * (1.0 + _impact(np.minimum(wanted, limit[i, j]), volume[i, j], impact))
+                full = cash * (1.0 - tx_cost) / price <= limit[i, j]
+                notional = np.where(buying, np.where(full, cash, limit[i, j] * price / (1.0 - tx_cost)), 0.0)
+                fee = np.abs(notional) * tx_cost
+                bought = (notional - fee) / price
+                units[:, j] += bought
+                cash -= notional
+                fees += fee
+                impact_cost += bought * (price - ref)
+                n_fills += buying & (bought > 0.0)
+
+        # valued at close, like TradeExecutor
+        values[:, i] = cash + units @ np.nan_to_num(prices[i])
+        off = units.sum(axis=1) > 0.0 if goal == CASH_CODE else (cash > 0.0) | (np.delete(units, goal - 1, axis=1) > 0.0).any(axis=1)
+        behind += off
+
+    return CapacityCurve(capitals=caps, values=values, fills=n_fills, behind=behind, fees=fees, impact=impact_cost)
+
+
+def capacity_estimate(summary: pd.DataFrame, max_decay: float = 0.1) -> Optional[float]:
+    """Largest capital whose Sharpe stays within max_decay of the smallest capital's."""
+    ordered = summary.sort_values("initial_capital")
+    base = ordered["sharpe"].iloc[0]
+    if base <= 0:
+        return None
+    ok = ordered[ordered["sharpe"] >= base * (1.0 - max_decay)]
+    return float(ok["initial_capital"].max()) if len(ok) else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Capacity curve of a strategy under volume limits and market impact")
+    parser.add_argument("--prices", required=True, help="Path to prices CSV (needs VOLUME_/VOL_ columns)")
+    parser.add_argument("--signals", required=True, help="Path to signals CSV (or .npz codes)")
+    parser.add_argument("--capitals", nargs="+", type=float, default=[10.0 ** e for e in range(3, 10)], help="Initial capital levels to sweep")
+    parser.add_argument("--participation", type=float, default=0.1, help="Max fraction of a bar's volume traded per product (0 = no cap)")
+    parser.add_argument("--impact", type=float, default=0.02, help="Square-root impact coefficient: cost fraction at 100%% of bar volume")
+    parser.add_argument("--tx_cost", type=float, default=0.0, help="Transaction cost as fraction (e.g. 0.001)")
+    parser.add_argument("--cash_symbol", type=str, default="ORBS", help="Symbol representing cash")
+    parser.add_argument("--risk_free", type=float, default=0.0, help="Annual risk-free rate for Sharpe")
+    parser.add_argument("--execution", choices=("close", "next_open", "vwap"), default="close", help="Reference fill price before impact")
+    parser.add_argument("--ffill", action="store_true", help="Carry the last signal forward onto bars without one")
+    parser.add_argument("--max_staleness", type=int, default=None, help="With --ffill, max timestamp gap a signal is carried over")
+    parser.add_argument("--max_decay", type=float, default=0.1, help="Sharpe decay tolerated by the capacity estimate")
+    parser.add_argument("--output", default=None, help="Optional CSV for the capacity curve")
+    instrument.add_argument(parser)
+    args = parser.parse_args()
+
+    with instrument.session(args.instrument, args.instrument_top):
+        import pandas as pd
+
+        from alignment import align_to_prices
+        from backtest import close_prices, load_signals
+        from execution import fill_prices, load_ohlc
+        from signal_codes import SymbolTable
+
+        raw = pd.read_csv(args.prices)
+        prices = close_prices(raw)
+        products = [c for c in prices.columns if c != "timestamp"]
+        table = SymbolTable(products, cash_symbol=args.cash_symbol)
+        ohlc = load_ohlc(raw, products)
+        signals = load_signals(args.signals, table)
+        codes, report = align_to_prices(ohlc.timestamps, signals, ffill=args.ffill, max_staleness=args.max_staleness)
+        if report.has_issues():
+            print(report.describe())
+        fills = None if args.execution == "close" else fill_prices(ohlc, args.execution)
+
+        with instrument.stage("simulate"):
+            curve = simulate_capacity(
+                sorted(args.capitals),
+                codes,
+                ohlc.close,
+                ohlc.volume,
+                tx_cost=args.tx_cost,
+                participation=args.participation or None,
+                impact=args.impact,
+                fills=fills,
+            )
+        summary = curve.summary(risk_free=args.risk_free, freq_per_year=infer_freq_per_year(ohlc.timestamps))
+        print(summary.to_string(index=False))
+        estimate = capacity_estimate(summary, args.max_decay)
+        print(f"capacity (sharpe within {args.max_decay:.0%}):", "n/a" if estimate is None else f"{estimate:,.0f}")
+        if args.output:
+            summary.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
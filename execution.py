@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Sequence, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Where a trade decided on bar t gets filled:
+#   close     - close of bar t (the default the README describes)
+#   next_open - open of bar t + 1
+#   vwap      - typical price (high + low + close) / 3 of bar t + 1, a VWAP stand-in
+# Next-bar trades are recorded, and first valued, on bar t + 1. A decision on
+# the last bar has no bar to fill on and is dropped.
+EXECUTION_MODELS = ("close", "next_open", "vwap")
+
+FIELDS = ("OPEN", "HIGH", "LOW", "CLOSE", "VOLUME")
+
+
+@dataclass
+class OHLC:
+    """
+    Bar data as one (field, bar, product) tensor.
+
+    Fields follow FIELDS; products follow the order given to load_ohlc.
+    """
+
+    timestamps: np.ndarray
+    products: Tuple[str, ...]
+    bars: np.ndarray
+
+    def field(self, name: str) -> np.ndarray:
+        return self.bars[FIELDS.index(name)]
+
+    @property
+    def open(self) -> np.ndarray:
+        return self.field("OPEN")
+
+    @property
+    def high(self) -> np.ndarray:
+        return self.field("HIGH")
+
+    @property
+    def low(self) -> np.ndarray:
+        return self.field("LOW")
+
+    @property
+    def close(self) -> np.ndarray:
+        return self.field("CLOSE")
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self.field("VOLUME")
+
+
+@dataclass
+class FillPrices:
+    """
+    Per-bar, per-product prices at which sales and purchases fill.
+
+    Row i holds the prices of fills that happen on bar i; lag is the number of
+    bars between a signal and its fill.
+    """
+
+    sell: np.ndarray
+    buy: np.ndarray
+    lag: int = 0
+
+    def schedule(self, codes: np.ndarray) -> np.ndarray:
+        """Signal codes moved onto the bars they fill on, NIL where nothing was decided."""
+        if self.lag < 0:
+            raise ValueError("lag must be non-negative")
+        if not self.lag:
+            return codes
+        from signal_codes import NIL_CODE
+
+        out = np.full_like(codes, NIL_CODE)
+        out[self.lag:] = codes[:-self.lag]
+        return out
+
+
+def load_ohlc(df: pd.DataFrame, products: Sequence[str]) -> OHLC:
+    """
+    Pull OPEN/HIGH/LOW/CLOSE/VOLUME columns for products out of a raw input frame.
+
+    Volume may be spelled VOLUME_ or VOL_; products without volume get NaN.
+    """
+    if "timestamp" not in df.columns:
+        raise ValueError("Prices CSV must contain a 'timestamp' column")
+    bars = np.full((len(FIELDS), len(df), len(products)), np.nan)
+    for j, p in enumerate(products):
+        for k, f in enumerate(FIELDS):
+            names = [f"{f}_{p}"] + ([f"VOL_{p}"] if f == "VOLUME" else [])
+            col = next((c for c in names if c in df.columns), None)
+            if col is None:
+                if f == "VOLUME":
+                    continue
+                raise ValueError(f"Prices CSV is missing {f}_{p}")
+            bars[k, :, j] = df[col].to_numpy(dtype=float)
+    return OHLC(timestamps=df["timestamp"].to_numpy(dtype=np.int64), products=tuple(products), bars=bars)
+
+
+def fill_prices(ohlc: OHLC, model: str = "close", slippage: float = 0.0) -> FillPrices:
+    """
+    Fill prices for every bar and product under an execution model.
+
+    Next-bar models price each bar at its own open or typical price with a
+    lag of one, so signals fill (and trades are stamped) a bar later. slippage
+    is a fraction of the fill bar's high-low range: purchases pay that much
+    above the model price and sales receive that much below it, clipped to
+    the fill bar's range.
+    """
+    if model not in EXECUTION_MODELS:
+        raise ValueError(f"Unknown execution model {model!r}; expected one of {EXECUTION_MODELS}")
+    if slippage < 0:
+        raise ValueError("slippage must be non-negative")
+
+    high, low = ohlc.high, ohlc.low
+    if model == "close":
+        base, lag = ohlc.close, 0
+    elif model == "next_open":
+        base, lag = ohlc.open, 1
+    else:
+        base, lag = (high + low + ohlc.close) / 3.0, 1
+
+    if slippage == 0.0:
+        return FillPrices(sell=base, buy=base, lag=lag)
+    spread = slippage * (high - low)
+    return FillPrices(
+        sell=np.maximum(base - spread, low),
+        buy=np.minimum(base + spread, high),
+        lag=lag,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare fill assumptions across strategies")
+    parser.add_argument("--prices", required=True, help="Path to prices CSV")
+    parser.add_argument("--signals", nargs="+", required=True, help="Signals files to compare")
+    parser.add_argument("--models", nargs="+", default=list(EXECUTION_MODELS), choices=EXECUTION_MODELS)
+    parser.add_argument("--slippage", nargs="+", type=float, default=[0.0], help="Fractions of the bar range")
+    parser.add_argument("--initial_capital", type=float, default=1000.0, help="Initial capital in base currency")
+    parser.add_argument("--tx_cost", type=float, default=0.0, help="Transaction cost as fraction (e.g. 0.001)")
+    parser.add_argument("--cash_symbol", type=str, default="ORBS", help="Symbol representing cash")
+    parser.add_argument("--output", default=None, help="Optional CSV for the comparison table")
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    from backtest import close_prices, load_signals, run_backtest
+    from signal_codes import SymbolTable
+
+    raw = pd.read_csv(args.prices)
+    prices = close_prices(raw)
+    products = [c for c in prices.columns if c != "timestamp"]
+    table = SymbolTable(products, cash_symbol=args.cash_symbol)
+    ohlc = load_ohlc(raw, products)
+
+    rows = []
+    for path in args.signals:
+        signals = load_signals(path, table)
+        for model in args.models:
+            for slippage in args.slippage:
+                metrics, _ = run_backtest(
+                    prices,
+                    signals,
+                    initial_capital=args.initial_capital,
+                    tx_cost=args.tx_cost,
+                    cash_symbol=args.cash_symbol,
+                    fills=fill_prices(ohlc, model, slippage),
+                )
+                rows.append({"signals": path, "execution": model, "slippage": slippage, **metrics})
+
+    table_df = pd.DataFrame(rows)
+    print(table_df.to_string(index=False))
+    if args.output:
+        table_df.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,71 +1,181 @@
+from __future__ import annotations
+
 import argparse
 import subprocess
 import tempfile
 from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Optional
+
+import instrument
+
+# pandas, tqdm and the signal codecs are imported where they are used, so the
+# CLI starts fast and `--help` never loads them.
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from signal_codes import CodedSignals
+
+
+def run_strategy(strategy_file: str, input_csv: Path, output_csv: Path) -> CodedSignals:
+    with instrument.stage("strategy"):  # the script's CPU shows up as child time
+        subprocess.run(
+            ["python3", strategy_file, "--input", str(input_csv), "--output", str(output_csv)],
+            check=True,
+            stdout=subprocess.DEVNULL,   # suppress normal prints
+           # stderr=subprocess.DEVNULL    # suppress error messages too
+        )
+    from signal_codes import read_signals
+
+    return read_signals(str(output_csv))
+def subprocess_runner(strategy_file: str, full_data: pd.DataFrame, tmpdir: Path) -> Callable[[int], CodedSignals]:
+    """Runs the strategy script in a fresh interpreter on the first n rows."""
+
+    def run(n: int) -> CodedSignals:
+        partial_input = tmpdir / f"partial_{n}.csv"
+        partial_output = tmpdir / f"partial_{n}_out.csv"
+        full_data.head(n).to_csv(partial_input, index=False)
+        return run_strategy(strategy_file, partial_input, partial_output)
+
+    return run
+
+
+def socket_runner(strategy_file: str, prices: str, socket: str) -> Callable[[int], CodedSignals]:
+    """Runs the strategy on a worker_pool daemon that keeps the prices resident."""
+    from worker_pool import WorkerClient
+
+    client = WorkerClient(socket)
+    return lambda n: client.run_strategy(strategy_file, prices, n_rows=n)
+
+
+def in_process_runner(strategy_file: str, full_data: pd.DataFrame) -> Optional[Callable[[int], CodedSignals]]:
+    """Imports the strategy once and calls build_signals on prefixes; None if it has no such hook."""
+    import contextlib
+    import io
 
-import pandas as pd
-from tqdm import tqdm
+    from worker_pool import strategy_module
 
+    module = strategy_module(strategy_file)
+    if not hasattr(module, "build_signals"):
+        return None
 
-def run_strategy(strategy_file: str, input_csv: Path, output_csv: Path) -> pd.DataFrame:
-    subprocess.run(
-        ["python3", strategy_file, "--input", str(input_csv), "--output", str(output_csv)],
-        check=True,
-        stdout=subprocess.DEVNULL,   # suppress normal prints
-       # stderr=subprocess.DEVNULL    # suppress error messages too
-    )
-    return pd.read_csv(output_csv)
-def test_forward_bias(strategy_file: str, full_data: pd.DataFrame, precision: int = 250, buffer: int = 5) -> bool:
+    def run(n: int) -> CodedSignals:
+        with instrument.stage("strategy"), contextlib.redirect_stdout(io.StringIO()):
+            return module.build_signals(full_data.head(n))
+
+    return run
+
+
+def test_forward_bias(
+    strategy_file: str,
+    full_data: pd.DataFrame,
+    precision: int = 250,
+    buffer: int = 5,
+    runner: Optional[Callable[[int], CodedSignals]] = None,
+) -> bool:
     """
     Runs forward-bias test by comparing full-run vs partial runs.
+
+    runner(n) returns the strategy's signals on the first n rows; by default
+    the strategy script is run as a subprocess on temp CSVs.
     """
+    from tqdm import tqdm
+
     with tempfile.TemporaryDirectory() as tmpdir:
         tmpdir = Path(tmpdir)
+        run = runner or subprocess_runner(strategy_file, full_data, tmpdir)
 
         # Full run
-        full_input = tmpdir / "full_input.csv"
-        full_output = tmpdir / "full_output.csv"
-        full_data.to_csv(full_input, index=False)
-        full_signals = run_strategy(strategy_file, full_input, full_output)
+        full_signals = run(len(full_data))
 
         # Partial runs
         for i in tqdm(
         range(10, len(full_data), max(1, len(full_data)//precision)),
         desc="Forward Bias Check",
         unit="steps"):
-            partial_input = tmpdir / f"partial_{i}.csv"
-            partial_output = tmpdir / f"partial_{i}_out.csv"
-
-            full_data.head(i).to_csv(partial_input, index=False)
-            partial_signals = run_strategy(strategy_file, partial_input, partial_output)
+            partial_signals = run(i)
 
-            # Compare ignoring last buffer rows
-            are_equal = full_signals.iloc[:i-buffer].equals(
-                partial_signals.iloc[:i-buffer]
+            # Compare codes ignoring last buffer rows
+            are_equal = full_signals.head(i - buffer).equals(
+                partial_signals.head(i - buffer)
             )
 
             if not are_equal:
+                from signal_diff import diff_signals
+
                 tqdm.write(f"\n⚠️ Forward bias detected at index {i}")
-                tqdm.write("Partial signals:\n" + str(partial_signals.tail(10)))
-                tqdm.write("Full signals:\n" + str(full_signals.iloc[:i].tail(10)))
+                diff = diff_signals(full_signals.head(i - buffer), partial_signals.head(i - buffer))
+                tqdm.write("Full run vs partial run:\n" + diff.describe())
 
                 return True
     return False
 
 
+def test_forward_bias_tracked(strategy_file: str, full_data: pd.DataFrame) -> Optional[bool]:
+    """
+    Single-run forward-bias test: run build_signals once on an access-tracking
+    view of the data and flag signals computed from rows after their own.
+
+    Returns None when the strategy has no build_signals hook or its signal
+    codes could not be tracked; use test_forward_bias then.
+    """
+    from lineage import track_strategy
+    from worker_pool import strategy_module
+
+    module = strategy_module(strategy_file)
+    if not hasattr(module, "build_signals"):
+        return None
+    report = track_strategy(module.build_signals, full_data, module)
+    print(report.describe())
+    if not report.tracked:
+        return None
+    return report.biased
+
+
 def main():
     parser = argparse.ArgumentParser(description="Test strategy for forward bias")
     parser.add_argument("--strategy", required=True, help="Path to strategy script")
     parser.add_argument("--prices", required=True, help="Path to prices CSV")
     parser.add_argument("--precision", type=int, default=100, help="Number of checkpoints")
+    parser.add_argument("--socket", nargs="?", const="", default=None, help="Run the strategy on a worker_pool daemon (listening here, or on its default socket)")
+    parser.add_argument("--in_process", action="store_true", help="Import the strategy once and call its build_signals(df) instead of spawning a process per run")
+    parser.add_argument("--workers", type=int, default=None, help="Spread prefix runs over this many worker processes (see bias_scan.py)")
+    parser.add_argument("--state", default=None, help="With --workers: JSONL file of finished checkpoints, so an interrupted check resumes")
+    parser.add_argument("--track_access", action="store_true", help="One instrumented build_signals run that records which rows each signal read; falls back to prefix runs if it cannot tell")
+    instrument.add_argument(parser)
     args = parser.parse_args()
 
-    df = pd.read_csv(args.prices)
-
-    if test_forward_bias(args.strategy, df, precision=args.precision):
-        print("❌ Forward bias detected!")
-    else:
-        print("✅ No forward bias detected.")
+    with instrument.session(args.instrument, args.instrument_top):
+        import pandas as pd
+
+        df = pd.read_csv(args.prices)
+        if args.track_access:
+            biased = test_forward_bias_tracked(args.strategy, df)
+            if biased is not None:
+                print("❌ Forward bias detected!" if biased else "✅ No forward bias detected.")
+                return
+            print("Access tracking unavailable for this strategy; running prefix checks")
+
+        if args.workers or args.state:
+            from bias_scan import scan_forward_bias
+
+            result = scan_forward_bias(args.strategy, args.prices, precision=args.precision, workers=args.workers, state=args.state)
+            if result.biased:
+                print(f"⚠️ Forward bias detected at index {result.checkpoint}: signals differ from row {result.row}")
+                print("❌ Forward bias detected!")
+            else:
+                print("✅ No forward bias detected.")
+            return
+
+        runner = None
+        if args.socket is not None:
+            runner = socket_runner(args.strategy, args.prices, args.socket)
+        elif args.in_process:
+            runner = in_process_runner(args.strategy, df)
+
+        if test_forward_bias(args.strategy, df, precision=args.precision, runner=runner):
+            print("❌ Forward bias detected!")
+        else:
+            print("✅ No forward bias detected.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,429 @@
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import instrument
+
+# numpy, pandas and the engines are imported where they are used, so `--help` stays cheap.
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+    from results_io import ResultColumns
+    from signal_codes import CodedSignals
+    from utils import Trade
+
+DEFAULT_DIR = "results/golden"
+DEFAULT_STRATEGIES = ("strat/sma.py", "strat/momentum.py", "strat/ED24B017.py")
+SYNTHETIC_KINDS = ("trend", "meanrev", "jumps")
+MANIFEST = "manifest.json"
+
+# Largest deviation allowed per field: absolute below 1, relative above
+# (|got - want| <= tol * max(1, |want|)). A field takes the tolerance of its
+# longest matching prefix, so "metrics" covers every "metrics.<name>".
+DEFAULT_TOLERANCES: Dict[str, float] = {
+    "signals": 0.0,
+    "holding": 0.0,
+    "trades.codes": 0.0,
+    "trades.timestamp": 0.0,
+    "equity": 1e-9,
+    "trades": 1e-9,
+    "metrics": 1e-9,
+}
+
+# An engine simulates coded signals on CLOSE prices: (prices, signals, params) ->
+# (per-bar result columns, trade log, summary metrics as in summary.txt).
+Engine = Callable[["pd.DataFrame", "CodedSignals", Dict[str, Any]], Tuple["ResultColumns", List["Trade"], Dict[str, float]]]
+
+
+def synthetic_prices(kind: str, n_bars: int = 3000, seed: int = 0) -> pd.DataFrame:
+    """
+    A deterministic OHLCV file for the four products.
+
+    trend: drifting random walks; meanrev: mean-reverting log prices;
+    jumps: quiet walks with rare jumps and flat stretches, so leaders tie.
+    """
+    import numpy as np
+    import pandas as pd
+
+    from signal_codes import PRODUCTS
+
+    rng = np.random.default_rng(seed)
+    m = len(PRODUCTS)
+    if kind == "trend":
+        steps = rng.normal(rng.uniform(-5e-4, 5e-4, m), 0.01, (n_bars, m))
+    elif kind == "meanrev":
+        steps = np.empty((n_bars, m))
+        x = np.zeros(m)
+        for t in range(n_bars):
+            dx = -0.02 * x + rng.normal(0, 0.01, m)
+            steps[t] = dx
+            x += dx
+    elif kind == "jumps":
+        steps = rng.normal(0, 0.005, (n_bars, m))
+        steps += (rng.random((n_bars, m)) < 0.01) * rng.choice([-0.1, 0.1], (n_bars, m))
+        steps[rng.random(n_bars) < 0.2] = 0.0
+    else:
+        raise ValueError(f"Unknown synthetic kind {kind!r}; expected one of {SYNTHETIC_KINDS}")
+    close = np.round(rng.uniform(50, 500, m) * np.exp(np.cumsum(steps, axis=0)), 6)
+    open_ = np.vstack([close[:1], close[:-1]])
+    wiggle = np.abs(rng.normal(0, 0.003, (2, n_bars, m)))
+    high = np.round(np.maximum(open_, close) * (1 + wiggle[0]), 6)
+    low = np.round(np.minimum(open_, close) * (1 - wiggle[1]), 6)
+    volume = rng.integers(100, 10_000, (n_bars, m))
+
+    columns: Dict[str, Any] = {"timestamp": np.arange(1, n_bars + 1)}
+    for j, product in enumerate(PRODUCTS):
+        for name, values in (("OPEN", open_), ("HIGH", high), ("LOW", low), ("CLOSE", close), ("VOLUME", volume)):
+            columns[f"{name}_{product}"] = values[:, j]
+    return pd.DataFrame(columns)
+
+
+@dataclass
+class Outputs:
+    """Everything one (prices, strategy) case produces, as plain arrays."""
+
+    timestamps: np.ndarray
+    signals: np.ndarray
+    holding: np.ndarray
+    equity: np.ndarray
+    trades: np.ndarray  # record_store.TRADE_DTYPE
+    metrics: Dict[str, float]
+
+    def save(self, path: Path) -> None:
+        import numpy as np
+
+        np.savez_compressed(
+            path,
+            timestamps=self.timestamps,
+            signals=self.signals,
+            holding=self.holding,
+            equity=self.equity,
+            trades=self.trades,
+            metrics=np.array(json.dumps(self.metrics, sort_keys=True)),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> Outputs:
+        import numpy as np
+
+        with np.load(path, allow_pickle=False) as z:
+            return cls(
+                z["timestamps"], z["signals"], z["holding"], z["equity"], z["trades"], json.loads(str(z["metrics"]))
+            )
+
+
+def _executor_engine(prices: pd.DataFrame, signals: CodedSignals, params: Dict[str, Any], loop: bool) -> Tuple[ResultColumns, List[Trade], Dict[str, float]]:
+    import pandas as pd
+
+    from utils import Evaluator, Portfolio, TradeExecutor
+
+    cash = params.get("cash_symbol", "ORBS")
+    portfolio = Portfolio(params.get("initial_capital", 1000.0), params.get("tx_cost", 0.0), cash)
+    executor = TradeExecutor(portfolio, prices, signals, cash)
+    cols = executor._run_loop(None, len(prices)) if loop else executor.run_columns()
+    metrics = Evaluator(pd.Series(cols.value), timestamps=cols.timestamp).summary(portfolio, params.get("risk_free", 0.0))
+    return cols, portfolio.trade_log, metrics
+
+
+def loop_engine(prices: pd.DataFrame, signals: CodedSignals, params: Dict[str, Any]) -> Tuple[ResultColumns, List[Trade], Dict[str, float]]:
+    """The per-bar Portfolio loop: the reference semantics."""
+    return _executor_engine(prices, signals, params, loop=True)
+
+
+def kernel_engine(prices: pd.DataFrame, signals: CodedSignals, params: Dict[str, Any]) -> Tuple[ResultColumns, List[Trade], Dict[str, float]]:
+    """TradeExecutor.run_columns as backtest.py runs it (the portfolio_path kernel)."""
+    return _executor_engine(prices, signals, params, loop=False)
+
+
+ENGINES: Dict[str, Engine] = {"loop": loop_engine, "kernel": kernel_engine}
+
+
+def resolve_engine(name: str) -> Engine:
+    """A name from ENGINES, or "module:function" for an engine under development."""
+    if name in ENGINES:
+        return ENGINES[name]
+    module, _, attr = name.partition(":")
+    if not attr:
+        raise ValueError(f"Unknown engine {name!r}; expected one of {sorted(ENGINES)} or module:function")
+    return getattr(importlib.import_module(module), attr)
+
+
+def run_case(prices: str, strategy: str, engine: str = "loop", params: Optional[Dict[str, Any]] = None) -> Outputs:
+    """Strategy then engine on one prices file."""
+    from record_store import trade_records
+    from worker_pool import close_frame, run_strategy_job
+
+    params = dict(params or {})
+    closes = close_frame(prices)
+    signals = run_strategy_job(strategy, prices)
+    with instrument.stage("engine"):
+        cols, trades, metrics = resolve_engine(engine)(closes, signals, params)
+    return Outputs(
+        timestamps=cols.timestamp,
+        signals=cols.signal,
+        holding=cols.holding,
+        equity=cols.value,
+        trades=trade_records(trades, cols.table),
+        metrics={k: float(v) for k, v in metrics.items()},
+    )
+
+
+@dataclass
+class FieldDiff:
+    field: str
+    max_dev: float
+    n_bad: int
+    first: Optional[int]  # first offending bar (or trade) index
+    tolerance: float
+    timestamp: Optional[int] = None  # of the first offending bar or trade, when known
+
+    @property
+    def ok(self) -> bool:
+        return self.n_bad == 0
+
+
+def tolerance_for(field: str, tolerances: Dict[str, float]) -> float:
+    parts = field.split(".")
+    for k in range(len(parts), 0, -1):
+        key = ".".join(parts[:k])
+        if key in tolerances:
+            return tolerances[key]
+    return 0.0
+
+
+def compare_arrays(field: str, got: np.ndarray, want: np.ndarray, tol: float) -> FieldDiff:
+    import numpy as np
+
+    n = min(len(got), len(want))
+    g = np.asarray(got[:n], dtype=float)
+    w = np.asarray(want[:n], dtype=float)
+    with np.errstate(invalid="ignore"):
+        dev = np.abs(g - w)
+        both_nan = np.isnan(g) & np.isnan(w)
+        dev = np.where(both_nan, 0.0, dev)
+        bad = ~(dev <= tol * np.maximum(1.0, np.abs(w)))  # NaN against a number is bad
+    idx = np.flatnonzero(bad)
+    first = int(idx[0]) if len(idx) else None
+    n_bad = len(idx) + abs(len(got) - len(want))
+    if first is None and len(got) != len(want):
+        first = n
+    finite = dev[np.isfinite(dev)]
+    max_dev = float(finite.max()) if len(finite) else 0.0
+    if np.isnan(dev).any() or np.isinf(dev).any():
+        max_dev = float("inf")
+    return FieldDiff(field, max_dev, n_bad, first, tol)
+
+
+def compare_outputs(got: Outputs, want: Outputs, tolerances: Optional[Dict[str, float]] = None) -> List[FieldDiff]:
+    """Per-field deviations of got from the golden want."""
+    tolerances = {**DEFAULT_TOLERANCES, **(tolerances or {})}
+    diffs = []
+
+    def check(field: str, a: np.ndarray, b: np.ndarray, timestamps: Optional[np.ndarray] = None) -> None:
+        d = compare_arrays(field, a, b, tolerance_for(field, tolerances))
+        if timestamps is not None and d.first is not None and d.first < len(timestamps):
+            d.timestamp = int(timestamps[d.first])
+        diffs.append(d)
+
+    check("signals", got.signals, want.signals, want.timestamps)
+    check("holding", got.holding, want.holding, want.timestamps)
+    check("equity", got.equity, want.equity, want.timestamps)
+    check("trades.timestamp", got.trades["timestamp"], want.trades["timestamp"], want.trades["timestamp"])
+    # one number per trade, so a changed leg shows as a deviation at that trade
+    check(
+        "trades.codes",
+        got.trades["from_code"].astype(int) * 256 + got.trades["to_code"],
+        want.trades["from_code"].astype(int) * 256 + want.trades["to_code"],
+        want.trades["timestamp"],
+    )
+    for name in ("price", "size_base_ccy", "transaction_cost"):
+        check(f"trades.{name}", got.trades[name], want.trades[name], want.trades["timestamp"])
+    for name in sorted(set(got.metrics) | set(want.metrics)):
+        a = got.metrics.get(name, float("nan"))
+        b = want.metrics.get(name, float("nan"))
+        check(f"metrics.{name}", [a], [b])
+    return diffs
+
+
+def _case_name(dataset: str, strategy: str) -> str:
+    return f"{dataset}__{Path(strategy).stem}"
+
+
+def record(
+    out_dir: str = DEFAULT_DIR,
+    strategies: Sequence[str] = DEFAULT_STRATEGIES,
+    sample: Optional[str] = "data/input.csv",
+    synthetic: Sequence[str] = SYNTHETIC_KINDS,
+    n_bars: int = 3000,
+    seed: int = 0,
+    engine: str = "loop",
+    params: Optional[Dict[str, Any]] = None,
+) -> List[str]:
+    """
+    Write golden outputs for every (dataset, strategy) pair; returns the case names.
+
+    Synthetic datasets are written into out_dir so later checks read the
+    exact same bytes; the sample file is referenced by path and digest.
+    """
+    from result_cache import file_digest
+
+    out = Path(out_dir)
+    (out / "datasets").mkdir(parents=True, exist_ok=True)
+    (out / "cases").mkdir(exist_ok=True)
+    datasets: Dict[str, Dict[str, str]] = {}
+    if sample:
+        datasets[Path(sample).stem] = {"path": str(Path(sample).resolve())}
+    for i, kind in enumerate(synthetic):
+        path = out / "datasets" / f"{kind}.csv"
+        synthetic_prices(kind, n_bars, seed + i).to_csv(path, index=False)
+        datasets[kind] = {"path": str(path.resolve())}
+    for info in datasets.values():
+        info["digest"] = file_digest(info["path"])
+
+    strategies = [str(Path(s).resolve()) for s in strategies]
+    cases = []
+    for name, info in datasets.items():
+        for strategy in strategies:
+            case = _case_name(name, strategy)
+            run_case(info["path"], strategy, engine, params).save(out / "cases" / f"{case}.npz")
+            cases.append(case)
+    manifest = {"engine": engine, "params": params or {}, "datasets": datasets, "strategies": strategies}
+    (out / MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return cases
+
+
+@dataclass
+class CaseReport:
+    case: str
+    diffs: List[FieldDiff]
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and all(d.ok for d in self.diffs)
+
+    def first_mismatch(self) -> Optional[FieldDiff]:
+        # diffs are in order: per-bar fields, trades, metrics
+        return next((d for d in self.diffs if not d.ok), None)
+
+
+def _check_case(job: Tuple[str, str, str, str, str, Dict[str, Any], Dict[str, float]]) -> CaseReport:
+    case, prices, strategy, golden, engine, params, tolerances = job
+    try:
+        got = run_case(prices, strategy, engine, params)
+        return CaseReport(case, compare_outputs(got, Outputs.load(Path(golden)), tolerances))
+    except Exception as e:  # reported per case so one failing engine path does not hide the others
+        return CaseReport(case, [], f"{type(e).__name__}: {e}")
+
+
+def check(
+    golden_dir: str = DEFAULT_DIR,
+    engine: str = "kernel",
+    tolerances: Optional[Dict[str, float]] = None,
+    workers: Optional[int] = None,
+) -> List[CaseReport]:
+    """Rerun every recorded case with engine (and the current strategy code) and compare."""
+    from result_cache import file_digest
+
+    root = Path(golden_dir)
+    manifest = json.loads((root / MANIFEST).read_text(encoding="utf-8"))
+    for name, info in manifest["datasets"].items():
+        if file_digest(info["path"]) != info["digest"]:
+            raise ValueError(f"Dataset {name} ({info['path']}) changed since it was recorded; record again")
+    jobs = []
+    for name, info in manifest["datasets"].items():
+        for strategy in manifest["strategies"]:
+            case = _case_name(name, strategy)
+            golden = str(root / "cases" / f"{case}.npz")
+            jobs.append((case, info["path"], strategy, golden, engine, manifest["params"], tolerances or {}))
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return [_check_case(job) for job in jobs]
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+    with ctx.Pool(workers) as pool:
+        return pool.map(_check_case, jobs, chunksize=1)
+
+
+def format_report(reports: Sequence[CaseReport], details: int = 5) -> str:
+    """One line per case (equity deviation, first mismatch), then the failing fields."""
+    width = max([len(r.case) for r in reports] + [4])
+    lines = [f"{'case':<{width}}  status  {'equity dev':>10}  first mismatch"]
+    for r in reports:
+        if r.error is not None:
+            lines.append(f"{r.case:<{width}}  ERROR   {'':>10}  {r.error}")
+            continue
+        equity = next(d for d in r.diffs if d.field == "equity")
+        first = r.first_mismatch()
+        where = ""
+        if first is not None:
+            unit = "trade" if first.field.startswith("trades") else "bar"
+            at = f" (t={first.timestamp})" if first.timestamp is not None else ""
+            where = f"{first.field} at {unit} {first.first}{at}"
+        lines.append(f"{r.case:<{width}}  {'ok' if r.ok else 'FAIL':<6}  {equity.max_dev:>10.3g}  {where}")
+    failing = [r for r in reports if r.error is None and not r.ok]
+    for r in failing:
+        lines.append(f"{r.case}:")
+        bad = [d for d in r.diffs if not d.ok]
+        for d in bad[:details]:
+            lines.append(f"  {d.field:<24} max dev {d.max_dev:.3g} (tol {d.tolerance:g}), {d.n_bad} off, first at {d.first}")
+        if len(bad) > details:
+            lines.append(f"  ... {len(bad) - details} more fields")
+    passed = sum(r.ok for r in reports)
+    lines.append(f"{passed}/{len(reports)} cases match")
+    return "\n".join(lines)
+
+
+def _parse_tolerances(items: Sequence[str]) -> Dict[str, float]:
+    out = {}
+    for item in items:
+        field, _, value = item.partition("=")
+        if not value:
+            raise ValueError(f"Expected field=tolerance, got {item!r}")
+        out[field] = float(value)
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Record golden backtest outputs and check engines against them")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rec = sub.add_parser("record", help="Record golden outputs")
+    p_rec.add_argument("--dir", default=DEFAULT_DIR, help="Golden output directory")
+    p_rec.add_argument("--strategies", nargs="+", default=list(DEFAULT_STRATEGIES), help="Strategy files")
+    p_rec.add_argument("--sample", default="data/input.csv", help="Real prices file to include ('' for none)")
+    p_rec.add_argument("--synthetic", nargs="*", default=list(SYNTHETIC_KINDS), choices=SYNTHETIC_KINDS, help="Synthetic datasets")
+    p_rec.add_argument("--bars", type=int, default=3000, help="Bars per synthetic dataset")
+    p_rec.add_argument("--seed", type=int, default=0, help="Seed of the first synthetic dataset")
+    p_rec.add_argument("--engine", default="loop", help="Engine that defines the golden outputs")
+    p_rec.add_argument("--tx_cost", type=float, default=0.0)
+    p_chk = sub.add_parser("check", help="Compare an engine against the golden outputs")
+    p_chk.add_argument("--dir", default=DEFAULT_DIR, help="Golden output directory")
+    p_chk.add_argument("--engine", default="kernel", help="Engine name or module:function")
+    p_chk.add_argument("--tol", nargs="*", default=[], help="Tolerance overrides, e.g. equity=1e-6 metrics.sharpe=1e-8")
+    p_chk.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    for p in (p_rec, p_chk):
+        instrument.add_argument(p)
+    args = parser.parse_args()
+
+    with instrument.session(args.instrument, args.instrument_top):
+        if args.command == "record":
+            cases = record(args.dir, args.strategies, args.sample or None, args.synthetic, args.bars, args.seed, args.engine, {"tx_cost": args.tx_cost})
+            print(f"Recorded {len(cases)} cases in {args.dir} with the {args.engine} engine")
+            return
+        reports = check(args.dir, args.engine, _parse_tolerances(args.tol), args.workers)
+        print(format_report(reports))
+        if not all(r.ok for r in reports):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Set while instrumentation is on, so worker processes (forked, spawned or
+# started as subprocesses) record into the same spool directory.
+ENV_VAR = "QG_INSTRUMENT_DIR"
+ENV_TOP = "QG_INSTRUMENT_TOP"
+
+_MB = 1024.0 * 1024.0
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not on Windows
+    resource = None
+
+
+def _proc_status_kb(key: str) -> Optional[int]:
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(key):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _rss_mb() -> Optional[float]:
+    kb = _proc_status_kb("VmRSS:")
+    return None if kb is None else kb / 1024.0
+
+
+def _peak_rss_mb() -> Optional[float]:
+    kb = _proc_status_kb("VmHWM:")
+    if kb is None and resource is not None:
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # kB on Linux, the lifetime peak
+    return None if kb is None else kb / 1024.0
+
+
+def _reset_peak_rss() -> bool:
+    # Linux resets VmHWM to the current RSS on "5"; elsewhere the peak stays the lifetime one
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _io_bytes() -> Tuple[Optional[int], Optional[int]]:
+    """Bytes this process read and wrote through system calls (page cache hits included)."""
+    try:
+        with open("/proc/self/io", encoding="ascii") as f:
+            fields = dict(line.split(":", 1) for line in f)
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _children_cpu() -> float:
+    if resource is None:
+        return 0.0
+    r = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return r.ru_utime + r.ru_stime
+
+
+@dataclass
+class StageRecord:
+    """One finished stage in one process. Sizes are in MB; None where the platform (or the settings) cannot tell."""
+
+    name: str
+    pid: int
+    wall_s: float
+    cpu_s: float
+    child_cpu_s: float  # waited-for subprocesses, e.g. strategy runs
+    rss_end_mb: Optional[float]
+    rss_peak_mb: Optional[float]
+    py_peak_mb: Optional[float]  # peak growth of Python allocations over the stage, with top > 0
+    read_mb: Optional[float]
+    write_mb: Optional[float]
+    top: List[Tuple[str, float, int]] = field(default_factory=list)  # (file:line, KB, blocks) allocated and kept
+
+
+# Allocation sites kept per traced segment; bounds the memory of a long stage's tally.
+_KEEP_SITES = 100
+
+
+class _Frame:
+    __slots__ = ("name", "wall", "cpu", "child_cpu", "io", "rss_peak", "py_peak", "carried", "sites")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.rss_peak = 0.0
+        self.py_peak = 0  # bytes
+        self.carried = 0  # bytes allocated in earlier segments and still alive at their end
+        self.sites: Dict[str, List[float]] = {}
+
+
+class _Recorder:
+    """
+    Measures stages in one process.
+
+    With top > 0 tracemalloc runs, and its traces are cleared at every stage
+    boundary: a stage then only ever snapshots what it allocated itself, which
+    stays cheap once large libraries are loaded, where diffing whole-heap
+    snapshots takes seconds. Frees of blocks allocated before a boundary are
+    not seen, so growth is an upper bound.
+    """
+
+    def __init__(self, spool: Path, top: int) -> None:
+        self.spool = spool
+        self.top = top
+        self.stack: List[_Frame] = []
+        self.pid = os.getpid()
+        self.tracemalloc = None
+        if top > 0:
+            import tracemalloc
+
+            self.tracemalloc = tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(1)
+
+    def _close_segment(self, frame: _Frame) -> None:
+        # fold what was allocated since the last boundary into frame, then start a new segment
+        tm = self.tracemalloc
+        current, peak = tm.get_traced_memory()
+        frame.py_peak = max(frame.py_peak, frame.carried + peak)
+        if current:
+            for stat in tm.take_snapshot().statistics("lineno")[:_KEEP_SITES]:
+                where = stat.traceback[0]
+                site = frame.sites.setdefault(f"{where.filename}:{where.lineno}", [0.0, 0])
+                site[0] += stat.size
+                site[1] += stat.count
+        frame.carried += current
+        tm.clear_traces()
+
+    def enter(self, name: str) -> _Frame:
+        if os.getpid() != self.pid:  # forked: the parent's open stages are not ours
+            self.stack = []
+            self.pid = os.getpid()
+        frame = _Frame(name)
+        # peaks are reset per stage; an enclosing stage folds in its children's peaks on exit
+        if self.stack:
+            parent = self.stack[-1]
+            parent.rss_peak = max(parent.rss_peak, _peak_rss_mb() or 0.0)
+            if self.tracemalloc is not None:
+                self._close_segment(parent)
+        elif self.tracemalloc is not None:
+            self.tracemalloc.clear_traces()
+        _reset_peak_rss()
+        frame.io = _io_bytes()
+        frame.child_cpu = _children_cpu()
+        frame.cpu = time.process_time()
+        frame.wall = time.perf_counter()
+        self.stack.append(frame)
+        return frame
+
+    def exit(self, frame: _Frame) -> None:
+        wall = time.perf_counter() - frame.wall
+        cpu = time.process_time() - frame.cpu
+        child_cpu = _children_cpu() - frame.child_cpu
+        read, written = _io_bytes()
+        rss_peak = _peak_rss_mb()
+        if self.stack and self.stack[-1] is frame:
+            self.stack.pop()
+        rss_peak = None if rss_peak is None else max(rss_peak, frame.rss_peak)
+        if self.tracemalloc is not None:
+            self._close_segment(frame)
+        if self.stack:
+            parent = self.stack[-1]
+            parent.rss_peak = max(parent.rss_peak, rss_peak or 0.0)
+            parent.py_peak = max(parent.py_peak, parent.carried + frame.py_peak)
+            parent.carried += frame.carried
+            for where, (size, count) in frame.sites.items():
+                site = parent.sites.setdefault(where, [0.0, 0])
+                site[0] += size
+                site[1] += count
+
+        top = sorted(frame.sites.items(), key=lambda kv: -kv[1][0])[: self.top]
+        record = StageRecord(
+            name=frame.name,
+            pid=os.getpid(),
+            wall_s=wall,
+            cpu_s=cpu,
+            child_cpu_s=child_cpu,
+            rss_end_mb=_rss_mb(),
+            rss_peak_mb=rss_peak,
+            py_peak_mb=None if self.tracemalloc is None else frame.py_peak / _MB,
+            read_mb=None if read is None or frame.io[0] is None else (read - frame.io[0]) / _MB,
+            write_mb=None if written is None or frame.io[1] is None else (written - frame.io[1]) / _MB,
+            top=[(where, size / 1024.0, int(count)) for where, (size, count) in top],
+        )
+        # one line per stage and one file per process, so workers never share a file
+        with open(self.spool / f"{os.getpid()}.jsonl", "a", encoding="utf-8") as f:
+            f.write(json.dumps(record.__dict__) + "\n")
+
+
+_recorder: Optional[_Recorder] = None
+
+
+class _Stage:
+    __slots__ = ("name", "frame")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> _Stage:
+        self.frame = _recorder.enter(self.name)
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        _recorder.exit(self.frame)
+
+
+_OFF = contextlib.nullcontext()
+
+
+def stage(name: str) -> contextlib.AbstractContextManager:
+    """
+    Context manager that records one named stage when instrumentation is on.
+
+    When it is off this returns a shared no-op context, so stages can stay
+    in hot paths: the cost is one global lookup and an empty with-block.
+    """
+    if _recorder is None:
+        return _OFF
+    return _Stage(name)
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+def enable(spool: Optional[str] = None, top: int = 0) -> str:
+    """
+    Start recording in this process and every process it starts; returns the spool directory.
+
+    top > 0 also traces Python allocations and keeps each stage's top allocation sites.
+    """
+    global _recorder
+    import tempfile
+
+    path = Path(spool or tempfile.mkdtemp(prefix="qg-instrument-"))
+    path.mkdir(parents=True, exist_ok=True)
+    os.environ[ENV_VAR] = str(path)
+    os.environ[ENV_TOP] = str(top)
+    _recorder = _Recorder(path, top)
+    return str(path)
+
+
+def disable() -> None:
+    global _recorder
+    if _recorder is not None and _recorder.tracemalloc is not None:
+        _recorder.tracemalloc.stop()
+    _recorder = None
+    os.environ.pop(ENV_VAR, None)
+    os.environ.pop(ENV_TOP, None)
+
+
+def collect(spool: str) -> List[StageRecord]:
+    """Every record written to a spool directory, by any process."""
+    records = []
+    for path in sorted(Path(spool).glob("*.jsonl")):
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:  # a worker killed mid-write
+                    continue
+                data["top"] = [tuple(t) for t in data["top"]]
+                records.append(StageRecord(**data))
+    return records
+
+
+def _max(values: Sequence[Optional[float]]) -> Optional[float]:
+    present = [v for v in values if v is not None]
+    return max(present) if present else None
+
+
+def _sum(values: Sequence[Optional[float]]) -> Optional[float]:
+    present = [v for v in values if v is not None]
+    return sum(present) if present else None
+
+
+def summarize(records: Sequence[StageRecord]) -> List[Dict[str, Any]]:
+    """One row per stage name over all processes, in order of first appearance."""
+    by_name: Dict[str, List[StageRecord]] = {}
+    for r in records:
+        by_name.setdefault(r.name, []).append(r)
+    rows = []
+    for name, rs in by_name.items():
+        allocators: Dict[str, List[float]] = {}
+        for r in rs:
+            for where, kb, count in r.top:
+                acc = allocators.setdefault(where, [0.0, 0])
+                acc[0] += kb
+                acc[1] += count
+        rows.append(
+            {
+                "stage": name,
+                "calls": len(rs),
+                "processes": len({r.pid for r in rs}),
+                "wall_s": sum(r.wall_s for r in rs),
+                "cpu_s": sum(r.cpu_s for r in rs),
+                "child_cpu_s": sum(r.child_cpu_s for r in rs),
+                "rss_peak_mb": _max([r.rss_peak_mb for r in rs]),
+                "py_peak_mb": _max([r.py_peak_mb for r in rs]),
+                "read_mb": _sum([r.read_mb for r in rs]),
+                "write_mb": _sum([r.write_mb for r in rs]),
+                "top": sorted(allocators.items(), key=lambda kv: -kv[1][0]),
+            }
+        )
+    return rows
+
+
+def format_report(records: Sequence[StageRecord], top: int = 3) -> str:
+    """A table of stages, then each stage's largest Python allocators."""
+
+    def num(v: Optional[float], width: int, digits: int) -> str:
+        return f"{'-':>{width}}" if v is None else f"{v:>{width}.{digits}f}"
+
+    rows = summarize(records)
+    width = max([len(r["stage"]) for r in rows] + [5])
+    lines = [
+        f"{'stage':<{width}} {'calls':>5} {'procs':>5} {'wall s':>8} {'cpu s':>8} {'child s':>8} "
+        f"{'peak RSS MB':>11} {'py peak MB':>10} {'read MB':>8} {'write MB':>8}"
+    ]
+    for r in rows:
+        lines.append(
+            f"{r['stage']:<{width}} {r['calls']:>5} {r['processes']:>5} {r['wall_s']:>8.3f} {r['cpu_s']:>8.3f} "
+            f"{r['child_cpu_s']:>8.3f} {num(r['rss_peak_mb'], 11, 1)} {num(r['py_peak_mb'], 10, 1)} "
+            f"{num(r['read_mb'], 8, 2)} {num(r['write_mb'], 8, 2)}"
+        )
+    for r in rows:
+        if top and r["top"]:
+            lines.append(f"{r['stage']}: top allocations")
+            for where, (kb, count) in r["top"][:top]:
+                lines.append(f"  {kb / 1024.0:9.2f} MB in {count:>7} blocks  {where}")
+    return "\n".join(lines)
+
+
+def add_argument(parser: argparse.ArgumentParser) -> None:
+    """The --instrument flags every CLI shares."""
+    parser.add_argument(
+        "--instrument",
+        nargs="?",
+        const="-",
+        default=None,
+        metavar="JSON",
+        help="Record CPU, memory and I/O per stage (worker processes included); print a report, or write the records to JSON",
+    )
+    parser.add_argument(
+        "--instrument_top",
+        type=int,
+        default=0,
+        metavar="N",
+        help="With --instrument, trace Python allocations and report the N largest sites per stage (slows the run)",
+    )
+
+
+@contextlib.contextmanager
+def session(dest: Optional[str], top: int = 0, name: str = "total") -> Iterator[None]:
+    """
+    Instrument the enclosed run when dest is set (the value of --instrument):
+    "-" prints the report to stderr, anything else is a JSON file of records.
+    Does nothing at all when dest is None.
+    """
+    if dest is None:
+        yield
+        return
+    spool = enable(top=top)
+    try:
+        with stage(name):
+            yield
+    finally:
+        import shutil
+
+        disable()
+        records = collect(spool)
+        shutil.rmtree(spool, ignore_errors=True)
+        if dest == "-":
+            print(format_report(records), file=sys.stderr)
+        else:
+            Path(dest).write_text(json.dumps([r.__dict__ for r in records], indent=1), encoding="utf-8")
+
+
+# A process started by an instrumented one (spawned pool worker, strategy
+# subprocess that imports this module) joins the same spool.
+if os.environ.get(ENV_VAR) and _recorder is None:
+    _recorder = _Recorder(Path(os.environ[ENV_VAR]), int(os.environ.get(ENV_TOP, "0")))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Print the report of instrumentation records saved with --instrument FILE")
+    parser.add_argument("records", help="JSON file written by --instrument FILE")
+    parser.add_argument("--top", type=int, default=3, help="Allocators to show per stage")
+    args = parser.parse_args()
+    data = json.loads(Path(args.records).read_text(encoding="utf-8"))
+    records = [StageRecord(**{**d, "top": [tuple(t) for t in d["top"]]}) for d in data]
+    print(format_report(records, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from signal_codes import CASH_CODE, NIL_CODE
+
+# Numba is optional: when it is installed the per-bar reference loops are
+# compiled as they are; otherwise the event-driven NumPy versions below run.
+try:
+    import numba
+except ImportError:  # pragma: no cover - depends on the environment
+    numba = None
+
+# One executed trade: (bar, from code, to code, fill price, notional, fee)
+TradeEvent = Tuple[int, int, int, float, float, float]
+
+
+def target_codes(signal_codes: np.ndarray) -> np.ndarray:
+    """The holding each bar aims for: the last non-NIL signal so far, cash before the first."""
+    signal_codes = np.asarray(signal_codes, dtype=np.int8)
+    idx = np.where(signal_codes != NIL_CODE, np.arange(len(signal_codes)), -1)
+    np.maximum.accumulate(idx, out=idx)
+    return np.where(idx >= 0, signal_codes[np.maximum(idx, 0)], CASH_CODE).astype(np.int8)
+
+
+# --- pure-Python references (per-bar loops over plain arrays) ---
+
+
+def hold_until_change_reference(leaders: np.ndarray, start: int) -> np.ndarray:
+    """
+    From cash, buy the bar's leader; while holding, go back to cash on the
+    first bar whose leader differs. The state machine of strat/sma.py.
+    """
+    n = len(leaders)
+    out = np.full(n, NIL_CODE, dtype=np.int8)
+    current = CASH_CODE
+    for t in range(start, n):
+        leader = leaders[t]
+        if current != CASH_CODE:
+            if leader != current:
+                current = CASH_CODE
+                out[t] = CASH_CODE
+        else:
+            out[t] = leader
+            current = leader
+    return out
+
+
+def threshold_hold_reference(
+    rets: np.ndarray,
+    max_ret: np.ndarray,
+    leaders: np.ndarray,
+    closes: np.ndarray,
+    start: int,
+    threshold: float,
+    capital: float,
+) -> Tuple[np.ndarray, float]:
+    """
+    From cash, buy the leader once its return reaches threshold; while holding,
+    sell when the leader changes or the held product's return drops below it.
+    Returns the signals and the compounded final value. The state machine of
+    strat/momentum.py.
+    """
+    n = len(leaders)
+    out = np.full(n, NIL_CODE, dtype=np.int8)
+    orbs = capital
+    holdings = 0.0
+    current = CASH_CODE
+    for t in range(start, n):
+        leader = leaders[t]
+        if orbs == 0:
+            if current != CASH_CODE and (leader != current or rets[t, current - 1] < threshold):
+                out[t] = CASH_CODE
+                orbs = holdings * closes[t, current - 1]
+                holdings = 0.0
+                current = CASH_CODE
+        elif max_ret[t] >= threshold:
+            out[t] = leader
+            holdings = orbs / closes[t, leader - 1]
+            orbs = 0.0
+            current = leader
+    final = orbs
+    if current != CASH_CODE:
+        final += holdings * closes[n - 1, current - 1]
+    return out, final
+
+
+# --- event-driven NumPy versions: loops run once per trade, not once per bar ---
+
+
+def _hold_until_change_events(leaders: np.ndarray, start: int) -> np.ndarray:
+    leaders = np.asarray(leaders)
+    n = len(leaders)
+    out = np.full(n, NIL_CODE, dtype=np.int8)
+    # first bar of every run of equal leaders
+    run_starts = np.flatnonzero(leaders[1:] != leaders[:-1]) + 1
+    t = start
+    while t < n:
+        leader = leaders[t]
+        out[t] = leader
+        if leader == CASH_CODE:
+            t += 1
+            continue
+        k = np.searchsorted(run_starts, t, side="right")
+        if k == len(run_starts):
+            break
+        sell = run_starts[k]
+        out[sell] = CASH_CODE
+        t = sell + 1
+    return out
+
+
+def _threshold_hold_events(
+    rets: np.ndarray,
+    max_ret: np.ndarray,
+    leaders: np.ndarray,
+    closes: np.ndarray,
+    start: int,
+    threshold: float,
+    capital: float,
+) -> Tuple[np.ndarray, float]:
+    n = len(leaders)
+    out = np.full(n, NIL_CODE, dtype=np.int8)
+    with np.errstate(invalid="ignore"):
+        entries = np.flatnonzero(max_ret >= threshold)
+        exits = {
+            p: np.flatnonzero((leaders != p) | (rets[:, p - 1] < threshold)) for p in range(1, rets.shape[1] + 1)
+        }
+    orbs = capital
+    holdings = 0.0
+    current = CASH_CODE
+    t = start
+    while True:
+        k = np.searchsorted(entries, t, side="left")
+        if k == len(entries):
+            break
+        t = entries[k]
+        current = int(leaders[t])
+        out[t] = current
+        holdings = orbs / closes[t, current - 1]
+        orbs = 0.0
+        ex = exits[current]
+        k = np.searchsorted(ex, t, side="right")
+        if k == len(ex):
+            break
+        t = ex[k]
+        out[t] = CASH_CODE
+        orbs = holdings * closes[t, current - 1]
+        holdings = 0.0
+        current = CASH_CODE
+        if orbs == 0:
+            # the reference never trades again from an empty cash balance
+            break
+        t += 1
+    final = orbs
+    if current != CASH_CODE:
+        final += holdings * closes[n - 1, current - 1]
+    return out, final
+
+
+if numba is not None:  # pragma: no cover - depends on the environment
+    hold_until_change: Callable[..., np.ndarray] = numba.njit(cache=True)(hold_until_change_reference)
+    threshold_hold: Callable[..., Tuple[np.ndarray, float]] = numba.njit(cache=True)(threshold_hold_reference)
+else:
+    hold_until_change = _hold_until_change_events
+    threshold_hold = _threshold_hold_events
+
+
+@dataclass
+class PortfolioPath:
+    """
+    Outcome of running coded signals through the single-position portfolio.
+
+    values is the close valuation after each bar's rebalance; holding is what
+    was held going into each bar, with the last entry after the final
+    liquidation (the layout of ResultColumns).
+    """
+
+    values: np.ndarray
+    holding: np.ndarray
+    trades: List[TradeEvent]
+    cash: float
+    final_value: float
+
+
+def portfolio_path(
+    signal_codes: np.ndarray,
+    sell: np.ndarray,
+    buy: np.ndarray,
+    close: np.ndarray,
+    capital: float,
+    tx_cost: float = 0.0,
+) -> PortfolioPath:
+    """
+    Portfolio/TradeExecutor semantics, bit for bit, without a per-bar loop.
+
+    The holding only changes where the last non-NIL signal changes, so cash
+    and units are compounded once per trade and the bars in between are
+    valued with one array operation per holding period.
+    """
+    n = len(signal_codes)
+    target = target_codes(signal_codes)
+    before = np.empty(n, dtype=np.int8)
+    before[0] = CASH_CODE
+    before[1:] = target[:-1]
+    events = np.flatnonzero(target != before)
+
+    values = np.empty(n)
+    holding = before.copy()
+    trades: List[TradeEvent] = []
+    cash = float(capital)
+    units = 0.0
+    current = CASH_CODE
+    values[: events[0] if len(events) else n] = cash
+
+    for k, e in enumerate(events):
+        e = int(e)
+        goal = int(target[e])
+        if current != CASH_CODE:
+            price = sell[e, current - 1]
+            if not np.isfinite(price):
+                raise ValueError("Missing price to liquidate current holding")
+            notional = units * price
+            fee = abs(notional) * tx_cost
+            cash += notional - fee
+            trades.append((e, current, CASH_CODE, price, notional, fee))
+            current = CASH_CODE
+            units = 0.0
+        if goal != CASH_CODE:
+            price = buy[e, goal - 1]
+            if not np.isfinite(price):
+                raise ValueError("Missing price to buy new holding")
+            notional = cash
+            if notional <= 0.0:
+                # nothing left to invest: the portfolio stays in cash for good
+                holding[e + 1:] = CASH_CODE
+                values[e:] = cash
+                break
+            fee = abs(notional) * tx_cost
+            investable = max(notional - fee, 0.0)
+            units = investable / price if price > 0 else 0.0
+            cash -= notional
+            trades.append((e, CASH_CODE, goal, price, notional, fee))
+            current = goal
+
+        end = int(events[k + 1]) if k + 1 < len(events) else n
+        if current == CASH_CODE:
+            values[e:end] = cash
+        else:
+            prices = close[e:end, current - 1]
+            if not np.isfinite(prices).all():
+                raise ValueError("Missing price for valuation of the current holding")
+            values[e:end] = cash + units * prices
+
+    if current != CASH_CODE:
+        price = sell[n - 1, current - 1]
+        if not np.isfinite(price):
+            raise ValueError("Missing price to liquidate current holding")
+        notional = units * price
+        fee = abs(notional) * tx_cost
+        cash += notional - fee
+        trades.append((n - 1, current, CASH_CODE, price, notional, fee))
+    if n:
+        holding[-1] = CASH_CODE
+    return PortfolioPath(values=values, holding=holding, trades=trades, cash=cash, final_value=cash)
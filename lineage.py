@@ -0,0 +1,836 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import operator
+from dataclasses import dataclass, field
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+import kernels
+import ranking
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Kernels whose output at bar t only reads their inputs at bars <= t.
+CAUSAL_KERNELS = (
+    kernels.hold_until_change, kernels.threshold_hold, kernels.target_codes, ranking.leaders, ranking.top_k,
+)
+
+# NumPy functions whose implementation is built from ufuncs, so lineage flows through them.
+_UFUNC_BACKED = {
+    np.mean, np.std, np.var, np.sum, np.prod, np.max, np.min, np.amax, np.amin, np.any, np.all,
+    np.abs, np.round, np.around, np.clip, np.isclose, np.nan_to_num, np.average,
+}
+
+
+class Lineage(np.ndarray):
+    """
+    ndarray whose elements remember the highest input row they were computed
+    from (src, -1 for constants) and which input column that row came from (col).
+
+    Ufuncs, reductions and the NumPy functions strategies use propagate both;
+    anything else is treated conservatively and noted in the tracker.
+    Coercions to Python values (bool, int, float, index) drop the lineage, so
+    the tracker records the rows they read instead.
+    """
+
+    src: np.ndarray
+    col: np.ndarray
+    tracker: Optional[Tracker]
+
+    def __new__(cls, data: Any, src: np.ndarray, col: np.ndarray, tracker: Optional[Tracker] = None) -> Lineage:
+        obj = np.asarray(data).view(cls)
+        obj.src = np.array(np.broadcast_to(src, obj.shape), dtype=np.int64)
+        obj.col = np.array(np.broadcast_to(col, obj.shape), dtype=np.int64)
+        obj.tracker = tracker
+        return obj
+
+    def __array_finalize__(self, obj: Any) -> None:
+        if obj is None:
+            return
+        tracker = getattr(obj, "tracker", None)
+        self.tracker = tracker
+        src = getattr(obj, "src", None)
+        if src is None:
+            self.src = np.full(self.shape, -1, dtype=np.int64)
+            self.col = np.full(self.shape, -1, dtype=np.int64)
+        elif src.shape == self.shape:
+            self.src = src.copy()
+            self.col = obj.col.copy()
+        else:
+            # a reshaping we do not model: assume every element saw everything
+            self.src, self.col = _everything(src, obj.col, self.shape)
+
+    # --- NumPy protocol ---
+
+    def __array_ufunc__(self, ufunc: np.ufunc, method: str, *inputs: Any, **kwargs: Any) -> Any:
+        if any(isinstance(x, TrackedFrame) for x in inputs):
+            return NotImplemented  # TrackedFrame maps the ufunc over its columns
+        out = kwargs.pop("out", None)
+        if out is not None:
+            kwargs["out"] = tuple(_plain(o) for o in out)
+        result = getattr(ufunc, method)(*[_plain(x) for x in inputs], **kwargs)
+        tracker = _tracker_of(inputs)
+        if method == "__call__":
+            shape = np.shape(result[0] if isinstance(result, tuple) else result)
+            src, col = _merge(inputs, shape)
+        elif method == "reduce":
+            src, col = _reduce(inputs[0], kwargs.get("axis", 0), kwargs.get("keepdims", False))
+        elif method == "accumulate":
+            src, col = _accumulate(inputs[0], kwargs.get("axis", 0))
+        else:
+            if tracker is not None:
+                tracker.untracked.add(f"{ufunc.__name__}.{method}")
+            src, col = _everything_of(inputs, np.shape(result))
+        if out is not None:
+            for o in out:
+                if isinstance(o, Lineage):
+                    o.src[...] = src
+                    o.col[...] = col
+            return out[0] if len(out) == 1 else out
+        if isinstance(result, tuple):
+            return tuple(Lineage(r, src, col, tracker) for r in result)
+        return Lineage(result, src, col, tracker)
+
+    def __array_function__(self, func: Callable, types: Any, args: Any, kwargs: Any) -> Any:
+        handler = _HANDLERS.get(func)
+        if handler is not None:
+            return handler(*args, **kwargs)
+        if func in _UFUNC_BACKED:
+            return super().__array_function__(func, types, args, kwargs)
+        flat = list(_leaves(args)) + list(_leaves(kwargs.values()))
+        tracker = _tracker_of(flat)
+        if tracker is not None:
+            tracker.untracked.add(func.__name__)
+        result = func(*_plain_tree(args), **_plain_tree(kwargs))
+        if isinstance(result, np.ndarray):
+            src, col = _everything_of(flat, result.shape)
+            return Lineage(result, src, col, tracker)
+        return result
+
+    # --- methods implemented in C that bypass the protocol ---
+
+    def __getitem__(self, key: Any) -> Any:
+        plain_key = _plain_tree(key)
+        result = self.view(np.ndarray)[plain_key]
+        if not isinstance(result, np.ndarray):
+            return result
+        src = self.src[plain_key]
+        col = self.col[plain_key]
+        if isinstance(key, Lineage) and key.shape == self.shape:
+            # a boolean mask also carries what it was computed from
+            src, col = _max_pair(src, col, key.src[plain_key], key.col[plain_key])
+        return Lineage(result, src, col, self.tracker)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        plain_key = _plain_tree(key)
+        self.view(np.ndarray)[plain_key] = _plain(value)
+        target_shape = self.src[plain_key].shape
+        if isinstance(value, Lineage):
+            self.src[plain_key] = np.broadcast_to(value.src, target_shape)
+            self.col[plain_key] = np.broadcast_to(value.col, target_shape)
+        else:
+            self.src[plain_key] = -1
+            self.col[plain_key] = -1
+
+    def argmax(self, axis: Optional[int] = None, out: Any = None, **kwargs: Any) -> Lineage:
+        return _arg_reduce(np.argmax, self, axis)
+
+    def argmin(self, axis: Optional[int] = None, out: Any = None, **kwargs: Any) -> Lineage:
+        return _arg_reduce(np.argmin, self, axis)
+
+    def astype(self, dtype: Any, *args: Any, **kwargs: Any) -> Lineage:
+        return Lineage(self.view(np.ndarray).astype(dtype, *args, **kwargs), self.src, self.col, self.tracker)
+
+    def copy(self, order: str = "C") -> Lineage:
+        return Lineage(self.view(np.ndarray).copy(order), self.src, self.col, self.tracker)
+
+    def cumsum(self, axis: Optional[int] = None, dtype: Any = None, out: Any = None) -> Lineage:
+        return _cumulative(np.cumsum, self, axis, dtype)
+
+    # --- coercions: the plain value can steer Python control flow, which has no lineage ---
+
+    def _coerced(self, how: str) -> np.ndarray:
+        if self.tracker is not None and self.size:
+            self.tracker.read(how, int(self.src.max()))
+        return self.view(np.ndarray)
+
+    def __bool__(self) -> bool:
+        return bool(self._coerced("bool()"))
+
+    def __int__(self) -> int:
+        return int(self._coerced("int()"))
+
+    def __float__(self) -> float:
+        return float(self._coerced("float()"))
+
+    def __index__(self) -> int:
+        return operator.index(self._coerced("index"))
+
+    def item(self, *args: Any) -> Any:
+        return self._coerced("item()").item(*args)
+
+
+# --- lineage arithmetic ---
+
+
+def _plain(x: Any) -> Any:
+    return x.view(np.ndarray) if isinstance(x, Lineage) else x
+
+
+def _plain_tree(x: Any) -> Any:
+    if isinstance(x, Lineage):
+        return x.view(np.ndarray)
+    if isinstance(x, tuple):
+        return tuple(_plain_tree(v) for v in x)
+    if isinstance(x, list):
+        return [_plain_tree(v) for v in x]
+    if isinstance(x, dict):
+        return {k: _plain_tree(v) for k, v in x.items()}
+    return x
+
+
+def _leaves(x: Any) -> Iterator[Any]:
+    if isinstance(x, (tuple, list)) or type(x).__name__ == "dict_values":
+        for v in x:
+            yield from _leaves(v)
+    else:
+        yield x
+
+
+def _tracker_of(items: Sequence[Any]) -> Optional[Tracker]:
+    for x in _leaves(items):
+        if isinstance(x, Lineage) and x.tracker is not None:
+            return x.tracker
+    return None
+
+
+def _max_pair(src: np.ndarray, col: np.ndarray, other_src: np.ndarray, other_col: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    take = other_src > src
+    return np.where(take, other_src, src), np.where(take, other_col, col)
+
+
+def _merge(inputs: Sequence[Any], shape: Tuple[int, ...]) -> Tuple[np.ndarray, np.ndarray]:
+    src = np.full(shape, -1, dtype=np.int64)
+    col = np.full(shape, -1, dtype=np.int64)
+    for x in inputs:
+        if isinstance(x, Lineage):
+            src, col = _max_pair(src, col, np.broadcast_to(x.src, shape), np.broadcast_to(x.col, shape))
+    return src, col
+
+
+def _everything(src: np.ndarray, col: np.ndarray, shape: Tuple[int, ...]) -> Tuple[np.ndarray, np.ndarray]:
+    if src.size == 0:
+        return np.full(shape, -1, dtype=np.int64), np.full(shape, -1, dtype=np.int64)
+    i = int(np.argmax(src))
+    return np.full(shape, src.flat[i], dtype=np.int64), np.full(shape, col.flat[i], dtype=np.int64)
+
+
+def _everything_of(inputs: Sequence[Any], shape: Tuple[int, ...]) -> Tuple[np.ndarray, np.ndarray]:
+    src = np.full(shape, -1, dtype=np.int64)
+    col = np.full(shape, -1, dtype=np.int64)
+    for x in _leaves(inputs):
+        if isinstance(x, Lineage):
+            s, c = _everything(x.src, x.col, shape)
+            src, col = _max_pair(src, col, s, c)
+    return src, col
+
+
+def _reduce(x: Any, axis: Any, keepdims: bool) -> Tuple[np.ndarray, np.ndarray]:
+    if not isinstance(x, Lineage):
+        return np.array(-1), np.array(-1)
+    src, col = x.src, x.col
+    if axis is None:
+        src, col = src.reshape(-1), col.reshape(-1)
+        axis = 0
+    elif isinstance(axis, tuple):
+        # fold the reduced axes into one trailing axis
+        axes = [a % src.ndim for a in axis]
+        keep = [i for i in range(src.ndim) if i not in axes]
+        kept_shape = [src.shape[i] for i in keep]
+        src = np.transpose(src, keep + axes).reshape(kept_shape + [-1])
+        col = np.transpose(col, keep + axes).reshape(kept_shape + [-1])
+        out_src, out_col = _reduce(Lineage(np.zeros(src.shape), src, col), -1, False)
+        if keepdims:
+            full = [1 if i in axes else x.src.shape[i] for i in range(x.src.ndim)]
+            out_src, out_col = out_src.reshape(full), out_col.reshape(full)
+        return out_src, out_col
+    if src.shape[axis] == 0:
+        shape = np.delete(src.shape, axis)
+        return np.full(shape, -1), np.full(shape, -1)
+    idx = np.expand_dims(np.argmax(src, axis=axis), axis)
+    out_src = np.take_along_axis(src, idx, axis)
+    out_col = np.take_along_axis(col, idx, axis)
+    if not keepdims:
+        out_src, out_col = out_src.squeeze(axis), out_col.squeeze(axis)
+    return out_src, out_col
+
+
+def _accumulate(x: Any, axis: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+    src, col = x.src, x.col
+    if axis is None:
+        src, col = src.reshape(-1), col.reshape(-1)
+        axis = 0
+    running = np.maximum.accumulate(src, axis=axis)
+    shape = [1] * src.ndim
+    shape[axis] = src.shape[axis]
+    positions = np.broadcast_to(np.arange(src.shape[axis]).reshape(shape), src.shape)
+    where = np.maximum.accumulate(np.where(src == running, positions, 0), axis=axis)
+    return running, np.take_along_axis(col, where, axis)
+
+
+def _arg_reduce(func: Callable, x: Lineage, axis: Optional[int]) -> Lineage:
+    result = func(x.view(np.ndarray), axis=axis)
+    src, col = _reduce(x, axis, False)
+    return Lineage(result, src, col, x.tracker)
+
+
+def _cumulative(func: Callable, x: Any, axis: Optional[int] = None, dtype: Any = None) -> Any:
+    result = func(_plain(x), axis=axis, dtype=dtype)
+    if not isinstance(x, Lineage):
+        return result
+    src, col = _accumulate(x, axis)
+    return Lineage(result, src, col, x.tracker)
+
+
+def _where(condition: Any, x: Any = None, y: Any = None) -> Any:
+    if x is None and y is None:
+        return np.where(_plain(condition))
+    result = np.where(_plain(condition), _plain(x), _plain(y))
+    src, col = _merge([condition, x, y], result.shape)
+    return Lineage(result, src, col, _tracker_of([condition, x, y]))
+
+
+def _like(func: Callable) -> Callable:
+    def handler(a: Any, *args: Any, **kwargs: Any) -> Lineage:
+        result = func(_plain(a), *args, **kwargs)
+        return Lineage(result, -1, -1, _tracker_of([a]))
+
+    return handler
+
+
+def _concatenate(arrays: Sequence[Any], axis: Optional[int] = 0, **kwargs: Any) -> Lineage:
+    result = np.concatenate([_plain(a) for a in arrays], axis=axis, **kwargs)
+    srcs, cols = [], []
+    for a in arrays:
+        if isinstance(a, Lineage):
+            srcs.append(a.src)
+            cols.append(a.col)
+        else:
+            shape = np.shape(a)
+            srcs.append(np.full(shape, -1, dtype=np.int64))
+            cols.append(np.full(shape, -1, dtype=np.int64))
+    src = np.concatenate(srcs, axis=axis)
+    col = np.concatenate(cols, axis=axis)
+    return Lineage(result, src, col, _tracker_of(arrays))
+
+
+def _diff(a: Any, n: int = 1, axis: int = -1, **kwargs: Any) -> Any:
+    result = np.diff(_plain(a), n=n, axis=axis, **kwargs)
+    if not isinstance(a, Lineage):
+        return result
+    src, col = a.src, a.col
+    for _ in range(n):
+        head = [slice(None)] * src.ndim
+        tail = [slice(None)] * src.ndim
+        head[axis] = slice(1, None)
+        tail[axis] = slice(None, -1)
+        src, col = _max_pair(src[tuple(head)], col[tuple(head)], src[tuple(tail)], col[tuple(tail)])
+    return Lineage(result, src, col, a.tracker)
+
+
+_HANDLERS: Dict[Callable, Callable] = {
+    np.where: _where,
+    np.full_like: _like(np.full_like),
+    np.zeros_like: _like(np.zeros_like),
+    np.ones_like: _like(np.ones_like),
+    np.empty_like: _like(np.empty_like),
+    np.argmax: lambda a, axis=None, **kw: _arg_reduce(np.argmax, a, axis),
+    np.argmin: lambda a, axis=None, **kw: _arg_reduce(np.argmin, a, axis),
+    np.cumsum: lambda a, axis=None, dtype=None, **kw: _cumulative(np.cumsum, a, axis, dtype),
+    np.cumprod: lambda a, axis=None, dtype=None, **kw: _cumulative(np.cumprod, a, axis, dtype),
+    np.concatenate: _concatenate,
+    np.diff: _diff,
+    np.shape: lambda a: np.shape(_plain(a)),
+    np.ndim: lambda a: np.ndim(_plain(a)),
+}
+
+
+# --- the instrumented input frame ---
+
+
+@dataclass
+class Tracker:
+    """Bookkeeping shared by every view and array of one instrumented run."""
+
+    source: pd.DataFrame
+    materialized: Set[str] = field(default_factory=set)
+    untracked: Set[str] = field(default_factory=set)
+    control: Dict[str, int] = field(default_factory=dict)  # Python-level read (len(), bool(), ...) -> latest input row it saw
+
+    def read(self, how: str, row: int) -> None:
+        if row >= 0:
+            self.control[how] = max(self.control.get(how, -1), row)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.source.columns)
+
+
+@dataclass
+class _Column:
+    name: str
+    origin: int  # index of the input column it is derived from
+    values: Optional[np.ndarray] = None  # None until read from the source
+    src: Optional[np.ndarray] = None  # None means row i came from input row i
+    col: Optional[np.ndarray] = None  # input column of each row's src; None means origin throughout
+
+
+class TrackedFrame:
+    """
+    Stand-in for the input DataFrame during an access-tracking run.
+
+    Columns are read from the source frame only when the strategy asks for
+    their values, and come back as Lineage arrays whose row i starts out
+    depending on input row i. Column selection, renaming, head, shift,
+    rolling windows, to_numpy, arithmetic and comparison operators and NumPy
+    ufuncs are modelled; any other attribute falls back to a plain DataFrame
+    and is reported as untracked. len() and shape reveal how many rows there
+    are, so they count as reading the last one.
+    """
+
+    __hash__ = object.__hash__  # the comparison operators below return frames
+    __pandas_priority__ = 5000  # so DataFrame <op> TrackedFrame defers to the reflected operator here
+
+    def __init__(self, tracker: Tracker, columns: List[_Column], n_rows: int, single: bool = False) -> None:
+        self._tracker = tracker
+        self._columns = columns
+        self._n = n_rows
+        self._single = single
+
+    @classmethod
+    def wrap(cls, df: pd.DataFrame) -> TrackedFrame:
+        tracker = Tracker(df)
+        return cls(tracker, [_Column(str(c), i) for i, c in enumerate(df.columns)], len(df))
+
+    # --- frame shape and columns ---
+
+    def __len__(self) -> int:
+        self._tracker.read("len()", self._n - 1)
+        return self._n
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        self._tracker.read("shape", self._n - 1)
+        return self._shape()
+
+    def _shape(self) -> Tuple[int, ...]:
+        return (self._n,) if self._single else (self._n, len(self._columns))
+
+    @property
+    def columns(self) -> pd.Index:
+        import pandas as pd
+
+        return pd.Index([c.name for c in self._columns])
+
+    @columns.setter
+    def columns(self, names: Sequence[str]) -> None:
+        names = list(names)
+        if len(names) != len(self._columns):
+            raise ValueError(f"Length mismatch: expected {len(self._columns)} columns, got {len(names)}")
+        self._columns = [_Column(n, c.origin, c.values, c.src, c.col) for n, c in zip(names, self._columns)]
+
+    def __contains__(self, name: str) -> bool:
+        return any(c.name == name for c in self._columns)
+
+    def _find(self, name: str) -> _Column:
+        for c in self._columns:
+            if c.name == name:
+                return c
+        raise KeyError(name)
+
+    def __getitem__(self, key: Any) -> TrackedFrame:
+        if isinstance(key, str):
+            return TrackedFrame(self._tracker, [self._find(key)], self._n, single=True)
+        if isinstance(key, (list, tuple)) or hasattr(key, "tolist"):
+            return TrackedFrame(self._tracker, [self._find(k) for k in list(key)], self._n)
+        return self._fallback("__getitem__")[key]
+
+    # --- values ---
+
+    def _values(self, c: _Column) -> np.ndarray:
+        if c.values is None:
+            name = self._tracker.names[c.origin]
+            self._tracker.materialized.add(name)
+            c.values = self._tracker.source[name].to_numpy()[: self._n]
+        return c.values
+
+    def _src(self, c: _Column) -> np.ndarray:
+        return np.arange(self._n, dtype=np.int64) if c.src is None else c.src
+
+    def _col(self, c: _Column) -> np.ndarray:
+        return np.full(self._n, c.origin, dtype=np.int64) if c.col is None else c.col
+
+    def _lineage(self, c: _Column) -> Lineage:
+        return Lineage(self._values(c), self._src(c), self._col(c), self._tracker)
+
+    def _derive(self, fn: Callable[[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]) -> TrackedFrame:
+        # row i of the output reads the rows fn says; which column that was is carried along unchanged
+        cols = []
+        for c in self._columns:
+            values, src = fn(self._values(c), self._src(c))
+            cols.append(_Column(c.name, c.origin, values, src, c.col))
+        return TrackedFrame(self._tracker, cols, self._n, self._single)
+
+    def to_numpy(self, dtype: Any = None, copy: bool = False, **kwargs: Any) -> Lineage:
+        values = [self._values(c) for c in self._columns]
+        srcs = [self._src(c) for c in self._columns]
+        cols = [self._col(c) for c in self._columns]
+        if self._single:
+            data, src, col = values[0], srcs[0], cols[0]
+        else:
+            data = np.column_stack(values) if values else np.empty((self._n, 0))
+            src = np.column_stack(srcs) if srcs else np.empty((self._n, 0), dtype=np.int64)
+            col = np.column_stack(cols) if cols else np.empty((self._n, 0), dtype=np.int64)
+        data = np.asarray(data, dtype=dtype)
+        return Lineage(data, src, col, self._tracker)
+
+    @property
+    def values(self) -> Lineage:
+        return self.to_numpy()
+
+    def __array__(self, dtype: Any = None, copy: Any = None) -> np.ndarray:
+        return self.to_numpy(dtype).view(np.ndarray)
+
+    # --- row-aligned transforms ---
+
+    def head(self, n: int = 5) -> TrackedFrame:
+        n = max(0, min(n, self._n)) if n >= 0 else max(0, self._n + n)
+        cols = [_Column(c.name, c.origin, self._values(c)[:n], self._src(c)[:n], self._col(c)[:n]) for c in self._columns]
+        return TrackedFrame(self._tracker, cols, n, self._single)
+
+    def shift(self, periods: int = 1) -> TrackedFrame:
+        def moved(a: np.ndarray, fill: Any, dtype: Any) -> np.ndarray:
+            out = np.full(len(a), fill, dtype=dtype)
+            if periods >= 0:
+                out[periods:] = a[: len(a) - periods]
+            else:
+                out[:periods] = a[-periods:]
+            return out
+
+        cols = [
+            _Column(c.name, c.origin, moved(self._values(c), np.nan, float), moved(self._src(c), -1, np.int64), moved(self._col(c), -1, np.int64))
+            for c in self._columns
+        ]
+        return TrackedFrame(self._tracker, cols, self._n, self._single)
+
+    def diff(self, periods: int = 1) -> TrackedFrame:
+        return self - self.shift(periods)
+
+    def pct_change(self, periods: int = 1) -> TrackedFrame:
+        return self / self.shift(periods) - 1.0
+
+    # --- operators: ufuncs applied column by column, merging lineage row by row ---
+
+    def _operand(self, x: Any, j: int, c: _Column) -> Any:
+        # x's part that lines up with column j (named c) of self; raises LookupError if none does
+        if isinstance(x, TrackedFrame):
+            if x._n != self._n:
+                raise LookupError("frames of different lengths")
+            if len(x._columns) == 1:
+                return x._lineage(x._columns[0])
+            if len(x._columns) != len(self._columns):
+                raise LookupError("frames with different columns")
+            names = [o.name for o in x._columns]
+            if set(names) == {o.name for o in self._columns}:
+                return x._lineage(x._columns[names.index(c.name)])  # pandas aligns on labels
+            return x._lineage(x._columns[j])
+        if isinstance(x, np.ndarray) and x.ndim >= 1:
+            if x.shape == self._shape():
+                return x if self._single else x[:, j]
+            if x.ndim == 1 and self._single and len(x) == self._n:
+                return x
+            raise LookupError(f"array of shape {x.shape}")
+        if np.ndim(x) == 0:
+            return x
+        raise LookupError(type(x).__name__)
+
+    def __array_ufunc__(self, ufunc: np.ufunc, method: str, *inputs: Any, **kwargs: Any) -> Any:
+        if method != "__call__" or "out" in kwargs or ufunc.nout != 1:
+            # reductions and the like: run on the tracked values as one array
+            args = [x.to_numpy() if isinstance(x, TrackedFrame) else x for x in inputs]
+            return getattr(ufunc, method)(*args, **kwargs)
+        try:
+            cols = []
+            for j, c in enumerate(self._columns):
+                r = ufunc(*[self._operand(x, j, c) for x in inputs], **kwargs)
+                r = r if isinstance(r, Lineage) else Lineage(r, -1, -1, self._tracker)
+                cols.append(_Column(c.name, c.origin, r.view(np.ndarray), r.src, r.col))
+        except LookupError:
+            # shapes we do not align the way pandas would: compute with pandas, untracked
+            args = [x._fallback(ufunc.__name__) if isinstance(x, TrackedFrame) else _plain(x) for x in inputs]
+            return ufunc(*args, **kwargs)
+        return TrackedFrame(self._tracker, cols, self._n, self._single)
+
+    def __add__(self, other: Any) -> Any:
+        return np.add(self, other)
+
+    def __radd__(self, other: Any) -> Any:
+        return np.add(other, self)
+
+    def __sub__(self, other: Any) -> Any:
+        return np.subtract(self, other)
+
+    def __rsub__(self, other: Any) -> Any:
+        return np.subtract(other, self)
+
+    def __mul__(self, other: Any) -> Any:
+        return np.multiply(self, other)
+
+    def __rmul__(self, other: Any) -> Any:
+        return np.multiply(other, self)
+
+    def __truediv__(self, other: Any) -> Any:
+        return np.true_divide(self, other)
+
+    def __rtruediv__(self, other: Any) -> Any:
+        return np.true_divide(other, self)
+
+    def __pow__(self, other: Any) -> Any:
+        return np.power(self, other)
+
+    def __rpow__(self, other: Any) -> Any:
+        return np.power(other, self)
+
+    def __neg__(self) -> Any:
+        return np.negative(self)
+
+    def __abs__(self) -> Any:
+        return np.absolute(self)
+
+    def __lt__(self, other: Any) -> Any:
+        return np.less(self, other)
+
+    def __le__(self, other: Any) -> Any:
+        return np.less_equal(self, other)
+
+    def __gt__(self, other: Any) -> Any:
+        return np.greater(self, other)
+
+    def __ge__(self, other: Any) -> Any:
+        return np.greater_equal(self, other)
+
+    def __eq__(self, other: Any) -> Any:  # type: ignore[override]
+        return np.equal(self, other)
+
+    def __ne__(self, other: Any) -> Any:  # type: ignore[override]
+        return np.not_equal(self, other)
+
+    def __and__(self, other: Any) -> Any:
+        return np.logical_and(self, other)
+
+    def __or__(self, other: Any) -> Any:
+        return np.logical_or(self, other)
+
+    def __invert__(self) -> Any:
+        return np.logical_not(self)
+
+    def rolling(self, window: int, min_periods: Optional[int] = None, center: bool = False, **kwargs: Any) -> _Rolling:
+        if kwargs:
+            self._tracker.untracked.add("rolling(" + ", ".join(sorted(kwargs)) + ")")
+        return _Rolling(self, window, min_periods, center)
+
+    def _fallback(self, name: str) -> Any:
+        import pandas as pd
+
+        self._tracker.untracked.add(name)
+        data = {c.name: self._values(c) for c in self._columns}
+        frame = pd.DataFrame(data)
+        return frame[self._columns[0].name] if self._single else frame
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._fallback(name), name)
+
+
+class _Rolling:
+    def __init__(self, frame: TrackedFrame, window: int, min_periods: Optional[int], center: bool) -> None:
+        self._frame = frame
+        self._window = window
+        self._min_periods = min_periods
+        self._center = center
+
+    def _apply(self, how: str) -> TrackedFrame:
+        import pandas as pd
+
+        def fn(values: np.ndarray, src: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            kw = dict(window=self._window, min_periods=self._min_periods, center=self._center)
+            out = getattr(pd.Series(values).rolling(**kw), how)().to_numpy()
+            # a window's output depends on the newest row inside it (later rows when centred)
+            reach = pd.Series(src, dtype=float).rolling(self._window, min_periods=1, center=self._center).max()
+            return out, reach.to_numpy().astype(np.int64)
+
+        return self._frame._derive(fn)
+
+    def mean(self) -> TrackedFrame:
+        return self._apply("mean")
+
+    def sum(self) -> TrackedFrame:
+        return self._apply("sum")
+
+    def std(self) -> TrackedFrame:
+        return self._apply("std")
+
+    def var(self) -> TrackedFrame:
+        return self._apply("var")
+
+    def min(self) -> TrackedFrame:
+        return self._apply("min")
+
+    def max(self) -> TrackedFrame:
+        return self._apply("max")
+
+    def median(self) -> TrackedFrame:
+        return self._apply("median")
+
+
+# --- causal kernels and the run itself ---
+
+
+def causal(func: Callable) -> Callable:
+    """Wrap a causal kernel: output row t depends on its inputs' rows up to t; scalar outputs on all of them."""
+
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        result = func(*_plain_tree(args), **_plain_tree(kwargs))
+        inputs = [x for x in _leaves(list(args) + list(kwargs.values())) if isinstance(x, Lineage) and x.ndim >= 1]
+        if not inputs:
+            return result
+        n = len(inputs[0])
+        src = np.full(n, -1, dtype=np.int64)
+        col = np.full(n, -1, dtype=np.int64)
+        for x in inputs:
+            if len(x) != n:
+                continue
+            s, c = _reduce(x, tuple(range(1, x.ndim)), False) if x.ndim > 1 else (x.src, x.col)
+            src, col = _max_pair(src, col, s, c)
+        run_src, run_col = _accumulate(Lineage(np.zeros(n), src, col), 0)
+        tracker = _tracker_of(inputs)
+
+        def wrap(r: Any) -> Any:
+            if isinstance(r, np.ndarray) and r.ndim >= 1 and len(r) == n:
+                shape_src = run_src.reshape((n,) + (1,) * (r.ndim - 1))
+                shape_col = run_col.reshape((n,) + (1,) * (r.ndim - 1))
+                return Lineage(r, shape_src, shape_col, tracker)
+            if isinstance(r, (float, int, np.number)):
+                return Lineage(np.asarray(r), run_src[-1] if n else -1, run_col[-1] if n else -1, tracker)
+            return r
+
+        return tuple(wrap(r) for r in result) if isinstance(result, tuple) else wrap(result)
+
+    wrapper.__wrapped__ = func  # type: ignore[attr-defined]
+    return wrapper
+
+
+@contextlib.contextmanager
+def _patched_kernels(module: ModuleType) -> Iterator[None]:
+    saved = {}
+    for name, obj in vars(module).items():
+        if any(obj is k for k in CAUSAL_KERNELS):
+            saved[name] = obj
+    try:
+        for name, obj in saved.items():
+            setattr(module, name, causal(obj))
+        yield
+    finally:
+        for name, obj in saved.items():
+            setattr(module, name, obj)
+
+
+@dataclass
+class AccessReport:
+    """
+    Outcome of one access-tracking run.
+
+    tracked is False when the strategy's signal codes lost their lineage (for
+    example a Python loop over .tolist() or iterrows), when Python control
+    flow depended on later rows (control: len(), bool() of a tainted value
+    and the like, with the latest row each read), or the strategy failed on
+    the tracking view (error says how); the result then says nothing and the
+    prefix test should be used instead.
+    """
+
+    tracked: bool
+    n_rows: int
+    flagged_rows: np.ndarray  # rows whose signal reads input rows after them
+    offsets: np.ndarray  # how many rows ahead each flagged row reads
+    columns: Dict[str, Tuple[int, int]]  # input column -> (flagged rows, max offset)
+    materialized: List[str]
+    untracked: List[str]
+    error: Optional[str] = None
+    control: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def biased(self) -> bool:
+        return bool(len(self.flagged_rows))
+
+    def describe(self) -> str:
+        if self.error is not None:
+            return f"strategy failed on the tracking view ({self.error}); access tracking cannot judge it"
+        if self.control:
+            reads = ", ".join(f"{how} (row {row})" for how, row in sorted(self.control.items()))
+            return f"control flow depended on input rows through {reads}; access tracking cannot judge this strategy"
+        if not self.tracked:
+            return "signal codes lost their lineage; access tracking cannot judge this strategy"
+        lines = [f"read columns: {', '.join(self.materialized) or '-'}"]
+        if self.untracked:
+            lines.append(f"untracked operations (treated as reading every row): {', '.join(self.untracked)}")
+        if not self.biased:
+            lines.append(f"all {self.n_rows} signals depend only on rows up to their own")
+            return "\n".join(lines)
+        lines.append(
+            f"{len(self.flagged_rows)} of {self.n_rows} signals read later rows; "
+            f"first at row {int(self.flagged_rows[0])} (+{int(self.offsets[0])} rows)"
+        )
+        for name, (count, max_offset) in sorted(self.columns.items(), key=lambda kv: -kv[1][0]):
+            lines.append(f"  {name}: {count} rows, up to +{max_offset} rows ahead")
+        return "\n".join(lines)
+
+
+def track_strategy(strategy: Callable[[Any], Any], df: pd.DataFrame, module: Optional[ModuleType] = None) -> AccessReport:
+    """
+    Run strategy (build_signals-style: frame in, CodedSignals out) once on an
+    instrumented view of df and report signals that read rows after their own.
+    """
+    view = TrackedFrame.wrap(df)
+    tracker = view._tracker
+    patch = _patched_kernels(module) if module is not None else contextlib.nullcontext()
+    empty = np.empty(0, dtype=np.int64)
+    try:
+        with patch, contextlib.redirect_stdout(io.StringIO()), np.errstate(all="ignore"):
+            signals = strategy(view)
+    except Exception as e:  # the view does not model something the strategy uses
+        return AccessReport(False, len(df), empty, empty, {}, sorted(tracker.materialized), sorted(tracker.untracked), f"{type(e).__name__}: {e}")
+    codes = getattr(signals, "codes", signals)
+    n = len(codes)
+    # a branch on row r can change any signal before it, and which ones is not recorded
+    control = {how: row for how, row in tracker.control.items() if row > 0}
+    if control:
+        return AccessReport(False, n, empty, empty, {}, sorted(tracker.materialized), sorted(tracker.untracked), control=control)
+    if not isinstance(codes, Lineage) or codes.ndim != 1:
+        return AccessReport(False, n, empty, empty, {}, sorted(tracker.materialized), sorted(tracker.untracked))
+
+    ahead = codes.src - np.arange(n)
+    flagged = np.flatnonzero(ahead > 0)
+    offsets = ahead[flagged]
+    columns: Dict[str, Tuple[int, int]] = {}
+    names = tracker.names
+    for origin in np.unique(codes.col[flagged]):
+        mask = codes.col[flagged] == origin
+        name = names[origin] if origin >= 0 else "?"
+        columns[name] = (int(mask.sum()), int(offsets[mask].max()))
+    return AccessReport(True, n, flagged, offsets, columns, sorted(tracker.materialized), sorted(tracker.untracked))
@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import argparse
+from statistics import NormalDist
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from utils import Trade
+
+DEFAULT_FREQ_PER_YEAR = 252
+
+_SECONDS_PER_YEAR = 365.25 * 86400.0
+_DAY = 86400.0
+
+
+def _seconds_per_unit(median_ts: float) -> Optional[float]:
+    # epoch timestamps by magnitude: ns, us, ms, s; anything smaller is a bar counter
+    for threshold, scale in ((1e17, 1e-9), (1e14, 1e-6), (1e11, 1e-3), (1e8, 1.0)):
+        if median_ts >= threshold:
+            return scale
+    return None
+
+
+def infer_freq_per_year(timestamps: Optional[np.ndarray]) -> int:
+    """
+    Bars per year from the median timestamp spacing.
+
+    Epoch timestamps (s/ms/us/ns, told apart by magnitude) are used as such;
+    daily-ish spacing (1 to 4 days, i.e. weekends included) counts as 252
+    trading days. Bar counters and missing timestamps fall back to 252.
+    """
+    if timestamps is None or len(timestamps) < 2:
+        return DEFAULT_FREQ_PER_YEAR
+    ts = np.asarray(timestamps, dtype=np.float64)
+    scale = _seconds_per_unit(float(np.median(np.abs(ts))))
+    deltas = np.diff(ts)
+    deltas = deltas[deltas > 0]
+    if scale is None or not len(deltas):
+        return DEFAULT_FREQ_PER_YEAR
+    step = float(np.median(deltas)) * scale
+    if _DAY <= step < 4 * _DAY:
+        return DEFAULT_FREQ_PER_YEAR
+    return max(1, int(round(_SECONDS_PER_YEAR / step)))
+
+
+def _returns(values: np.ndarray) -> np.ndarray:
+    # like Evaluator: simple returns with the first bar at zero
+    returns = np.zeros_like(values)
+    returns[:, 1:] = values[:, 1:] / values[:, :-1] - 1.0
+    return returns
+
+
+def _ratio(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    # 0 where the denominator is 0, as Evaluator.sharpe does
+    safe = np.where(den == 0, 1.0, den)
+    return np.where(den == 0, 0.0, num / safe)
+
+
+def _cornish_fisher_z(z: np.ndarray, skew: np.ndarray, kurt: np.ndarray) -> np.ndarray:
+    return (
+        z
+        + (z**2 - 1) * skew / 6
+        + (z**3 - 3 * z) * kurt / 24
+        - (2 * z**3 - 5 * z) * skew**2 / 36
+    )
+
+
+def drawdown_stats(values: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Drawdown depth and duration statistics per row of a (strategies, bars) matrix.
+
+    Durations are in bars. recovery_bars counts from the deepest point back to
+    the previous peak and is NaN when the curve never got back.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    s, n = values.shape
+    peak = np.maximum.accumulate(values, axis=1)
+    dd = values / peak - 1.0
+    under = dd < 0
+    bars = np.broadcast_to(np.arange(n), (s, n))
+
+    # bars since the last time each curve stood at its peak
+    last_peak = np.maximum.accumulate(np.where(under, -1, bars), axis=1)
+    duration = bars - last_peak
+    episodes = (under[:, 1:] & ~under[:, :-1]).sum(axis=1) + under[:, 0]
+
+    trough = dd.argmin(axis=1)
+    after = ~under & (bars > trough[:, None])
+    first_back = np.where(after, bars, n).min(axis=1)
+    recovery = np.where(first_back < n, first_back - trough, np.nan).astype(float)
+    recovery[dd.min(axis=1) == 0] = 0.0
+
+    return {
+        "max_drawdown": dd.min(axis=1) * 100,
+        "max_drawdown_duration": duration.max(axis=1).astype(float),
+        "avg_drawdown_duration": _ratio(under.sum(axis=1).astype(float), episodes.astype(float)),
+        "recovery_bars": recovery,
+    }
+
+
+def compute_metrics(
+    values: np.ndarray,
+    freq_per_year: int = DEFAULT_FREQ_PER_YEAR,
+    risk_free: float = 0.0,
+    var_level: float = 0.95,
+    cvar_points: int = 64,
+) -> Dict[str, np.ndarray]:
+    """
+    Risk and return metrics for every row of a (strategies, bars) equity matrix.
+
+    Returns one array per metric, one entry per strategy. final_value,
+    volatility, sharpe and max_drawdown match Evaluator. VaR/CVaR are losses
+    per bar at var_level, positive numbers; the Cornish-Fisher CVaR averages
+    the adjusted quantile over cvar_points levels of the tail.
+    """
+    if not 0.5 < var_level < 1.0:
+        raise ValueError("var_level must be between 0.5 and 1")
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    s, n = values.shape
+    if n < 2:
+        raise ValueError("Need at least two bars per equity curve")
+    returns = _returns(values)
+    ann = np.sqrt(freq_per_year)
+    rf_period = (1 + risk_free) ** (1 / freq_per_year) - 1
+    excess = returns - rf_period
+    mean_excess = excess.mean(axis=1)
+
+    downside = np.sqrt((np.minimum(excess, 0.0) ** 2).mean(axis=1))
+    dd = drawdown_stats(values)
+    years = (n - 1) / freq_per_year
+    growth = values[:, -1] / values[:, 0]
+    cagr = np.where(growth > 0, np.abs(growth) ** (1 / years) - 1, -1.0)
+
+    # tail statistics over the realized returns (the leading zero is not a bar return)
+    realized = returns[:, 1:]
+    alpha = 1.0 - var_level
+    q = np.quantile(realized, alpha, axis=1)
+    tail = realized <= q[:, None]
+    hist_cvar = 0.0 - (realized * tail).sum(axis=1) / tail.sum(axis=1)
+
+    mu = realized.mean(axis=1)
+    sigma = realized.std(axis=1)
+    safe_sigma = np.where(sigma == 0, 1.0, sigma)
+    z_scores = (realized - mu[:, None]) / safe_sigma[:, None]
+    z2 = z_scores * z_scores
+    skew = np.where(sigma == 0, 0.0, (z2 * z_scores).mean(axis=1))
+    kurt = np.where(sigma == 0, 0.0, (z2 * z2).mean(axis=1) - 3.0)
+    normal = NormalDist()
+    z = normal.inv_cdf(alpha)
+    cf_var = -(mu + _cornish_fisher_z(np.float64(z), skew, kurt) * sigma)
+    tail_z = np.array([normal.inv_cdf(alpha * (k + 0.5) / cvar_points) for k in range(cvar_points)])
+    cf_tail = _cornish_fisher_z(tail_z[None, :], skew[:, None], kurt[:, None])
+    cf_cvar = -(mu + cf_tail.mean(axis=1) * sigma)
+
+    nonzero = (realized != 0).sum(axis=1)
+    return {
+        "final_value": values[:, -1],
+        "volatility": returns.std(axis=1) * ann,
+        "sharpe": _ratio(mean_excess, excess.std(axis=1)) * ann,
+        "sortino": _ratio(mean_excess, downside) * ann,
+        "cagr": cagr,
+        "calmar": _ratio(cagr, np.abs(dd["max_drawdown"]) / 100),
+        **dd,
+        "var_hist": 0.0 - q,
+        "cvar_hist": hist_cvar,
+        "var_cf": cf_var,
+        "cvar_cf": cf_cvar,
+        "skew": skew,
+        "excess_kurtosis": kurt,
+        "hit_rate": _ratio((realized > 0).sum(axis=1).astype(float), nonzero.astype(float)),
+    }
+
+
+def trade_stats(trade_log: Sequence[Trade], values: np.ndarray, freq_per_year: int = DEFAULT_FREQ_PER_YEAR) -> Dict[str, float]:
+    """
+    Turnover (traded notional per year over average equity) and the share of
+    round trips (buy of a product, then its sale) that came back with more cash.
+    """
+    values = np.asarray(values, dtype=float)
+    traded = float(sum(abs(t.size_base_ccy) for t in trade_log))
+    years = max(len(values) - 1, 1) / freq_per_year
+    avg_equity = float(values.mean()) if len(values) else 0.0
+    turnover = traded / avg_equity / years if avg_equity > 0 else 0.0
+
+    wins = 0
+    trips = 0
+    cost: Optional[float] = None
+    for t in trade_log:
+        if t.price_to is not None:  # cash -> product
+            cost = t.size_base_ccy
+        elif cost is not None:  # product -> cash
+            trips += 1
+            wins += (t.size_base_ccy - t.transaction_cost) > cost
+            cost = None
+    return {
+        "turnover": turnover,
+        "round_trips": float(trips),
+        "trade_hit_rate": wins / trips if trips else 0.0,
+    }
+
+
+def metrics_frame(
+    values: np.ndarray,
+    names: Optional[Sequence[str]] = None,
+    timestamps: Optional[np.ndarray] = None,
+    freq_per_year: Optional[int] = None,
+    risk_free: float = 0.0,
+    var_level: float = 0.95,
+) -> pd.DataFrame:
+    """compute_metrics as a frame, one row per strategy; frequency inferred from timestamps unless given."""
+    import pandas as pd
+
+    freq = freq_per_year or infer_freq_per_year(timestamps)
+    frame = pd.DataFrame(compute_metrics(values, freq, risk_free=risk_free, var_level=var_level))
+    if names is not None:
+        frame.insert(0, "name", list(names))
+    return frame
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Extended risk metrics for one or more backtest results files")
+    parser.add_argument("results", nargs="+", help="Results files written by backtest.py (.csv/.npz/.npy/.parquet)")
+    parser.add_argument("--risk_free", type=float, default=0.0, help="Annual risk-free rate")
+    parser.add_argument("--var_level", type=float, default=0.95, help="Confidence level for VaR/CVaR")
+    parser.add_argument("--freq_per_year", type=int, default=None, help="Bars per year (default: inferred from timestamps)")
+    parser.add_argument("--output", default=None, help="Optional CSV for the metrics table")
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    from results_io import read_results
+
+    frames = [read_results(path) for path in args.results]
+    # equal-length curves are scored as one matrix, the rest one at a time
+    by_length: Dict[int, List[int]] = {}
+    for i, f in enumerate(frames):
+        by_length.setdefault(len(f), []).append(i)
+    parts = []
+    for idx in by_length.values():
+        values = np.vstack([frames[i]["new_portfolio_value"].to_numpy(dtype=float) for i in idx])
+        part = metrics_frame(
+            values,
+            names=[args.results[i] for i in idx],
+            timestamps=frames[idx[0]]["timestamp"].to_numpy(),
+            freq_per_year=args.freq_per_year,
+            risk_free=args.risk_free,
+            var_level=args.var_level,
+        )
+        part.index = idx
+        parts.append(part)
+    table = pd.concat(parts).sort_index()
+    print(table.to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
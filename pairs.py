@@ -0,0 +1,483 @@
+from __future__ import annotations
+
+import argparse
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Deque, List, Optional, Tuple
+
+import numpy as np
+
+import instrument
+from signal_codes import CASH_CODE, NIL_CODE, SymbolTable
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+@dataclass
+class PairSignals:
+    """
+    Per-bar long/short pair targets as int8 codes of one SymbolTable.
+
+    hedge is the short leg's units per unit of the long leg. A bar whose long
+    code is NIL_CODE keeps the current position; long and short both
+    CASH_CODE means flat. Any other change of (long, short, hedge) closes
+    both legs and opens the new pair.
+    """
+
+    long: np.ndarray
+    short: np.ndarray
+    hedge: np.ndarray
+    table: SymbolTable
+    timestamps: Optional[np.ndarray] = None
+
+    def __post_init__(self) -> None:
+        self.long = np.asarray(self.long, dtype=np.int8)
+        self.short = np.asarray(self.short, dtype=np.int8)
+        self.hedge = np.asarray(self.hedge, dtype=float)
+        if not len(self.long) == len(self.short) == len(self.hedge):
+            raise ValueError("long, short and hedge must have one entry per bar")
+        opening = (self.long != NIL_CODE) & (self.long != CASH_CODE)
+        if (opening & ((self.short <= CASH_CODE) | (self.short == self.long))).any():
+            raise ValueError("An open pair needs a short product different from its long one")
+
+    def __len__(self) -> int:
+        return len(self.long)
+
+    def to_frame(self) -> pd.DataFrame:
+        import pandas as pd
+
+        frame = pd.DataFrame(
+            {"long": self.table.decode(self.long), "short": self.table.decode(self.short), "hedge_ratio": self.hedge}
+        )
+        if self.timestamps is not None:
+            frame.insert(0, "timestamp", self.timestamps)
+        return frame
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, table: SymbolTable) -> PairSignals:
+        """Columns long, short, hedge_ratio (and optionally timestamp); blank/NIL longs keep the position."""
+        long = table.encode(df["long"])
+        short = table.encode(df["short"])
+        hedge = df["hedge_ratio"].to_numpy(dtype=float)
+        # the short side and ratio are meaningless on hold and flat bars
+        short = np.where(long > CASH_CODE, short, np.where(long == CASH_CODE, CASH_CODE, NIL_CODE)).astype(np.int8)
+        hedge = np.where(long > CASH_CODE, hedge, 0.0)
+        ts = df["timestamp"].to_numpy() if "timestamp" in df.columns else None
+        return cls(long, short, hedge, table, ts)
+
+
+@dataclass
+class PairTrade:
+    """Both legs of one open or close: units are signed holdings before (close) or after (open)."""
+
+    bar: int
+    long_code: int
+    short_code: int
+    long_units: float
+    short_units: float
+    long_price: float
+    short_price: float
+    fee: float
+    opening: bool
+
+
+@dataclass
+class PairPath:
+    """Equity, held pair and trades of a pair run, laid out like kernels.PortfolioPath."""
+
+    values: np.ndarray
+    long: np.ndarray  # held going into each bar
+    short: np.ndarray
+    hedge: np.ndarray
+    trades: List[PairTrade]
+    final_value: float
+
+
+def pair_targets(signals: PairSignals) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """The (long, short, hedge) each bar aims for: the last non-NIL row so far, flat before the first."""
+    idx = np.where(signals.long != NIL_CODE, np.arange(len(signals)), -1)
+    np.maximum.accumulate(idx, out=idx)
+    has = idx >= 0
+    at = np.maximum(idx, 0)
+    long = np.where(has, signals.long[at], CASH_CODE).astype(np.int8)
+    short = np.where(has & (long != CASH_CODE), signals.short[at], CASH_CODE).astype(np.int8)
+    hedge = np.where(long != CASH_CODE, signals.hedge[at], 0.0)
+    return long, short, hedge
+
+
+def pair_path(signals: PairSignals, closes: np.ndarray, capital: float, tx_cost: float = 0.0) -> PairPath:
+    """
+    Simulate pair signals at close prices without a per-bar loop.
+
+    Opening buys equity / long price units of the long leg and sells hedge
+    times that many of the short leg, whose proceeds stay in cash; both legs
+    pay tx_cost on their notional. The position only changes where the
+    target does, so cash is settled once per trade and each holding period
+    is valued with one array expression: cash + long units * long price -
+    short units * short price.
+    """
+    closes = np.asarray(closes, dtype=float)
+    n = len(signals)
+    if closes.shape[0] != n:
+        raise ValueError("Need one row of closes per signal bar")
+    long_t, short_t, hedge_t = pair_targets(signals)
+    before = [np.empty_like(a) for a in (long_t, short_t, hedge_t)]
+    for b, a, flat in zip(before, (long_t, short_t, hedge_t), (CASH_CODE, CASH_CODE, 0.0)):
+        b[0] = flat
+        b[1:] = a[:-1]
+    events = np.flatnonzero((long_t != before[0]) | (short_t != before[1]) | (hedge_t != before[2]))
+
+    values = np.empty(n)
+    held_long, held_short, held_hedge = (b.copy() for b in before)
+    trades: List[PairTrade] = []
+    cash = float(capital)
+    qL = qS = 0.0
+    cur = (CASH_CODE, CASH_CODE, 0.0)
+    values[: events[0] if len(events) else n] = cash
+
+    def settle(bar: int) -> None:
+        nonlocal cash, qL, qS, cur
+        pL = closes[bar, cur[0] - 1]
+        pS = closes[bar, cur[1] - 1]
+        if not (np.isfinite(pL) and np.isfinite(pS)):
+            raise ValueError("Missing price to close the current pair")
+        fee = (abs(qL * pL) + abs(qS * pS)) * tx_cost
+        cash += qL * pL - qS * pS - fee
+        trades.append(PairTrade(bar, cur[0], cur[1], qL, qS, pL, pS, fee, False))
+        qL = qS = 0.0
+        cur = (CASH_CODE, CASH_CODE, 0.0)
+
+    for k, e in enumerate(events):
+        e = int(e)
+        if cur[0] != CASH_CODE:
+            settle(e)
+        goal = (int(long_t[e]), int(short_t[e]), float(hedge_t[e]))
+        if goal[0] != CASH_CODE:
+            pL = closes[e, goal[0] - 1]
+            pS = closes[e, goal[1] - 1]
+            if not (np.isfinite(pL) and np.isfinite(pS) and np.isfinite(goal[2])):
+                raise ValueError("Missing price or hedge ratio to open a pair")
+            if cash <= 0.0 or pL <= 0.0:
+                # nothing left to put up: flat for good
+                held_long[e + 1:] = CASH_CODE
+                held_short[e + 1:] = CASH_CODE
+                held_hedge[e + 1:] = 0.0
+                values[e:] = cash
+                break
+            qL = cash / pL
+            qS = goal[2] * qL
+            fee = (abs(qL * pL) + abs(qS * pS)) * tx_cost
+            cash += qS * pS - qL * pL - fee
+            trades.append(PairTrade(e, goal[0], goal[1], qL, qS, pL, pS, fee, True))
+            cur = goal
+
+        end = int(events[k + 1]) if k + 1 < len(events) else n
+        if cur[0] == CASH_CODE:
+            values[e:end] = cash
+        else:
+            legs = closes[e:end, [cur[0] - 1, cur[1] - 1]]
+            if not np.isfinite(legs).all():
+                raise ValueError("Missing price for valuation of the current pair")
+            values[e:end] = cash + qL * legs[:, 0] - qS * legs[:, 1]
+
+    if cur[0] != CASH_CODE:
+        settle(n - 1)
+    if n:
+        held_long[-1] = CASH_CODE
+        held_short[-1] = CASH_CODE
+        held_hedge[-1] = 0.0
+    return PairPath(values, held_long, held_short, held_hedge, trades, cash)
+
+
+def pair_path_reference(signals: PairSignals, closes: np.ndarray, capital: float, tx_cost: float = 0.0) -> Tuple[np.ndarray, float, int]:
+    """Per-bar loop with the semantics of pair_path: (values, final value, trades)."""
+    n = len(signals)
+    values = np.empty(n)
+    cash = float(capital)
+    qL = qS = 0.0
+    cur = (CASH_CODE, CASH_CODE, 0.0)
+    trades = 0
+    broke = False
+    for t in range(n):
+        if signals.long[t] != NIL_CODE and not broke:
+            goal = (int(signals.long[t]), int(signals.short[t]), float(signals.hedge[t]))
+            if goal[0] == CASH_CODE:
+                goal = (CASH_CODE, CASH_CODE, 0.0)
+            if goal != cur:
+                if cur[0] != CASH_CODE:
+                    pL, pS = closes[t, cur[0] - 1], closes[t, cur[1] - 1]
+                    cash += qL * pL - qS * pS - (abs(qL * pL) + abs(qS * pS)) * tx_cost
+                    qL = qS = 0.0
+                    cur = (CASH_CODE, CASH_CODE, 0.0)
+                    trades += 1
+                if goal[0] != CASH_CODE:
+                    pL, pS = closes[t, goal[0] - 1], closes[t, goal[1] - 1]
+                    if cash <= 0.0 or pL <= 0.0:
+                        broke = True
+                    else:
+                        qL = cash / pL
+                        qS = goal[2] * qL
+                        cash += qS * pS - qL * pL - (abs(qL * pL) + abs(qS * pS)) * tx_cost
+                        cur = goal
+                        trades += 1
+        if cur[0] == CASH_CODE:
+            values[t] = cash
+        else:
+            values[t] = cash + qL * closes[t, cur[0] - 1] - qS * closes[t, cur[1] - 1]
+    if cur[0] != CASH_CODE:
+        pL, pS = closes[n - 1, cur[0] - 1], closes[n - 1, cur[1] - 1]
+        cash += qL * pL - qS * pS - (abs(qL * pL) + abs(qS * pS)) * tx_cost
+        trades += 1
+    return values, cash, trades
+
+
+class RollingRegression:
+    """
+    OLS fit y = alpha + beta * x over the last window points, updated in O(1) per point.
+
+    Keeps running sums of x, y, x*x, x*y and y*y (about the first point seen,
+    so they stay small), adding the new point and dropping the oldest. The
+    sums are recomputed from the window once every window updates, which
+    keeps rounding drift bounded at amortized O(1) cost. Matches
+    rolling.rolling_regression to rounding.
+    """
+
+    def __init__(self, window: int) -> None:
+        if window < 2:
+            raise ValueError("Regression windows must be at least 2 points")
+        self.window = window
+        self._points: Deque[Tuple[float, float]] = deque()
+        self._origin: Optional[Tuple[float, float]] = None
+        self._sums = [0.0] * 5  # x, y, xx, xy, yy
+        self._since_resync = 0
+
+    def _resync(self) -> None:
+        sums = [0.0] * 5
+        for x, y in self._points:
+            sums[0] += x
+            sums[1] += y
+            sums[2] += x * x
+            sums[3] += x * y
+            sums[4] += y * y
+        self._sums = sums
+        self._since_resync = 0
+
+    def update(self, x: float, y: float) -> Tuple[float, float, float]:
+        """Add a point; (alpha, beta, residual std) of the current window, NaN until it is full or when x is flat."""
+        if self._origin is None:
+            self._origin = (x, y)
+        x -= self._origin[0]
+        y -= self._origin[1]
+        s = self._sums
+        self._points.append((x, y))
+        s[0] += x
+        s[1] += y
+        s[2] += x * x
+        s[3] += x * y
+        s[4] += y * y
+        if len(self._points) > self.window:
+            ox, oy = self._points.popleft()
+            s[0] -= ox
+            s[1] -= oy
+            s[2] -= ox * ox
+            s[3] -= ox * oy
+            s[4] -= oy * oy
+        self._since_resync += 1
+        if self._since_resync >= self.window:
+            self._resync()
+        return self.fit()
+
+    def fit(self) -> Tuple[float, float, float]:
+        nan = float("nan")
+        n = len(self._points)
+        if n < self.window:
+            return nan, nan, nan
+        sx, sy, sxx, sxy, syy = (v / n for v in self._sums)
+        var_x = sxx - sx * sx
+        if not var_x > 1e-12 * sxx:
+            return nan, nan, nan
+        cov = sxy - sx * sy
+        beta = cov / var_x
+        alpha = (sy + self._origin[1]) - beta * (sx + self._origin[0])
+        return alpha, beta, math.sqrt(max(syy - sy * sy - beta * cov, 0.0))
+
+
+def spread_zscores(x: np.ndarray, y: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(beta, z-score of y's residual from its trailing fit on x) per bar."""
+    from rolling import rolling_regression
+
+    alpha, beta, sigma = rolling_regression(x, y, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.where(sigma > 0, (y - alpha - beta * x) / sigma, np.nan)
+    return beta, z
+
+
+def zscore_pair_signals(
+    closes: np.ndarray,
+    table: SymbolTable,
+    y: str,
+    x: str,
+    window: int = 200,
+    entry: float = 2.0,
+    exit: float = 0.5,
+    max_hedge: float = 10.0,
+) -> PairSignals:
+    """
+    Mean reversion on the spread of y against x, hedged with a trailing regression.
+
+    Below -entry standard deviations go long y and short beta units of x;
+    above +entry go long x and short 1 / beta units of y; back inside exit,
+    go flat. The hedge ratio is fixed at entry. Entries whose beta is not
+    positive, or whose hedge ratio would exceed max_hedge, are skipped.
+    """
+    if not 0 <= exit < entry:
+        raise ValueError("Need 0 <= exit < entry")
+    yi = table.code(y)
+    xi = table.code(x)
+    if yi <= CASH_CODE or xi <= CASH_CODE or yi == xi:
+        raise ValueError("y and x must be two different products")
+    beta, z = spread_zscores(closes[:, xi - 1], closes[:, yi - 1], window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        long_y = (beta > 0) & (beta <= max_hedge)
+        long_x = (beta > 0) & (1.0 / beta <= max_hedge)
+    # +1 long the spread, -1 short it, 0 flat, NaN carry the previous state
+    state = np.full(len(z), np.nan)
+    with np.errstate(invalid="ignore"):
+        state[np.abs(z) < exit] = 0.0
+        state[(z <= -entry) & long_y] = 1.0
+        state[(z >= entry) & long_x] = -1.0
+    idx = np.where(~np.isnan(state), np.arange(len(state)), -1)
+    np.maximum.accumulate(idx, out=idx)
+    held = np.where(idx >= 0, state[np.maximum(idx, 0)], 0.0)
+    prev = np.concatenate([[0.0], held[:-1]])
+    change = held != prev
+
+    n = len(z)
+    long = np.full(n, NIL_CODE, dtype=np.int8)
+    short = np.full(n, NIL_CODE, dtype=np.int8)
+    hedge = np.zeros(n)
+    up = change & (held == 1.0)
+    down = change & (held == -1.0)
+    flat = change & (held == 0.0)
+    long[up], short[up], hedge[up] = yi, xi, beta[up]
+    long[down], short[down], hedge[down] = xi, yi, 1.0 / beta[down]
+    long[flat], short[flat] = CASH_CODE, CASH_CODE
+    return PairSignals(long, short, hedge, table)
+
+
+def check_pairs(cases: int = 100, seed: int = 0, max_bars: int = 400) -> int:
+    """
+    Randomized checks of pair_path against the per-bar reference and of
+    RollingRegression against rolling_regression and a direct fit; raises
+    AssertionError on the first mismatch.
+    """
+    from rolling import rolling_regression
+
+    rng = np.random.default_rng(seed)
+    for case in range(cases):
+        n = int(rng.integers(2, max_bars))
+        m = int(rng.integers(2, 5))
+        closes = np.exp(np.cumsum(rng.normal(0, 0.02, (n, m)), axis=0)) * rng.uniform(50, 500, m)
+        table = SymbolTable([f"P{j}" for j in range(m)], "ORBS")
+        long = rng.integers(0, m + 1, n).astype(np.int8)
+        short = np.array([rng.choice([c for c in range(1, m + 1) if c != l]) if l else 0 for l in long], dtype=np.int8)
+        hedge = np.round(rng.uniform(-1, 3, n), 1)
+        hold = rng.random(n) < 0.8
+        long[hold] = NIL_CODE
+        short[hold] = NIL_CODE
+        signals = PairSignals(long, short, np.where(long > 0, hedge, 0.0), table)
+        tx_cost = float(rng.choice([0.0, 0.001, 0.01]))
+        got = pair_path(signals, closes, 1000.0, tx_cost)
+        want_values, want_final, want_trades = pair_path_reference(signals, closes, 1000.0, tx_cost)
+        assert np.array_equal(got.values, want_values), f"pair_path values mismatch in case {case}"
+        assert got.final_value == want_final, f"pair_path final value mismatch in case {case}"
+        assert len(got.trades) == want_trades, f"pair_path trade count mismatch in case {case}"
+
+        w = int(rng.integers(2, max(3, n // 2 + 1)))
+        x, y = closes[:, 0], closes[:, 1]
+        # tiny windows fit almost exactly, so compare on the scale of the prices
+        atol = 1e-6 * float(np.abs(y).max())
+        alpha, beta, sigma = rolling_regression(x, y, w)
+        reg = RollingRegression(w)
+        for t in range(n):
+            a, b, s = reg.update(float(x[t]), float(y[t]))
+            ok = np.allclose([a, s], [alpha[t], sigma[t]], rtol=1e-6, atol=atol, equal_nan=True)
+            ok &= np.allclose(b, beta[t], rtol=1e-6, atol=1e-9, equal_nan=True)
+            assert ok, f"RollingRegression mismatch in case {case} at {t}"
+            if t >= w - 1:
+                b_fit, a_fit = np.polyfit(x[t - w + 1 : t + 1], y[t - w + 1 : t + 1], 1)
+                ok = np.isclose(a, a_fit, rtol=1e-6, atol=atol) and np.isclose(b, b_fit, rtol=1e-6, atol=1e-9)
+                assert ok, f"regression fit mismatch in case {case} at {t}"
+    return cases
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backtest a mean-reverting spread between two products")
+    parser.add_argument("--prices", help="Prices CSV")
+    parser.add_argument("--y", default="ELVEN_WINE", help="Product regressed on --x")
+    parser.add_argument("--x", default="VAMPIRE_BLOOD", help="Hedge product")
+    parser.add_argument("--window", type=int, default=200, help="Bars in the hedge-ratio regression")
+    parser.add_argument("--entry", type=float, default=2.0, help="Spread z-score to enter at")
+    parser.add_argument("--exit", type=float, default=0.5, help="Spread z-score to go flat at")
+    parser.add_argument("--max_hedge", type=float, default=10.0, help="Skip entries needing more short units per long unit")
+    parser.add_argument("--initial_capital", type=float, default=1000.0)
+    parser.add_argument("--tx_cost", type=float, default=0.0, help="Fee per leg as a fraction of its notional")
+    parser.add_argument("--cash_symbol", default="ORBS")
+    parser.add_argument("--output_csv", default=None, help="Optional per-bar pair and equity CSV")
+    parser.add_argument("--check", type=int, default=None, metavar="CASES", help="Run randomized checks instead")
+    instrument.add_argument(parser)
+    args = parser.parse_args()
+
+    with instrument.session(args.instrument, args.instrument_top):
+        if args.check is not None:
+            print(f"{check_pairs(args.check)} cases match")
+            return
+        if not args.prices:
+            parser.error("--prices is required unless --check is given")
+
+        from backtest import format_summary, load_prices
+        from metrics import compute_metrics, infer_freq_per_year
+
+        with instrument.stage("load_prices"):
+            prices = load_prices(args.prices)
+        products = [c for c in prices.columns if c != "timestamp"]
+        table = SymbolTable(products, cash_symbol=args.cash_symbol)
+        closes = prices[products].to_numpy(dtype=float)
+        with instrument.stage("signals"):
+            signals = zscore_pair_signals(closes, table, args.y, args.x, args.window, args.entry, args.exit, args.max_hedge)
+        signals.timestamps = prices["timestamp"].to_numpy()
+        with instrument.stage("simulate"):
+            path = pair_path(signals, closes, args.initial_capital, args.tx_cost)
+
+        freq = infer_freq_per_year(signals.timestamps)
+        m = compute_metrics(path.values, freq)
+        print(
+            format_summary(
+                {
+                    "final_value": path.final_value,
+                    "total_trades": len(path.trades),
+                    "max_drawdown": float(m["max_drawdown"][0]),
+                    "volatility": float(m["volatility"][0]),
+                    "sharpe": float(m["sharpe"][0]),
+                }
+            )
+        )
+        if args.output_csv:
+            import pandas as pd
+
+            out = pd.DataFrame(
+                {
+                    "timestamp": signals.timestamps,
+                    "long": table.decode(path.long),
+                    "short": table.decode(path.short),
+                    "hedge_ratio": path.hedge,
+                    "new_portfolio_value": path.values,
+                }
+            )
+            out.to_csv(args.output_csv, index=False)
+
+
+if __name__ == "__main__":
+    main()
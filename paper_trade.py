@@ -0,0 +1,397 @@
+from __future__ import annotations
+
+import argparse
+import queue
+import time
+from abc import ABC, abstractmethod
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import instrument
+
+# asyncio, logging, numpy, pandas and the portfolio are imported where they are used, so `--help` stays cheap.
+if TYPE_CHECKING:
+    import asyncio
+    import logging
+    import logging.handlers
+
+    import numpy as np
+
+    from signal_codes import SymbolTable
+    from record_store import RunStore
+    from utils import Portfolio, Trade
+
+
+@dataclass
+class Bar:
+    timestamp: int
+    products: Tuple[str, ...]
+    closes: np.ndarray  # one close per product, in products order
+
+
+class PriceFeed(ABC):
+    """A source of bars; subclasses yield them from bars() as they arrive."""
+
+    products: Tuple[str, ...] = ()
+
+    @abstractmethod
+    def bars(self) -> AsyncIterator[Bar]:
+        """Async generator of bars, in time order."""
+
+
+class ReplayFeed(PriceFeed):
+    """
+    Plays a prices CSV back as a bar stream, the no-network stand-in for a live feed.
+
+    speed is bars per second (0 for as fast as possible); bars are scheduled
+    against the start time, so a slow consumer does not make the feed drift.
+    The file is read chunk_rows at a time.
+    """
+
+    def __init__(self, path: str, speed: float = 0.0, chunk_rows: int = 10_000) -> None:
+        import pandas as pd
+
+        from backtest import close_prices
+
+        self.path = path
+        self.speed = float(speed)
+        self.chunk_rows = chunk_rows
+        header = close_prices(pd.read_csv(path, nrows=0))
+        self.products = tuple(c for c in header.columns if c != "timestamp")
+
+    async def bars(self) -> AsyncIterator[Bar]:
+        import asyncio
+
+        import pandas as pd
+
+        from backtest import close_prices
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        i = 0
+        with pd.read_csv(self.path, chunksize=self.chunk_rows) as reader:
+            for chunk in reader:
+                closes = close_prices(chunk)
+                timestamps = closes["timestamp"].to_numpy()
+                values = closes[list(self.products)].to_numpy(dtype=float)
+                for ts, row in zip(timestamps, values):
+                    if self.speed > 0:
+                        delay = start + i / self.speed - loop.time()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    else:
+                        await asyncio.sleep(0)  # let the consumer run between bars
+                    yield Bar(int(ts), self.products, row)
+                    i += 1
+
+
+class IncrementalStrategy(ABC):
+    """
+    A strategy that sees one bar at a time and keeps its own state.
+
+    table names the products it trades, in code order; on_bar receives their
+    closes in that order and returns a signal code (NIL_CODE for no action).
+    """
+
+    table: SymbolTable
+
+    @abstractmethod
+    def on_bar(self, timestamp: int, closes: np.ndarray) -> int:
+        """The signal code for this bar."""
+
+
+class SmaLeaderStrategy(IncrementalStrategy):
+    """
+    strat/sma.py one bar at a time: hold the product whose small-bar SMA rose
+    most over lookback bars, and drop to cash when another one takes over.
+    """
+
+    PRODUCTS = ("UNICORN_HORNS", "ELVEN_WINE", "VAMPIRE_BLOOD", "PHOENIX_FEATHERS")
+
+    def __init__(self, small: int = 50, lookback: int = 25, products: Sequence[str] = PRODUCTS) -> None:
+        import numpy as np
+
+        from signal_codes import CASH_CODE, SymbolTable
+
+        self.table = SymbolTable(products, cash_symbol="ORBS")
+        self.small = small
+        self.lookback = lookback
+        m = len(self.table.products)
+        self._closes = np.full((small, m), np.nan)
+        self._smas = np.full((lookback + 1, m), np.nan)
+        self._t = 0
+        self._current = CASH_CODE
+
+    def on_bar(self, timestamp: int, closes: np.ndarray) -> int:
+        import numpy as np
+
+        from signal_codes import CASH_CODE, NIL_CODE
+
+        t = self._t
+        self._t += 1
+        self._closes[t % self.small] = closes
+        sma = self._closes.mean(axis=0) if t + 1 >= self.small else np.full(len(closes), np.nan)
+        self._smas[t % (self.lookback + 1)] = sma
+        prev = self._smas[(t + 1) % (self.lookback + 1)]  # the SMA lookback bars ago (NaN until there is one)
+        if t < self.lookback + self.small:
+            return NIL_CODE
+
+        slope = (sma - prev) / prev * 100
+        valid = ~np.isnan(slope)
+        leader = int(np.where(valid, slope, -np.inf).argmax()) + 1 if valid.any() else NIL_CODE
+        # kernels.hold_until_change, one bar at a time
+        if self._current != CASH_CODE:
+            if leader != self._current:
+                self._current = CASH_CODE
+                return CASH_CODE
+            return NIL_CODE
+        self._current = leader
+        return leader
+
+
+STRATEGIES = {"sma": SmaLeaderStrategy}
+
+TRADE_HEADER = "timestamp,from_asset,to_asset,price_from,price_to,size_base_ccy,transaction_cost"
+EQUITY_HEADER = "timestamp,holding,value,latency_us"
+
+
+def _csv_rotating_handler(path: Path, header: str, max_bytes: int, backups: int) -> logging.Handler:
+    # defined on first use so importing this module does not load logging
+    import logging
+    import logging.handlers
+
+    class CsvRotatingHandler(logging.handlers.RotatingFileHandler):
+        # every rotated file starts with the CSV header
+        def __init__(self) -> None:
+            super().__init__(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+            self.setFormatter(logging.Formatter("%(message)s"))
+            if self.stream.tell() == 0:
+                self._write_header()
+
+        def _write_header(self) -> None:
+            self.stream.write(header + self.terminator)
+            self.flush()
+
+        def doRollover(self) -> None:
+            super().doRollover()
+            self._write_header()
+
+    return CsvRotatingHandler()
+
+
+class TradeLog:
+    """
+    Trades and per-bar equity as CSV lines in size-rotated files.
+
+    The event loop only enqueues records; listener threads do the file
+    writes, so disk latency never lands on a bar's decision.
+    """
+
+    def __init__(self, log_dir: str, max_bytes: int = 10 * 1024 * 1024, backups: int = 5) -> None:
+        out = Path(log_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        self._listeners: List[logging.handlers.QueueListener] = []
+        self._trades = self._queued(out / "trades.log", TRADE_HEADER, max_bytes, backups)
+        self._equity = self._queued(out / "equity.log", EQUITY_HEADER, max_bytes, backups)
+
+    def _queued(self, path: Path, header: str, max_bytes: int, backups: int) -> logging.Logger:
+        import logging
+        import logging.handlers
+
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(records, _csv_rotating_handler(path, header, max_bytes, backups))
+        listener.start()
+        self._listeners.append(listener)
+        logger = logging.getLogger(f"paper_trade.{path.resolve()}")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.handlers[:] = [logging.handlers.QueueHandler(records)]
+        return logger
+
+    def trade(self, t: Trade) -> None:
+        price_from = "" if t.price_from is None else t.price_from
+        price_to = "" if t.price_to is None else t.price_to
+        self._trades.info(
+            f"{t.timestamp},{t.from_asset},{t.to_asset},{price_from},{price_to},{t.size_base_ccy},{t.transaction_cost}"
+        )
+
+    def bar(self, timestamp: int, holding: str, value: float, latency_us: float) -> None:
+        self._equity.info(f"{timestamp},{holding},{value},{latency_us:.1f}")
+
+    def close(self) -> None:
+        """Flush what is queued and close the files."""
+        for listener in self._listeners:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
+
+@dataclass
+class PaperTradeResult:
+    bars: int
+    final_value: float
+    num_trades: int
+    latency_us: Dict[str, float]  # decision latency percentiles per bar
+    over_budget: int  # bars whose decision took longer than the budget
+
+
+def latency_percentiles(latencies_ns: Sequence[int], points: Sequence[float] = (50, 90, 99, 99.9)) -> Dict[str, float]:
+    import numpy as np
+
+    lat = np.frombuffer(latencies_ns, dtype=np.int64) if isinstance(latencies_ns, array) else np.asarray(latencies_ns)
+    if not len(lat):
+        return {}
+    out = {f"p{p:g}": float(np.percentile(lat, p)) / 1e3 for p in points}
+    out["max"] = float(lat.max()) / 1e3
+    return out
+
+
+class PaperTrader:
+    """
+    Runs an incremental strategy against a price feed with a paper Portfolio.
+
+    Each bar is handed from the feed to the trader through a bounded queue;
+    decision latency is measured from the bar's arrival to the updated
+    portfolio value, so time spent waiting behind a slow bar counts too.
+    """
+
+    def __init__(
+        self,
+        feed: PriceFeed,
+        strategy: IncrementalStrategy,
+        initial_capital: float = 1000.0,
+        tx_cost: float = 0.0,
+        log: Optional[TradeLog] = None,
+        budget_ms: float = 5.0,
+        queue_size: int = 64,
+        store: Optional[RunStore] = None,
+    ) -> None:
+        import numpy as np
+
+        from utils import Portfolio
+
+        self.feed = feed
+        self.strategy = strategy
+        self.portfolio: Portfolio = Portfolio(
+            initial_capital, tx_cost, cash_symbol=strategy.table.cash_symbol, symbols=strategy.table
+        )
+        self.log = log
+        self.store = store
+        self.budget_ns = int(budget_ms * 1e6)
+        self.queue_size = queue_size
+        missing = [p for p in strategy.table.products if p not in feed.products]
+        if missing:
+            raise ValueError(f"Feed has no prices for {missing}")
+        # feed columns in the strategy's code order
+        self._columns = np.array([feed.products.index(p) for p in strategy.table.products])
+        self.latencies = array("q")
+
+    def _record(self, trades: List[Trade]) -> None:
+        if self.log is not None:
+            for trade in trades:
+                self.log.trade(trade)
+        if self.store is not None:
+            self.store.add_trades(trades)
+
+    async def _pump(self, bars: asyncio.Queue) -> None:
+        try:
+            async for bar in self.feed.bars():
+                await bars.put((time.perf_counter_ns(), bar))
+        except Exception as e:  # handed to the trading loop, which re-raises it
+            await bars.put(e)
+            return
+        await bars.put(None)
+
+    async def run(self, max_bars: Optional[int] = None) -> PaperTradeResult:
+        import asyncio
+
+        bars: asyncio.Queue = asyncio.Queue(self.queue_size)
+        pump = asyncio.create_task(self._pump(bars))
+        p = self.portfolio
+        over = 0
+        last: Optional[Tuple[int, np.ndarray]] = None
+        logged = 0
+        try:
+            while max_bars is None or len(self.latencies) < max_bars:
+                item = await bars.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                arrived, bar = item
+                closes = bar.closes[self._columns]
+                held = p.holding_code
+                code = self.strategy.on_bar(bar.timestamp, closes)
+                p.rebalance_code(bar.timestamp, code, closes)
+                value = p.value_at(closes)
+                elapsed = time.perf_counter_ns() - arrived
+                self.latencies.append(elapsed)
+                over += elapsed > self.budget_ns
+                last = (bar.timestamp, closes)
+                self._record(p.trade_log[logged:])
+                logged = len(p.trade_log)
+                if self.log is not None:
+                    self.log.bar(bar.timestamp, p.holding_symbol, value, elapsed / 1e3)
+                if self.store is not None:
+                    self.store.bar(bar.timestamp, code, held, value)
+        finally:
+            pump.cancel()
+            await asyncio.gather(pump, return_exceptions=True)
+
+        # close out at the last bar, as the backtester does
+        final = p.base_ccy_cash
+        if last is not None:
+            p.liquidate_all_at(last[0], last[1])
+            final = p.value_at(last[1])
+            self._record(p.trade_log[logged:])
+        return PaperTradeResult(len(self.latencies), final, p.num_trades, latency_percentiles(self.latencies), over)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Paper-trade an incremental strategy against a bar stream")
+    parser.add_argument("--prices", default="data/input.csv", help="Prices CSV to replay")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="sma", help="Incremental strategy")
+    parser.add_argument("--speed", type=float, default=0.0, help="Bars per second to replay (0: as fast as possible)")
+    parser.add_argument("--max_bars", type=int, default=None, help="Stop after this many bars")
+    parser.add_argument("--initial_capital", type=float, default=1000.0)
+    parser.add_argument("--tx_cost", type=float, default=0.0)
+    parser.add_argument("--log_dir", default="results/paper", help="Directory for the rotating trade and equity logs")
+    parser.add_argument("--log_max_bytes", type=int, default=10 * 1024 * 1024, help="Rotate a log file past this size")
+    parser.add_argument("--log_backups", type=int, default=5, help="Rotated files kept per log")
+    parser.add_argument("--store_dir", default=None, help="Also append equity and trades to memory-mapped record stores here")
+    parser.add_argument("--budget_ms", type=float, default=5.0, help="Per-bar latency budget to report overruns against")
+    instrument.add_argument(parser)
+    args = parser.parse_args()
+
+    with instrument.session(args.instrument, args.instrument_top):
+        feed = ReplayFeed(args.prices, speed=args.speed)
+        log = TradeLog(args.log_dir, args.log_max_bytes, args.log_backups)
+        strategy = STRATEGIES[args.strategy]()
+        store = None
+        if args.store_dir:
+            from record_store import RunStore
+
+            store = RunStore(args.store_dir, strategy.table)
+        trader = PaperTrader(feed, strategy, args.initial_capital, args.tx_cost, log, args.budget_ms, store=store)
+        try:
+            import asyncio
+
+            with instrument.stage("replay"):
+                result = asyncio.run(trader.run(args.max_bars))
+        finally:
+            log.close()
+            if store is not None:
+                store.close()
+
+        print(f"bars: {result.bars}")
+        print(f"final_value: {result.final_value:.6f}")
+        print(f"total_trades: {result.num_trades}")
+        print("latency_us: " + ", ".join(f"{k} {v:.1f}" for k, v in result.latency_us.items()))
+        print(f"over_budget: {result.over_budget} bars over {args.budget_ms:g} ms")
+        print(f"logs in {args.log_dir}")
+
+
+if __name__ == "__main__":
+    main()
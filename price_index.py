@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import argparse
+import io
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Rows between index entries: a range read overshoots by at most this many rows on each side.
+DEFAULT_STRIDE = 1024
+INDEX_VERSION = 1
+
+_SCAN_BYTES = 16 * 1024 * 1024
+
+
+def index_path(path: Path) -> Path:
+    return path.with_name(path.name + ".idx.npz")
+
+
+def _fingerprint(path: Path) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+@dataclass
+class PriceIndex:
+    """
+    Sparse map from timestamps and row numbers to byte offsets in a prices CSV.
+
+    Entry k covers data rows [rows[k], rows[k + 1]) starting at byte
+    offsets[k]; timestamps[k] is the first timestamp of that block. Range
+    reads seek to the blocks that can hold the range and parse only those.
+    """
+
+    rows: np.ndarray
+    offsets: np.ndarray
+    timestamps: np.ndarray
+    n_rows: int
+    file_size: int
+    mtime_ns: int
+    header: bytes
+    ordered: bool  # timestamps never decrease, so time ranges can use the index
+    stride: int
+
+    def is_current(self, path: Path) -> bool:
+        return (self.file_size, self.mtime_ns) == _fingerprint(path)
+
+    def save(self, path: Path) -> None:
+        np.savez(
+            path,
+            version=INDEX_VERSION,
+            rows=self.rows,
+            offsets=self.offsets,
+            timestamps=self.timestamps,
+            meta=np.array([self.n_rows, self.file_size, self.mtime_ns, int(self.ordered), self.stride], dtype=np.int64),
+            header=np.frombuffer(self.header, dtype=np.uint8),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> Optional[PriceIndex]:
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                if int(z["version"]) != INDEX_VERSION:
+                    return None
+                n_rows, size, mtime, ordered, stride = (int(v) for v in z["meta"])
+                return cls(z["rows"], z["offsets"], z["timestamps"], n_rows, size, mtime, z["header"].tobytes(), bool(ordered), stride)
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def time_span(self, start: Optional[float], end: Optional[float]) -> Tuple[int, int, int]:
+        """(first row, start byte, end byte) of the blocks that can hold timestamps in [start, end]."""
+        lo = 0
+        if start is not None:
+            lo = max(int(np.searchsorted(self.timestamps, start, side="left")) - 1, 0)
+        hi = len(self.rows)
+        if end is not None:
+            hi = int(np.searchsorted(self.timestamps, end, side="right"))
+        stop = int(self.offsets[hi]) if hi < len(self.offsets) else self.file_size
+        return int(self.rows[lo]), int(self.offsets[lo]), stop
+
+
+def _line_starts(path: Path) -> Tuple[bytes, np.ndarray]:
+    """The header line and the byte offset of every non-empty data line."""
+    starts = []
+    with open(path, "rb") as f:
+        header = f.readline()
+        base = f.tell()
+        carry_empty = True  # the previous chunk ended on a newline (or this is the first chunk)
+        while True:
+            block = f.read(_SCAN_BYTES)
+            if not block:
+                break
+            buf = np.frombuffer(block, dtype=np.uint8)
+            nl = np.flatnonzero(buf == 10)
+            begin = np.concatenate(([0], nl + 1)) if carry_empty else nl + 1
+            begin = begin[begin < len(buf)]
+            # blank lines (and \r\n line ends) do not start rows, as pandas skips them
+            begin = begin[(buf[begin] != 10) & (buf[begin] != 13)]
+            starts.append(begin + base)
+            carry_empty = buf[-1] == 10
+            base += len(block)
+    return header, np.concatenate(starts) if starts else np.empty(0, dtype=np.int64)
+
+
+def build_index(path: str, stride: int = DEFAULT_STRIDE) -> PriceIndex:
+    """Scan a prices CSV once for its line offsets and timestamps."""
+    import pandas as pd
+
+    p = Path(path)
+    size, mtime = _fingerprint(p)
+    header, starts = _line_starts(p)
+    timestamps = pd.read_csv(p, usecols=["timestamp"])["timestamp"].to_numpy()
+    if len(timestamps) != len(starts):
+        raise ValueError(f"{path}: {len(starts)} lines but {len(timestamps)} rows; quoted newlines cannot be indexed")
+    rows = np.arange(0, len(starts), stride, dtype=np.int64)
+    ordered = bool(len(timestamps) < 2 or (np.diff(timestamps) >= 0).all())
+    return PriceIndex(
+        rows=rows,
+        offsets=starts[rows].astype(np.int64),
+        timestamps=timestamps[rows],
+        n_rows=len(timestamps),
+        file_size=size,
+        mtime_ns=mtime,
+        header=header,
+        ordered=ordered,
+        stride=stride,
+    )
+
+
+# Indexes already loaded in this process, by resolved path.
+_indexes: Dict[str, PriceIndex] = {}
+
+
+def price_index(path: str, stride: int = DEFAULT_STRIDE) -> PriceIndex:
+    """The index for a prices CSV: from memory, from its sidecar, or built (and saved) when stale or missing."""
+    p = Path(path).resolve()
+    idx = _indexes.get(str(p))
+    if idx is not None and idx.is_current(p):
+        return idx
+    idx = PriceIndex.load(index_path(p))
+    if idx is None or not idx.is_current(p):
+        idx = build_index(str(p), stride)
+        try:
+            idx.save(index_path(p))
+        except OSError:  # read-only location: keep it in memory only
+            pass
+    _indexes[str(p)] = idx
+    return idx
+
+
+def _read_span(path: Path, idx: PriceIndex, first_row: int, begin: int, end: int) -> pd.DataFrame:
+    import pandas as pd
+
+    with open(path, "rb") as f:
+        f.seek(begin)
+        body = f.read(end - begin)
+    df = pd.read_csv(io.BytesIO(idx.header + body))
+    df.index = pd.RangeIndex(first_row, first_row + len(df))
+    return df
+
+
+def _read_parquet_range(path: str, start: Optional[float], end: Optional[float]) -> pd.DataFrame:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Reading .parquet prices requires pyarrow (pip install pyarrow)") from e
+
+    pf = pq.ParquetFile(path)
+    col = pf.schema_arrow.get_field_index("timestamp")
+    groups = []
+    for g in range(pf.metadata.num_row_groups):
+        stats = pf.metadata.row_group(g).column(col).statistics
+        if stats is None or not stats.has_min_max:
+            groups.append(g)
+        elif (start is None or stats.max >= start) and (end is None or stats.min <= end):
+            groups.append(g)
+    df = pf.read_row_groups(groups).to_pandas() if groups else pf.schema_arrow.empty_table().to_pandas()
+    return _mask(df, start, end)
+
+
+def _mask(df: pd.DataFrame, start: Optional[float], end: Optional[float]) -> pd.DataFrame:
+    keep = np.ones(len(df), dtype=bool)
+    ts = df["timestamp"].to_numpy()
+    if start is not None:
+        keep &= ts >= start
+    if end is not None:
+        keep &= ts <= end
+    return df[keep]
+
+
+def read_price_range(path: str, start: Optional[float] = None, end: Optional[float] = None) -> pd.DataFrame:
+    """
+    Raw price rows with start <= timestamp <= end (either bound optional),
+    indexed by their row number in the file.
+
+    CSVs go through the sidecar index and read only the blocks around the
+    range; Parquet files read only the row groups whose timestamp statistics
+    overlap it. A CSV whose timestamps go backwards is read whole and filtered.
+    """
+    import pandas as pd
+
+    if Path(path).suffix.lower() == ".parquet":
+        return _read_parquet_range(path, start, end)
+    if start is None and end is None:
+        return pd.read_csv(path)
+    idx = price_index(path)
+    if not idx.ordered or not idx.n_rows:
+        return _mask(pd.read_csv(path), start, end)
+    first_row, begin, stop = idx.time_span(start, end)
+    return _mask(_read_span(Path(path), idx, first_row, begin, stop), start, end)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or inspect the time-range index of a prices CSV")
+    parser.add_argument("prices", help="Prices CSV")
+    parser.add_argument("--stride", type=int, default=DEFAULT_STRIDE, help="Rows per index entry")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild even if the sidecar is current")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        index_path(Path(args.prices).resolve()).unlink(missing_ok=True)
+    idx = price_index(args.prices, args.stride)
+    print(f"{idx.n_rows} rows in {len(idx.rows)} blocks of {idx.stride}, {idx.file_size / 1e6:.1f} MB")
+    if idx.n_rows:
+        print(f"first timestamp {idx.timestamps[0]}, ordered: {idx.ordered}")
+    print(f"index: {index_path(Path(args.prices).resolve())}")
+
+
+if __name__ == "__main__":
+    main()
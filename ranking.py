@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import argparse
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from signal_codes import NIL_CODE
+
+# Bytes of one (rows, products) float64 temporary per block. Masking and ranking
+# a block allocates several of these plus bool masks, so its working set is a
+# few times this: it lives in L2/L3 rather than main memory, and blocks stay
+# large enough that per-block numpy overhead does not dominate.
+BLOCK_BYTES = 512 * 1024
+
+
+def block_rows_for(n_products: int, budget: int = BLOCK_BYTES) -> int:
+    """Rows per block so that one float64 temporary of the block fits in budget bytes."""
+    return max(1, budget // (8 * max(1, n_products)))
+
+
+def _blocks(n: int, block_rows: int) -> Iterator[slice]:
+    if block_rows < 1:
+        raise ValueError("block_rows must be positive")
+    for start in range(0, n, block_rows):
+        yield slice(start, min(start + block_rows, n))
+
+
+def leaders(scores: np.ndarray, block_rows: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Highest score on each row of a (bars, products) matrix and its signal code
+    (column + 1).
+
+    NaN scores are skipped; rows with none at all (warm-up) get NaN and
+    NIL_CODE, so callers need no slicing to get past them. Ties go to the
+    first column, as with argmax and idxmax. block_rows defaults to
+    block_rows_for the column count.
+    """
+    scores = np.asarray(scores, dtype=float)
+    if scores.ndim != 2:
+        raise ValueError("scores must be a (bars, products) matrix")
+    n = len(scores)
+    best = np.full(n, np.nan)
+    codes = np.full(n, NIL_CODE, dtype=np.int8)
+    for rows in _blocks(n, block_rows or block_rows_for(scores.shape[1])):
+        block = scores[rows]
+        valid = ~np.isnan(block)
+        masked = np.where(valid, block, -np.inf)
+        col = masked.argmax(axis=1)
+        has = valid.any(axis=1)
+        best[rows] = np.where(has, masked[np.arange(len(col)), col], np.nan)
+        codes[rows] = np.where(has, col + 1, NIL_CODE)
+    return best, codes
+
+
+def top_k(scores: np.ndarray, k: int, block_rows: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The k highest scores on each row and their signal codes, best first, as
+    two (bars, k) arrays.
+
+    Uses np.argpartition, so each row costs O(products + k log k) rather
+    than a full sort. Slots a row has no score for (NaN, or fewer than k
+    products) are NaN and NIL_CODE. Equal scores are ordered by column; which
+    of several products tied for the k-th place makes the cut is unspecified.
+    block_rows defaults as in leaders.
+    """
+    scores = np.asarray(scores, dtype=float)
+    if scores.ndim != 2:
+        raise ValueError("scores must be a (bars, products) matrix")
+    n, m = scores.shape
+    if not 1 <= k <= np.iinfo(np.int8).max:
+        raise ValueError("k must be between 1 and 127")
+    kk = min(k, m)
+    values = np.full((n, k), np.nan)
+    codes = np.full((n, k), NIL_CODE, dtype=np.int8)
+    for rows in _blocks(n, block_rows or block_rows_for(m)):
+        block = scores[rows]
+        valid = ~np.isnan(block)
+        neg = np.where(valid, -block, np.inf)
+        if kk < m:
+            picked = np.argpartition(neg, kk - 1, axis=1)[:, :kk]
+        else:
+            picked = np.broadcast_to(np.arange(m), block.shape)
+        picked_neg = np.take_along_axis(neg, picked, axis=1)
+        order = np.lexsort((picked, picked_neg))
+        picked = np.take_along_axis(picked, order, axis=1)
+        ok = np.take_along_axis(valid, picked, axis=1)
+        values[rows, :kk] = np.where(ok, np.take_along_axis(block, picked, axis=1), np.nan)
+        codes[rows, :kk] = np.where(ok, picked + 1, NIL_CODE)
+    return values, codes
+
+
+def _reference_top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    # full stable sort per row, NaNs last
+    n, m = scores.shape
+    neg = np.where(np.isnan(scores), np.inf, -scores)
+    order = np.argsort(neg, axis=1, kind="stable")[:, :k]
+    vals = np.take_along_axis(scores, order, axis=1)
+    codes = np.where(np.isnan(vals), NIL_CODE, order + 1).astype(np.int8)
+    pad = max(0, k - m)
+    return (
+        np.pad(vals, ((0, 0), (0, pad)), constant_values=np.nan),
+        np.pad(codes, ((0, 0), (0, pad)), constant_values=NIL_CODE),
+    )
+
+
+def check_ranking(cases: int = 200, seed: int = 0, max_bars: int = 300, max_products: int = 40) -> int:
+    """
+    Randomized checks of leaders and top_k against a full sort, with warm-up
+    rows, scattered NaNs and ties; raises AssertionError on the first mismatch.
+    """
+    rng = np.random.default_rng(seed)
+    for case in range(cases):
+        n = int(rng.integers(1, max_bars))
+        m = int(rng.integers(1, max_products))
+        scores = rng.normal(size=(n, m))
+        if rng.random() < 0.5:
+            scores = np.round(scores * 2) / 2  # coarse values, so ties are common
+        scores[rng.random((n, m)) < 0.2] = np.nan
+        scores[: int(rng.integers(0, n + 1))] = np.nan
+        block = int(rng.integers(1, 64))
+
+        best, codes = leaders(scores, block)
+        want_vals, want_codes = _reference_top_k(scores, 1)
+        assert np.array_equal(codes, want_codes[:, 0]), f"leaders codes mismatch in case {case}"
+        assert np.array_equal(best, want_vals[:, 0], equal_nan=True), f"leaders values mismatch in case {case}"
+
+        k = int(rng.integers(1, m + 3))
+        got_vals, got_codes = top_k(scores, k, block)
+        want_vals, want_codes = _reference_top_k(scores, k)
+        assert np.array_equal(got_vals, want_vals, equal_nan=True), f"top_k values mismatch in case {case}"
+        # codes may differ only where a tie straddles the k-th place
+        differ = got_codes != want_codes
+        tied = np.isin(want_vals, want_vals[:, -1:]) if k <= m else np.zeros_like(differ)
+        assert not (differ & ~tied).any(), f"top_k codes mismatch in case {case}"
+    return cases
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the ranking engine against a full sort")
+    parser.add_argument("--cases", type=int, default=200, help="Random cases to check")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+    print(f"{check_ranking(args.cases, args.seed)} cases match")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import argparse
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from results_io import RESULT_DTYPE
+from signal_codes import CASH_CODE, SymbolTable
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+if TYPE_CHECKING:
+    from utils import Trade
+
+# Fixed header: magic, format version, record size, committed records, capacity,
+# then the length of a JSON block (dtype, symbols, index stride). Records start at HEADER_SIZE.
+MAGIC = b"QGSTORE1"
+FORMAT_VERSION = 1
+HEADER_SIZE = 4096
+_FIXED = struct.Struct("<8sIIQQI")
+_COUNT_OFFSET = 16
+
+# Equity records are the backtester's result rows; trades are Portfolio.trade_log as codes.
+EQUITY_DTYPE = RESULT_DTYPE
+TRADE_DTYPE = np.dtype(
+    [
+        ("timestamp", "<i8"),
+        ("from_code", "i1"),
+        ("to_code", "i1"),
+        ("price", "<f8"),
+        ("size_base_ccy", "<f8"),
+        ("transaction_cost", "<f8"),
+    ]
+)
+INDEX_DTYPE = np.dtype([("timestamp", "<i8"), ("row", "<i8")])
+
+DEFAULT_INDEX_STRIDE = 1024
+DEFAULT_GROW_RECORDS = 65536
+
+
+def index_path(path: Path) -> Path:
+    return path.with_name(path.name + ".idx")
+
+
+class RecordStore:
+    """
+    Append-only file of fixed-width records with a timestamp index, read and
+    written through a shared memory map.
+
+    One writer (mode "a", holding an exclusive lock) appends; any number of
+    readers (mode "r") see every record up to the committed count in the
+    header, which the writer bumps only after the records are in place. The
+    file grows in steps of grow_records, so an append is O(1) amortized.
+    Timestamps must not decrease; every index_stride-th record's timestamp
+    goes to a sidecar store, so a lookup by time touches a handful of pages.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "r",
+        dtype: Optional[np.dtype] = None,
+        symbols: Optional[Sequence[str]] = None,
+        index_stride: int = DEFAULT_INDEX_STRIDE,
+        grow_records: int = DEFAULT_GROW_RECORDS,
+        _indexed: bool = True,
+    ) -> None:
+        if mode not in ("r", "a"):
+            raise ValueError("mode must be 'r' or 'a'")
+        self.path = Path(path)
+        self.mode = mode
+        self.grow_records = max(1, grow_records)
+        if mode == "a" and not self.path.exists():
+            if dtype is None:
+                raise ValueError("dtype is required to create a store")
+            self._create(np.dtype(dtype), list(symbols or []), index_stride)
+        self._fd = os.open(self.path, os.O_RDWR if mode == "a" else os.O_RDONLY)
+        if mode == "a" and fcntl is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(self._fd)
+                raise ValueError(f"{self.path} is already open for writing") from None
+        self._mm: Optional[mmap.mmap] = None
+        self._map()
+        if dtype is not None and np.dtype(dtype) != self.dtype:
+            self.close()
+            raise ValueError(f"{self.path} holds {self.dtype}, not {np.dtype(dtype)}")
+        self.index: Optional[RecordStore] = None
+        if _indexed and "timestamp" in self.dtype.names:
+            self.index = RecordStore(
+                str(index_path(self.path)), mode, INDEX_DTYPE if mode == "a" else None,
+                grow_records=self.grow_records, _indexed=False,
+            )
+
+    def _create(self, dtype: np.dtype, symbols: List[str], index_stride: int) -> None:
+        meta = json.dumps(
+            {"dtype": np.lib.format.dtype_to_descr(dtype), "symbols": symbols, "index_stride": index_stride}
+        ).encode("utf-8")
+        if _FIXED.size + len(meta) > HEADER_SIZE:
+            raise ValueError("Store metadata does not fit the header")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_FIXED.pack(MAGIC, FORMAT_VERSION, dtype.itemsize, 0, self.grow_records, len(meta)) + meta)
+            f.truncate(HEADER_SIZE + dtype.itemsize * self.grow_records)
+        os.replace(tmp, self.path)
+
+    def _map(self) -> None:
+        # the old map is left to the garbage collector: views handed out by records() may still use it
+        size = os.fstat(self._fd).st_size
+        access = mmap.ACCESS_WRITE if self.mode == "a" else mmap.ACCESS_READ
+        self._mm = mmap.mmap(self._fd, size, access=access)
+        magic, version, record_size, _, capacity, meta_len = _FIXED.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a record store")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{self.path} has store format {version}, expected {FORMAT_VERSION}")
+        meta = json.loads(bytes(self._mm[_FIXED.size:_FIXED.size + meta_len]).decode("utf-8"))
+        self.dtype = np.lib.format.descr_to_dtype(
+            [tuple(f) for f in meta["dtype"]] if isinstance(meta["dtype"], list) else meta["dtype"]
+        )
+        self.symbols: List[str] = meta["symbols"]
+        self.index_stride: int = meta["index_stride"]
+        self.capacity = min(capacity, (size - HEADER_SIZE) // record_size)
+        self._count = np.frombuffer(self._mm, dtype="<u8", count=1, offset=_COUNT_OFFSET)
+        self._records = np.frombuffer(self._mm, dtype=self.dtype, count=self.capacity, offset=HEADER_SIZE)
+        if self.mode == "r":
+            self._records.flags.writeable = False
+
+    def __len__(self) -> int:
+        return int(self._count[0])
+
+    @property
+    def table(self) -> SymbolTable:
+        return SymbolTable(self.symbols[1:], cash_symbol=self.symbols[0])
+
+    def refresh(self) -> int:
+        """Pick up records a writer committed since the last look; returns the count."""
+        n = len(self)
+        if n > self.capacity:
+            self._map()
+        if self.index is not None:
+            self.index.refresh()
+        return n
+
+    def records(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Read-only view of committed records [start, stop); no copy."""
+        n = self.refresh()
+        stop = n if stop is None else min(stop, n)
+        view = self._records[start:stop]
+        if self.mode == "a":
+            view = view.view()
+            view.flags.writeable = False
+        return view
+
+    def _grow(self, needed: int) -> None:
+        capacity = max(needed, self.capacity + self.grow_records, 2 * self.capacity)
+        os.ftruncate(self._fd, HEADER_SIZE + capacity * self.dtype.itemsize)
+        struct.pack_into("<Q", self._mm, _COUNT_OFFSET + 8, capacity)
+        self._map()
+
+    def append(self, records: np.ndarray) -> None:
+        """Append records (a structured array of this store's dtype) and commit them."""
+        if self.mode != "a":
+            raise ValueError("Store is open read-only")
+        records = np.atleast_1d(np.asarray(records, dtype=self.dtype))
+        k = len(records)
+        if k == 0:
+            return
+        n = len(self)
+        if self.index is not None:
+            ts = records["timestamp"]
+            last = self._records[n - 1]["timestamp"] if n else ts[0]
+            if ts[0] < last or (k > 1 and (np.diff(ts) < 0).any()):
+                raise ValueError("Record timestamps must not decrease")
+        if n + k > self.capacity:
+            self._grow(n + k)
+        self._records[n:n + k] = records
+        if self.index is not None:
+            rows = np.arange(-n % self.index_stride, k, self.index_stride)
+            if len(rows):
+                entries = np.empty(len(rows), dtype=INDEX_DTYPE)
+                entries["timestamp"] = records["timestamp"][rows]
+                entries["row"] = rows + n
+                self.index.append(entries)
+        # readers only look below the count, so it moves last
+        self._count[0] = n + k
+
+    def locate(self, timestamp: int, side: str = "left") -> int:
+        """First row whose timestamp is >= (side "left") or > (side "right") timestamp."""
+        n = self.refresh()
+        lo, hi = 0, n
+        if self.index is not None:
+            idx = self.index.records()
+            idx = idx[idx["row"] < n]
+            b = int(np.searchsorted(idx["timestamp"], timestamp, side=side))
+            lo = int(idx["row"][b - 1]) if b > 0 else 0
+            hi = int(idx["row"][b]) if b < len(idx) else n
+        block = self._records[lo:hi]["timestamp"]
+        return lo + int(np.searchsorted(block, timestamp, side=side))
+
+    def between(self, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        """Records with start <= timestamp <= end, as a read-only view."""
+        lo = 0 if start is None else self.locate(start, "left")
+        hi = None if end is None else self.locate(end, "right")
+        return self.records(lo, hi)
+
+    def flush(self) -> None:
+        """Push written pages to disk (readers see appends without this)."""
+        if self.mode == "a":
+            self._mm.flush()
+            if self.index is not None:
+                self.index.flush()
+
+    def close(self) -> None:
+        if self._mm is None:
+            return
+        self.flush()
+        if self.index is not None:
+            self.index.close()
+        self._records = None
+        self._count = None
+        try:
+            self._mm.close()
+        except BufferError:  # views from records() are still alive; the map closes with them
+            pass
+        self._mm = None
+        os.close(self._fd)
+
+    def __enter__(self) -> RecordStore:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def trade_records(trades: Sequence[Trade], table: SymbolTable) -> np.ndarray:
+    """Portfolio trades as TRADE_DTYPE records; the price is whichever side of the fill is set."""
+    rec = np.empty(len(trades), dtype=TRADE_DTYPE)
+    for i, t in enumerate(trades):
+        price = t.price_from if t.price_from is not None else t.price_to
+        rec[i] = (t.timestamp, table.code(t.from_asset), table.code(t.to_asset), price, t.size_base_ccy, t.transaction_cost)
+    return rec
+
+
+def trades_from_records(rec: np.ndarray, table: SymbolTable) -> List[Trade]:
+    from utils import Trade
+
+    out = []
+    for ts, from_code, to_code, price, size, fee in rec.tolist():
+        selling = to_code == CASH_CODE
+        out.append(
+            Trade(
+                timestamp=ts,
+                from_asset=table.symbols[from_code],
+                to_asset=table.symbols[to_code],
+                price_from=price if selling else None,
+                price_to=None if selling else price,
+                size_base_ccy=size,
+                transaction_cost=fee,
+            )
+        )
+    return out
+
+
+class RunStore:
+    """
+    equity.rec and trades.rec for one run in a directory, appended bar by bar.
+
+    Reopening the directory appends to what is there, so a restarted live run
+    continues its curve (its bars must not go back in time).
+    """
+
+    def __init__(self, directory: str, table: SymbolTable) -> None:
+        out = Path(directory)
+        self.table = table
+        self.equity = RecordStore(str(out / "equity.rec"), "a", EQUITY_DTYPE, symbols=table.symbols)
+        self.trades = RecordStore(str(out / "trades.rec"), "a", TRADE_DTYPE, symbols=table.symbols)
+        self._bar = np.zeros(1, dtype=EQUITY_DTYPE)
+
+    def bar(self, timestamp: int, signal: int, holding: int, value: float) -> None:
+        self._bar[0] = (timestamp, signal, holding, value)
+        self.equity.append(self._bar)
+
+    def add_trades(self, trades: Sequence[Trade]) -> None:
+        if trades:
+            self.trades.append(trade_records(trades, self.table))
+
+    def close(self) -> None:
+        self.equity.close()
+        self.trades.close()
+
+
+def describe(path: str) -> Dict[str, Any]:
+    with RecordStore(path) as store:
+        n = len(store)
+        info: Dict[str, Any] = {
+            "records": n,
+            "capacity": store.capacity,
+            "fields": list(store.dtype.names),
+            "symbols": store.symbols,
+        }
+        if n and "timestamp" in store.dtype.names:
+            rec = store.records()
+            info["first_timestamp"] = int(rec["timestamp"][0])
+            info["last_timestamp"] = int(rec["timestamp"][-1])
+    return info
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect an append-only record store (equity or trades)")
+    parser.add_argument("path", help="Store file (.rec)")
+    parser.add_argument("--start", type=int, default=None, help="First timestamp to print")
+    parser.add_argument("--end", type=int, default=None, help="Last timestamp to print")
+    parser.add_argument("--tail", type=int, default=5, help="Records to print when no range is given")
+    args = parser.parse_args()
+
+    for key, value in describe(args.path).items():
+        print(f"{key}: {value}")
+    with RecordStore(args.path) as store:
+        if args.start is not None or args.end is not None:
+            rec = store.between(args.start, args.end)
+        else:
+            rec = store.records(max(0, len(store) - args.tail))
+        import pandas as pd
+
+        print(pd.DataFrame(rec).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
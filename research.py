@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+import instrument
+from ranking import leaders
+from signal_codes import CodedSignals, SymbolTable
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# A strategy turns a session and keyword parameters into one int8 signal code per bar.
+Strategy = Callable[..., Union[np.ndarray, CodedSignals]]
+
+
+def lagged_returns(closes: np.ndarray, lookback: int) -> np.ndarray:
+    """Percent change of every column over lookback bars; NaN for the first lookback rows."""
+    prev = np.full_like(closes, np.nan)
+    prev[lookback:] = closes[: max(len(closes) - lookback, 0)]
+    return ((closes - prev) / prev) * 100
+
+
+def _sma(closes: np.ndarray, window: int) -> np.ndarray:
+    # the rolling mean pandas gives, NaN until the window is full
+    import pandas as pd
+
+    return pd.DataFrame(closes).rolling(window=window).mean().to_numpy()
+
+
+# Indicators a session can compute and cache: name -> fn(closes, **params).
+INDICATORS: Dict[str, Callable[..., np.ndarray]] = {
+    "returns": lagged_returns,
+    "sma": _sma,
+}
+
+
+def momentum(session: ResearchSession, lookback: int = 100, return_threshold: float = 1.75) -> np.ndarray:
+    """strat/momentum.py for one lookback: enter the leader above the threshold, exit on a change of leader or a fall below it."""
+    from kernels import threshold_hold
+
+    rets = session.indicator("returns", lookback=lookback)
+    best, codes = session.leaders("returns", lookback=lookback)
+    signals, _ = threshold_hold(
+        rets, best, codes, session.closes, lookback, float(return_threshold), session.initial_capital
+    )
+    return signals
+
+
+def sma_slope(session: ResearchSession, window: int = 50, lookback: int = 25) -> np.ndarray:
+    """strat/sma.py: hold the product whose moving average climbs fastest until another overtakes it."""
+    from kernels import hold_until_change
+
+    sma = session.indicator("sma", window=window)
+    slope = lagged_returns(sma, lookback)
+    _, codes = leaders(slope)
+    return hold_until_change(codes, lookback + window)
+
+
+STRATEGIES: Dict[str, Strategy] = {"momentum": momentum, "sma": sma_slope}
+
+
+def expand_grid(grid: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Cartesian product of a {param: value or sequence of values} grid, in name order."""
+    names = sorted(grid)
+    values = [list(v) if isinstance(v, (list, tuple, range, np.ndarray)) else [v] for v in (grid[n] for n in names)]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+class ResearchSession:
+    """
+    Prices, indicators and a batch backtester that stay in memory between notebook cells.
+
+    Indicators are cached by name and parameters, so a grid that revisits a
+    lookback reuses its returns. Backtests run every signal series through
+    kernels.portfolio_path at close prices, which matches backtest.py bar for
+    bar, and score them together with metrics.compute_metrics.
+    """
+
+    def __init__(
+        self,
+        prices: pd.DataFrame,
+        cash_symbol: str = "ORBS",
+        initial_capital: float = 1000.0,
+        tx_cost: float = 0.0,
+    ) -> None:
+        from backtest import close_prices
+
+        closes = close_prices(prices)
+        self.products = [c for c in closes.columns if c != "timestamp"]
+        self.table = SymbolTable(self.products, cash_symbol=cash_symbol)
+        self.timestamps = closes["timestamp"].to_numpy()
+        self.closes = closes[self.products].to_numpy(dtype=float)
+        self.frame = prices
+        self.initial_capital = initial_capital
+        self.tx_cost = tx_cost
+        self._cache: Dict[Tuple[Any, ...], Any] = {}
+
+    @classmethod
+    def load(cls, path: str, start: Optional[float] = None, end: Optional[float] = None, **kwargs: Any) -> ResearchSession:
+        """Read a prices file once (optionally just start <= timestamp <= end)."""
+        from price_index import read_price_range
+
+        return cls(read_price_range(path, start, end).reset_index(drop=True), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.closes)
+
+    def indicator(self, name: str, **params: Any) -> np.ndarray:
+        """A (bars, products) indicator from INDICATORS, computed once per parameter set."""
+        key = (name, tuple(sorted(params.items())))
+        cached = self._cache.get(key)
+        if cached is None:
+            if name not in INDICATORS:
+                raise ValueError(f"Unknown indicator {name!r}; expected one of {sorted(INDICATORS)}")
+            cached = INDICATORS[name](self.closes, **params)
+            self._cache[key] = cached
+        return cached
+
+    def leaders(self, name: str, **params: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-bar best value and its signal code for an indicator, cached like the indicator."""
+        key = ("leaders", name, tuple(sorted(params.items())))
+        cached = self._cache.get(key)
+        if cached is None:
+            cached = leaders(self.indicator(name, **params))
+            self._cache[key] = cached
+        return cached
+
+    def clear(self) -> None:
+        """Drop every cached indicator."""
+        self._cache.clear()
+
+    def signals(self, strategy: Union[str, Strategy], grid: Optional[Dict[str, Any]] = None) -> List[Tuple[Dict[str, Any], CodedSignals]]:
+        """Signals of a strategy (a STRATEGIES name or a function) for every parameter set in grid."""
+        fn = STRATEGIES[strategy] if isinstance(strategy, str) else strategy
+        out = []
+        for params in expand_grid(grid or {}):
+            with instrument.stage("signals"):
+                codes = fn(self, **params)
+            if not isinstance(codes, CodedSignals):
+                codes = CodedSignals(np.asarray(codes, dtype=np.int8), self.table, self.timestamps)
+            out.append((params, codes.recode(self.table)))
+        return out
+
+    def equity(self, signals: Sequence[CodedSignals], tx_cost: Optional[float] = None) -> Tuple[np.ndarray, List[int]]:
+        """(series, bars) equity matrix and trade counts, filled at close like backtest.py's default."""
+        from kernels import portfolio_path
+
+        cost = self.tx_cost if tx_cost is None else tx_cost
+        values = np.empty((len(signals), len(self)))
+        trades = []
+        for i, s in enumerate(signals):
+            if len(s) != len(self):
+                raise ValueError(f"Signals have {len(s)} rows but the session has {len(self)} bars")
+            path = portfolio_path(s.codes, self.closes, self.closes, self.closes, self.initial_capital, cost)
+            values[i] = path.values
+            trades.append(len(path.trades))
+        return values, trades
+
+    def backtest(self, runs: Sequence[Tuple[Dict[str, Any], CodedSignals]], tx_cost: Optional[float] = None, risk_free: float = 0.0) -> pd.DataFrame:
+        """One tidy row per run: its parameters, total_trades and every metrics.compute_metrics column."""
+        from metrics import metrics_frame
+
+        import pandas as pd
+
+        with instrument.stage("equity"):
+            values, trades = self.equity([s for _, s in runs], tx_cost)
+        params = pd.DataFrame([p for p, _ in runs], index=range(len(runs)))
+        with instrument.stage("metrics"):
+            metrics = metrics_frame(values, timestamps=self.timestamps, risk_free=risk_free)
+        metrics.insert(0, "total_trades", trades)
+        return pd.concat([params, metrics], axis=1)
+
+    def run(self, strategy: Union[str, Strategy], grid: Optional[Dict[str, Any]] = None, **kwargs: Any) -> pd.DataFrame:
+        """signals then backtest: the metrics frame of a strategy over a parameter grid."""
+        return self.backtest(self.signals(strategy, grid), **kwargs)
+
+
+def _parse_grid(items: Sequence[str]) -> Dict[str, Any]:
+    # name=v1,v2,... or name=start:stop:step
+    grid: Dict[str, Any] = {}
+    for item in items:
+        name, _, spec = item.partition("=")
+        if not spec:
+            raise ValueError(f"Expected name=values, got {item!r}")
+        if ":" in spec:
+            start, stop, step = (float(v) for v in spec.split(":"))
+            values = np.arange(start, stop, step)
+            grid[name] = [int(v) for v in values] if all(float(v).is_integer() for v in (start, step)) else values.tolist()
+        else:
+            grid[name] = [float(v) if "." in v else int(v) for v in spec.split(",")]
+    return grid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backtest a built-in strategy over a parameter grid in memory")
+    parser.add_argument("--prices", required=True, help="Prices CSV")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="momentum")
+    parser.add_argument("--grid", nargs="*", default=[], help="name=v1,v2 or name=start:stop:step, e.g. lookback=10:750:10")
+    parser.add_argument("--sort", default="sharpe", help="Metric to sort by, best first")
+    parser.add_argument("--top", type=int, default=10, help="Rows to print")
+    parser.add_argument("--tx_cost", type=float, default=0.0)
+    parser.add_argument("--output", default=None, help="Optional CSV of the full metrics frame")
+    instrument.add_argument(parser)
+    args = parser.parse_args()
+
+    with instrument.session(args.instrument, args.instrument_top):
+        import time
+
+        with instrument.stage("load_prices"):
+            session = ResearchSession.load(args.prices, tx_cost=args.tx_cost)
+        start = time.perf_counter()
+        frame = session.run(args.strategy, _parse_grid(args.grid))
+        elapsed = time.perf_counter() - start
+        print(f"{len(frame)} runs in {elapsed:.2f}s")
+        print(frame.sort_values(args.sort, ascending=False).head(args.top).to_string(index=False))
+        if args.output:
+            frame.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
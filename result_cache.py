@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from signal_codes import CodedSignals
+
+DEFAULT_CACHE_DIR = "results/cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Bump when the simulation changes in a way that alters results for the same inputs.
+CACHE_VERSION = 2  # 2: metrics annualized from the bar spacing (was always 252)
+
+# Puts between full rescans of a store; other processes writing to it are only seen by a rescan.
+RESCAN_PUTS = 256
+
+# An eviction frees space down to this fraction of max_bytes, so the puts after it do not each trigger one.
+LOW_WATER = 0.9
+
+# run_backtest arguments that only change how results are reported, not what they are.
+_OUTPUT_PARAMS = ("writer", "chunk_size", "verbose", "log")
+
+# Running size of each store this process writes to: resolved root -> [bytes, puts since the last scan].
+_usage: Dict[str, List[int]] = {}
+
+# Digests of price files, keyed by path, size and mtime so unchanged files are hashed once.
+_file_digests: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's bytes."""
+    resolved = str(Path(path).resolve())
+    st = os.stat(resolved)
+    memo = (resolved, st.st_size, st.st_mtime_ns)
+    digest = _file_digests.get(memo)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(resolved, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        _file_digests[memo] = digest
+    return digest
+
+
+def signals_digest(signals: CodedSignals) -> str:
+    """SHA-256 of the coded signal array, its timestamps and symbol table."""
+    h = hashlib.sha256()
+    h.update(json.dumps(signals.table.symbols).encode("utf-8"))
+    h.update(np.ascontiguousarray(signals.codes, dtype=np.int8).tobytes())
+    if signals.timestamps is not None:
+        h.update(np.ascontiguousarray(signals.timestamps, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+def backtest_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    params merged over run_backtest's defaults, so spelling a default out and
+    leaving it off give the same key; arguments that cannot change results
+    are dropped and numbers take the type of their default.
+    """
+    import inspect
+
+    from backtest import run_backtest
+
+    merged = {
+        name: p.default
+        for name, p in inspect.signature(run_backtest).parameters.items()
+        if p.default is not inspect.Parameter.empty and name not in _OUTPUT_PARAMS
+    }
+    for name, value in params.items():
+        if name in _OUTPUT_PARAMS:
+            continue
+        if isinstance(merged.get(name), float) and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        merged[name] = value
+    return merged
+
+
+def cache_key(prices_digest: str, signals: CodedSignals, params: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        {
+            "version": CACHE_VERSION,
+            "prices": prices_digest,
+            "signals": signals_digest(signals),
+            "params": backtest_params(params),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Backtest summaries and equity curves on local disk, addressed by a hash of their inputs.
+
+    Entries are .npz files; a hit refreshes the entry's mtime, and once the
+    store grows past max_bytes the least recently used entries are deleted.
+    The store's size is kept as a running total per process, so a put only
+    scans the directory when that total passes max_bytes or every
+    RESCAN_PUTS puts, when it picks up what other processes wrote.
+    """
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self._usage_key = str(self.root.resolve())
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.npz"
+
+    def get(self, key: str, with_curve: bool = False) -> Optional[Tuple[Dict[str, float], Optional[np.ndarray]]]:
+        """(summary, equity curve or None) for a key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                summary = json.loads(str(data["summary"]))
+                curve = data["value"] if with_curve and "value" in data.files else None
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return summary, curve
+
+    def put(self, key: str, summary: Dict[str, float], curve: Optional[np.ndarray] = None) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+        arrays = {"summary": np.array(json.dumps(summary))}
+        if curve is not None:
+            arrays["value"] = np.asarray(curve, dtype=float)
+        # write then rename so concurrent readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            size = os.path.getsize(tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        usage = _usage.get(self._usage_key)
+        if usage is None:
+            self.evict()
+            return
+        usage[0] += size - replaced
+        usage[1] += 1
+        if usage[0] > self.max_bytes or usage[1] >= RESCAN_PUTS:
+            self.evict()
+
+    def entries(self) -> List[Path]:
+        return [p for p in self.root.glob("*/*.npz") if p.is_file()]
+
+    def size(self) -> int:
+        return sum(p.stat().st_size for p in self.entries())
+
+    def evict(self) -> int:
+        """
+        Delete least recently used entries once the store is over max_bytes,
+        down to LOW_WATER of it; returns how many went. Scans the whole store
+        and resets the running total.
+        """
+        entries = []
+        for p in self.entries():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * LOW_WATER if total > self.max_bytes else self.max_bytes
+        removed = 0
+        for _, size, p in sorted(entries):
+            if total <= target:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        _usage[self._usage_key] = [total, 0]
+        return removed
+
+    def invalidate(self, key: Optional[str] = None) -> int:
+        """Drop one entry, or the whole store when key is None."""
+        paths = [self._path(key)] if key is not None else self.entries()
+        removed = 0
+        for p in paths:
+            if p.exists():
+                p.unlink()
+                removed += 1
+        _usage.pop(self._usage_key, None)  # rescanned on the next put
+        return removed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect or clear the backtest result cache")
+    parser.add_argument("command", choices=("stats", "clear"))
+    parser.add_argument("--cache_dir", default=DEFAULT_CACHE_DIR, help="Cache directory")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache_dir)
+    if args.command == "clear":
+        print(f"removed {cache.invalidate()} entries from {cache.root}")
+    else:
+        entries = cache.entries()
+        print(f"{len(entries)} entries, {cache.size() / 1e6:.2f} MB in {cache.root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import json
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from signal_codes import SymbolTable
+
+# On-disk record layout for the memory-mapped (.npy) results format.
+RESULT_DTYPE = np.dtype(
+    [("timestamp", "<i8"), ("signal", "i1"), ("holding", "i1"), ("new_portfolio_value", "<f8")]
+)
+
+
+@dataclass
+class ResultColumns:
+    """Per-bar backtest output as parallel NumPy columns (codes, not labels)."""
+
+    timestamp: np.ndarray
+    signal: np.ndarray
+    holding: np.ndarray
+    value: np.ndarray
+    table: SymbolTable
+    # trades executed on each bar, counted like Portfolio.num_trades; kept in
+    # memory only, the holding column cannot recover trades on the last bar
+    trades: Optional[np.ndarray] = None
+
+    @classmethod
+    def allocate(cls, timestamps: np.ndarray, signal_codes: np.ndarray, table: SymbolTable) -> ResultColumns:
+        n = len(timestamps)
+        return cls(
+            timestamp=timestamps,
+            signal=signal_codes,
+            holding=np.empty(n, dtype=np.int8),
+            value=np.empty(n, dtype=float),
+            table=table,
+            trades=np.zeros(n, dtype=np.int64),
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def slice(self, start: int, stop: int) -> ResultColumns:
+        return ResultColumns(
+            timestamp=self.timestamp[start:stop],
+            signal=self.signal[start:stop],
+            holding=self.holding[start:stop],
+            value=self.value[start:stop],
+            table=self.table,
+            trades=None if self.trades is None else self.trades[start:stop],
+        )
+
+    def to_records(self) -> np.ndarray:
+        rec = np.empty(len(self), dtype=RESULT_DTYPE)
+        rec["timestamp"] = self.timestamp
+        rec["signal"] = self.signal
+        rec["holding"] = self.holding
+        rec["new_portfolio_value"] = self.value
+        return rec
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "timestamp": self.timestamp,
+                "signal": self.table.decode(self.signal),
+                "holding": self.table.decode(self.holding),
+                "new_portfolio_value": self.value,
+            }
+        )
+
+
+class ResultWriter(ABC):
+    """
+    Receives ResultColumns chunks in bar order and persists them.
+
+    Subclasses implement _write. Use as a context manager; close() finalizes
+    the file.
+    """
+
+    def __init__(self, path: str, table: SymbolTable, n_rows: int) -> None:
+        self.path = Path(path)
+        self.table = table
+        self.n_rows = n_rows
+        self.rows_written = 0
+
+    def write(self, chunk: ResultColumns) -> None:
+        self._write(chunk)
+        self.rows_written += len(chunk)
+
+    @abstractmethod
+    def _write(self, chunk: ResultColumns) -> None:
+        """Persist one chunk."""
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> ResultWriter:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+class CsvResultWriter(ResultWriter):
+    """Appends each chunk as CSV text, header once."""
+
+    def __init__(self, path: str, table: SymbolTable, n_rows: int) -> None:
+        super().__init__(path, table, n_rows)
+        self._fh = open(self.path, "w", encoding="utf-8", newline="")
+
+    def _write(self, chunk: ResultColumns) -> None:
+        chunk.to_frame().to_csv(self._fh, index=False, header=self.rows_written == 0)
+
+    def close(self) -> None:
+        if self.rows_written == 0:
+            self._fh.write(",".join(RESULT_DTYPE.names) + "\n")
+        self._fh.close()
+
+
+class NpzResultWriter(ResultWriter):
+    """Collects chunks and writes one `.npz` of code columns plus the symbol table."""
+
+    def __init__(self, path: str, table: SymbolTable, n_rows: int) -> None:
+        super().__init__(path, table, n_rows)
+        self._chunks: List[np.ndarray] = []
+
+    def _write(self, chunk: ResultColumns) -> None:
+        self._chunks.append(chunk.to_records())
+
+    def close(self) -> None:
+        rec = np.concatenate(self._chunks) if self._chunks else np.empty(0, dtype=RESULT_DTYPE)
+        np.savez(
+            self.path,
+            symbols=np.array(self.table.symbols),
+            **{name: rec[name] for name in RESULT_DTYPE.names},
+        )
+
+
+class MemmapResultWriter(ResultWriter):
+    """
+    Writes fixed-width records straight into a preallocated memory-mapped `.npy`.
+
+    Readers can open the file with np.load(path, mmap_mode="r") while the run is
+    in progress; the symbol table goes to a `.symbols.json` sidecar.
+    """
+
+    def __init__(self, path: str, table: SymbolTable, n_rows: int) -> None:
+        super().__init__(path, table, n_rows)
+        self._mm = np.lib.format.open_memmap(self.path, mode="w+", dtype=RESULT_DTYPE, shape=(n_rows,))
+        symbols_path(self.path).write_text(json.dumps(list(table.symbols)), encoding="utf-8")
+
+    def _write(self, chunk: ResultColumns) -> None:
+        self._mm[self.rows_written : self.rows_written + len(chunk)] = chunk.to_records()
+        self._mm.flush()
+
+    def close(self) -> None:
+        self._mm.flush()
+        del self._mm
+
+
+class ParquetResultWriter(ResultWriter):
+    """Streams one row group per chunk, with dictionary-encoded symbol columns (needs pyarrow)."""
+
+    def __init__(self, path: str, table: SymbolTable, n_rows: int) -> None:
+        super().__init__(path, table, n_rows)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Writing .parquet results requires pyarrow (pip install pyarrow)") from e
+        self._pa = pa
+        self._labels = pa.array(list(table.symbols) + ["NIL"])
+        self._writer: Optional[object] = None
+        self._pq = pq
+
+    def _dict_column(self, codes: np.ndarray) -> object:
+        idx = np.where(codes < 0, len(self.table), codes).astype(np.int8)
+        return self._pa.DictionaryArray.from_arrays(self._pa.array(idx), self._labels)
+
+    def _write(self, chunk: ResultColumns) -> None:
+        batch = self._pa.table(
+            {
+                "timestamp": self._pa.array(chunk.timestamp),
+                "signal": self._dict_column(chunk.signal),
+                "holding": self._dict_column(chunk.holding),
+                "new_portfolio_value": self._pa.array(chunk.value),
+            }
+        )
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(str(self.path), batch.schema)
+        self._writer.write_table(batch)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+class StoreResultWriter(ResultWriter):
+    """
+    Appends chunks to a fresh append-only record store (record_store.py).
+
+    Readers can follow the run with RecordStore(path) and look rows up by
+    timestamp; each chunk is visible to them as soon as it is written.
+    """
+
+    def __init__(self, path: str, table: SymbolTable, n_rows: int) -> None:
+        from record_store import EQUITY_DTYPE, RecordStore, index_path
+
+        super().__init__(path, table, n_rows)
+        for old in (self.path, index_path(self.path)):
+            old.unlink(missing_ok=True)
+        self._store = RecordStore(
+            str(self.path), "a", EQUITY_DTYPE, symbols=table.symbols, grow_records=max(n_rows, 1)
+        )
+
+    def _write(self, chunk: ResultColumns) -> None:
+        self._store.append(chunk.to_records())
+
+    def close(self) -> None:
+        self._store.close()
+
+
+WRITERS = {
+    ".csv": CsvResultWriter,
+    ".npz": NpzResultWriter,
+    ".npy": MemmapResultWriter,
+    ".parquet": ParquetResultWriter,
+    ".rec": StoreResultWriter,
+}
+
+
+def symbols_path(path: Path) -> Path:
+    return path.with_name(path.name + ".symbols.json")
+
+
+def open_result_writer(path: str, table: SymbolTable, n_rows: int) -> ResultWriter:
+    """Pick a writer from the output extension (CSV for anything unknown)."""
+    cls = WRITERS.get(Path(path).suffix.lower(), CsvResultWriter)
+    return cls(path, table, n_rows)
+
+
+def read_results(path: str) -> pd.DataFrame:
+    """Read any results format back into the labelled results frame."""
+    suffix = Path(path).suffix.lower()
+    if suffix == ".parquet":
+        df = pd.read_parquet(path)
+        df["signal"] = df["signal"].astype(str)
+        df["holding"] = df["holding"].astype(str)
+        return df
+    if suffix not in (".npz", ".npy", ".rec"):
+        return pd.read_csv(path, float_precision="round_trip")
+    if suffix == ".rec":
+        from record_store import RecordStore
+
+        with RecordStore(path) as store:
+            symbols = store.symbols
+            rec = store.records()
+            cols = {name: np.array(rec[name]) for name in RESULT_DTYPE.names}
+    elif suffix == ".npz":
+        with np.load(path, allow_pickle=False) as z:
+            symbols = [str(s) for s in z["symbols"]]
+            cols = {name: z[name] for name in RESULT_DTYPE.names}
+    else:
+        symbols = json.loads(symbols_path(Path(path)).read_text(encoding="utf-8"))
+        rec = np.load(path, mmap_mode="r")
+        cols = {name: np.asarray(rec[name]) for name in RESULT_DTYPE.names}
+    table = SymbolTable(symbols[1:], cash_symbol=symbols[0])
+    return ResultColumns(
+        timestamp=cols["timestamp"],
+        signal=cols["signal"],
+        holding=cols["holding"],
+        value=cols["new_portfolio_value"],
+        table=table,
+    ).to_frame()
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional, Sequence, Tuple
+
+import numpy as np
+
+from signal_codes import CASH_CODE
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from results_io import ResultColumns
+
+_VAR_FLOOR = 1e-18
+
+
+def _window_sum(cs: np.ndarray, w: int) -> np.ndarray:
+    """Sums of the trailing w elements from a cumulative sum with a leading zero; NaN until w are available."""
+    out = np.full(len(cs) - 1, np.nan)
+    out[w - 1:] = cs[w:] - cs[:-w]
+    return out
+
+
+def rolling_max(x: np.ndarray, w: int) -> np.ndarray:
+    """
+    Trailing w-bar maximum in O(n), NaN until w bars are available.
+
+    Van Herk/Gil-Werman: split into blocks of w, take running maxima forward
+    and backward inside each block; every window spans at most two blocks.
+    """
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    out = np.full(n, np.nan)
+    if w > n:
+        return out
+    pad = (-n) % w
+    blocks = np.concatenate([x, np.full(pad, -np.inf)]).reshape(-1, w)
+    prefix = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    end = np.arange(w - 1, n)
+    out[w - 1:] = np.maximum(suffix[end - w + 1], prefix[end])
+    return out
+
+
+def rolling_regression(x: np.ndarray, y: np.ndarray, w: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    OLS fit y = alpha + beta * x over each trailing w bars: (alpha, beta,
+    residual std), NaN until w bars are available and where x is flat.
+
+    Window sums of x, y, x*x, x*y and y*y come from cumulative sums, so any
+    w costs O(n). Each bar's fit uses that bar and the w - 1 before it only.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if x.shape != y.shape or x.ndim != 1:
+        raise ValueError("x and y must be 1-d arrays of the same length")
+    if w < 2:
+        raise ValueError("Regression windows must be at least 2 bars")
+    if not (np.isfinite(x).all() and np.isfinite(y).all()):
+        raise ValueError("x and y must be finite")
+    # centre before squaring so the cumulative sums do not lose the variance to cancellation
+    x_shift = x.mean() if len(x) else 0.0
+    y_shift = y.mean() if len(y) else 0.0
+    xc = x - x_shift
+    yc = y - y_shift
+
+    def mean(v: np.ndarray) -> np.ndarray:
+        return _window_sum(np.concatenate([[0.0], np.cumsum(v)]), w) / w
+
+    mx, my = mean(xc), mean(yc)
+    sq_x = mean(xc * xc)
+    var_x = sq_x - mx * mx
+    cov = mean(xc * yc) - mx * my
+    var_y = mean(yc * yc) - my * my
+    # a flat window leaves rounding residue on the order of eps * x^2, not variance
+    flat = ~(var_x > 1e-12 * sq_x)
+    beta = np.where(flat, np.nan, cov / np.where(flat, 1.0, var_x))
+    alpha = (my + y_shift) - beta * (mx + x_shift)
+    resid_var = np.maximum(var_y - beta * cov, 0.0)
+    return alpha, beta, np.sqrt(resid_var)
+
+
+def trades_per_bar(holding: np.ndarray) -> np.ndarray:
+    """
+    Trades executed on each bar, counted like Portfolio.num_trades.
+
+    holding[i] is what was held going into bar i, so bar i traded when
+    holding[i + 1] differs: one trade to leave a product, one to enter one.
+    The last element is the holding after the final liquidation, which
+    happens on the last bar, so that last change is counted there. Trades
+    on the second-to-last bar are folded into the liquidation; the exact
+    per-bar counts are ResultColumns.trades.
+    """
+    holding = np.asarray(holding)
+    before = holding[:-1]
+    after = holding[1:]
+    changed = (before != after) * ((before != CASH_CODE).astype(np.int64) + (after != CASH_CODE))
+    trades = np.zeros(len(holding), dtype=np.int64)
+    if len(changed):
+        trades[:-2] = changed[:-1]
+        trades[-1] = changed[-1]
+    return trades
+
+
+def rolling_metrics(
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    windows: Sequence[int],
+    holding: Optional[np.ndarray] = None,
+    risk_free: float = 0.0,
+    freq_per_year: Optional[int] = None,
+    trades: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """
+    Rolling Sharpe, volatility, drawdown from the trailing peak, and trade
+    counts for every window length, one column per (metric, window).
+
+    Means and variances come from cumulative sums of the returns, so each
+    window costs O(n) regardless of its length. Definitions match Evaluator
+    (simple returns, population std, annualized with freq_per_year, which
+    is inferred from the timestamps like Evaluator's when not given).
+    Trade counts use trades (per bar) when given, else the holding column.
+    """
+    import pandas as pd
+
+    from metrics import infer_freq_per_year
+
+    if freq_per_year is None:
+        freq_per_year = infer_freq_per_year(timestamps)
+
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    returns = np.zeros(n)
+    returns[1:] = values[1:] / values[:-1] - 1.0
+    rf_period = (1 + risk_free) ** (1 / freq_per_year) - 1
+    excess = returns - rf_period
+    # centre before squaring so the cumulative sums do not lose the variance to cancellation
+    shift = excess.mean() if n else 0.0
+    centred = excess - shift
+    cs = np.concatenate([[0.0], np.cumsum(centred)])
+    cs2 = np.concatenate([[0.0], np.cumsum(centred * centred)])
+    if trades is None and holding is not None:
+        trades = trades_per_bar(holding)
+    trades_cs = None if trades is None else np.concatenate([[0], np.cumsum(trades)])
+
+    columns = {"timestamp": np.asarray(timestamps)}
+    ann = np.sqrt(freq_per_year)
+    for w in windows:
+        if w < 2:
+            raise ValueError("Rolling windows must be at least 2 bars")
+        mean_c = _window_sum(cs, w) / w
+        var = _window_sum(cs2, w) / w - mean_c * mean_c
+        # flat windows (all cash) leave rounding residue, not variance
+        var[var < _VAR_FLOOR] = 0.0
+        std = np.sqrt(var)
+        safe = np.where(std > 0, std, 1.0)
+        columns[f"sharpe_{w}"] = np.where(std > 0, (mean_c + shift) / safe * ann, np.where(np.isnan(std), np.nan, 0.0))
+        columns[f"volatility_{w}"] = std * ann
+        columns[f"drawdown_{w}"] = (values / rolling_max(values, w) - 1.0) * 100
+        if trades_cs is not None:
+            columns[f"trades_{w}"] = _window_sum(trades_cs.astype(float), w)
+
+    frame = pd.DataFrame(columns)
+    metric_cols = [c for c in frame.columns if c != "timestamp"]
+    frame[metric_cols] = frame[metric_cols].astype(np.float32)
+    return frame
+
+
+def rolling_from_results(
+    results: ResultColumns, windows: Sequence[int], risk_free: float = 0.0
+) -> pd.DataFrame:
+    from metrics import infer_freq_per_year
+
+    return rolling_metrics(
+        results.timestamp,
+        results.value,
+        windows,
+        holding=results.holding,
+        risk_free=risk_free,
+        freq_per_year=infer_freq_per_year(results.timestamp),
+        trades=results.trades,
+    )
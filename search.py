@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+import argparse
+import math
+import multiprocessing
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import instrument
+
+# numpy and pandas are imported where they are used, so `--help` stays cheap.
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# Metrics from metrics.compute_metrics that can be maximized by name.
+OBJECTIVES = ("sharpe", "final_value", "calmar", "sortino", "cagr")
+
+# A custom objective scores one equity curve; higher is better. It must be a
+# module-level function to run in the worker processes.
+Objective = Union[str, Callable[["np.ndarray"], float]]
+
+# Fewest bars after warm-up a prefix must have to be scored at all.
+MIN_SCORED_BARS = 20
+
+
+@dataclass(frozen=True)
+class Param:
+    """One searched parameter, sampled uniformly (or log-uniformly) from [low, high]."""
+
+    name: str
+    low: float
+    high: float
+    integer: bool = False
+    log: bool = False
+
+    def sample(self, rng: np.random.Generator) -> Union[int, float]:
+        if self.log:
+            value = math.exp(rng.uniform(math.log(self.low), math.log(self.high)))
+        else:
+            value = rng.uniform(self.low, self.high)
+        return int(round(value)) if self.integer else float(value)
+
+
+# The two knobs of strat/momentum.py, over the lookbacks strat/testing.py sweeps.
+MOMENTUM_SPACE = (Param("lookback", 10, 750, integer=True), Param("return_threshold", 0.0, 5.0))
+
+
+def sample_params(space: Sequence[Param], n: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """n random draws from space; repeats are dropped, so fewer may come back for small integer spaces."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    seen = set()
+    out = []
+    for _ in range(n * 4):
+        params = {p.name: p.sample(rng) for p in space}
+        key = tuple(sorted(params.items()))
+        if key not in seen:
+            seen.add(key)
+            out.append(params)
+            if len(out) == n:
+                break
+    return out
+
+
+class MomentumEvaluator:
+    """
+    Scores strat/momentum.py's threshold strategy on the first rows of a price matrix.
+
+    Returns, per-bar leaders and maxima are computed once per lookback over
+    the whole file and kept in a small LRU cache. They are causal, so their
+    first rows are exactly what the strategy would compute on that prefix,
+    and every rung of a search reuses them by slicing.
+    """
+
+    def __init__(
+        self,
+        closes: np.ndarray,
+        timestamps: Optional[np.ndarray] = None,
+        initial_capital: float = 1000.0,
+        tx_cost: float = 0.0,
+        cache_size: int = 128,
+    ) -> None:
+        from metrics import infer_freq_per_year
+
+        self.closes = closes
+        self.timestamps = timestamps
+        self.initial_capital = initial_capital
+        self.tx_cost = tx_cost
+        self.freq_per_year = infer_freq_per_year(timestamps)
+        self.cache_size = cache_size
+        self._indicators: OrderedDict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = OrderedDict()
+
+    @classmethod
+    def from_csv(cls, path: str, **kwargs: Any) -> MomentumEvaluator:
+        from backtest import load_prices
+
+        prices = load_prices(path)
+        closes = prices.drop(columns="timestamp").to_numpy(dtype=float)
+        return cls(closes, prices["timestamp"].to_numpy(), **kwargs)
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.closes)
+
+    def warmup(self, params: Dict[str, Any]) -> int:
+        return int(params["lookback"])
+
+    def indicators(self, lookback: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(returns in %, best return, leader code) per bar for one lookback."""
+        from ranking import leaders
+        from research import lagged_returns
+
+        cached = self._indicators.get(lookback)
+        if cached is not None:
+            self._indicators.move_to_end(lookback)
+            return cached
+        rets = lagged_returns(self.closes, lookback)
+        max_ret, codes = leaders(rets)
+        cached = (rets, max_ret, codes)
+        self._indicators[lookback] = cached
+        if len(self._indicators) > self.cache_size:
+            self._indicators.popitem(last=False)
+        return cached
+
+    def equity(self, params: Dict[str, Any], rows: int) -> np.ndarray:
+        """Close-to-close equity curve of params on the first rows bars, as backtest.py would value it."""
+        from kernels import portfolio_path, threshold_hold
+
+        lookback = int(params["lookback"])
+        rets, max_ret, codes = self.indicators(lookback)
+        closes = self.closes[:rows]
+        signals, _ = threshold_hold(
+            rets[:rows], max_ret[:rows], codes[:rows], closes, lookback, float(params["return_threshold"]), self.initial_capital
+        )
+        return portfolio_path(signals, closes, closes, closes, self.initial_capital, self.tx_cost).values
+
+    def score(self, params: Dict[str, Any], rows: int, objective: Objective = "sharpe") -> float:
+        """Objective on the first rows bars; NaN when the warm-up leaves too few bars to judge."""
+        if rows - self.warmup(params) < MIN_SCORED_BARS:
+            return float("nan")
+        values = self.equity(params, rows)
+        if callable(objective):
+            return float(objective(values))
+        from metrics import compute_metrics
+
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective {objective!r}; expected one of {OBJECTIVES} or a callable")
+        return float(compute_metrics(values, self.freq_per_year)[objective][0])
+
+
+# Evaluator of this worker process, set by the pool initializer.
+_worker_evaluator: Optional[MomentumEvaluator] = None
+
+
+def _init_worker(evaluator: Optional[MomentumEvaluator]) -> None:
+    global _worker_evaluator
+    if evaluator is not None:  # None under fork: the parent's global was inherited
+        _worker_evaluator = evaluator
+
+
+def _score_job(job: Tuple[Dict[str, Any], int, Objective]) -> float:
+    params, rows, objective = job
+    with instrument.stage("score"):
+        return _worker_evaluator.score(params, rows, objective)
+
+
+class SearchExecutor:
+    """
+    Scores (params, rows) jobs with one evaluator, in this process or across workers.
+
+    Under fork the workers inherit the evaluator (and whatever indicators it
+    has cached) copy-on-write; under spawn it is pickled to each once.
+    """
+
+    def __init__(self, evaluator: MomentumEvaluator, workers: Optional[int] = None) -> None:
+        self.evaluator = evaluator
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+        if self.workers > 1:
+            global _worker_evaluator
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+            _worker_evaluator = evaluator
+            initarg = None if ctx.get_start_method() == "fork" else evaluator
+            self._pool = ctx.Pool(self.workers, initializer=_init_worker, initargs=(initarg,))
+
+    def score(self, jobs: Sequence[Tuple[Dict[str, Any], int]], objective: Objective = "sharpe") -> List[float]:
+        """Scores in job order."""
+        if self._pool is None or len(jobs) < 2:
+            with instrument.stage("score"):
+                return [self.evaluator.score(params, rows, objective) for params, rows in jobs]
+        chunksize = max(1, len(jobs) // (self.workers * 4))
+        return self._pool.map(_score_job, [(params, rows, objective) for params, rows in jobs], chunksize=chunksize)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self) -> SearchExecutor:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+@dataclass
+class Trial:
+    params: Dict[str, Any]
+    rows: int
+    score: float
+    bracket: int = 0
+    rung: int = 0
+
+
+@dataclass
+class SearchResult:
+    """
+    Every evaluation a search made. The best trial is the highest score among
+    those run on the full data; bars counts all rows simulated, the cost of
+    the search in units of one bar.
+    """
+
+    n_rows: int
+    trials: List[Trial] = field(default_factory=list)
+
+    @property
+    def bars(self) -> int:
+        return sum(t.rows for t in self.trials)
+
+    @property
+    def best(self) -> Optional[Trial]:
+        full = [t for t in self.trials if t.rows == self.n_rows and not math.isnan(t.score)]
+        return max(full, key=lambda t: t.score) if full else None
+
+    def frame(self) -> pd.DataFrame:
+        """One row per evaluation: bracket, rung, rows, every parameter and the score."""
+        import pandas as pd
+
+        return pd.DataFrame(
+            [{"bracket": t.bracket, "rung": t.rung, "rows": t.rows, **t.params, "score": t.score} for t in self.trials]
+        )
+
+
+def random_search(
+    executor: SearchExecutor,
+    space: Sequence[Param] = MOMENTUM_SPACE,
+    n_trials: int = 50,
+    objective: Objective = "sharpe",
+    seed: Optional[int] = None,
+) -> SearchResult:
+    """n_trials random parameter sets, each scored on the full data."""
+    n = executor.evaluator.n_rows
+    candidates = sample_params(space, n_trials, seed)
+    scores = executor.score([(p, n) for p in candidates], objective)
+    return SearchResult(n, [Trial(p, n, s) for p, s in zip(candidates, scores)])
+
+
+def halving_rungs(n_rows: int, min_rows: int, eta: int) -> List[int]:
+    """Prefix lengths of the rungs, shortest first: ..., n_rows // eta**2, n_rows // eta, n_rows, none under min_rows."""
+    if eta < 2:
+        raise ValueError("eta must be at least 2")
+    if not 0 < min_rows <= n_rows:
+        raise ValueError("min_rows must be between 1 and the number of rows")
+    rungs = []
+    k = 0
+    while n_rows // eta**k >= min_rows:
+        rungs.append(n_rows // eta**k)
+        k += 1
+    return rungs[::-1]
+
+
+def successive_halving(
+    executor: SearchExecutor,
+    candidates: Sequence[Dict[str, Any]],
+    min_rows: int,
+    eta: int = 3,
+    objective: Objective = "sharpe",
+    bracket: int = 0,
+    result: Optional[SearchResult] = None,
+) -> SearchResult:
+    """
+    Score candidates on ever longer prefixes, keeping the best 1/eta after each rung.
+
+    A candidate whose warm-up leaves too few bars in a rung scores NaN there
+    and moves on unjudged rather than being dropped for a short window.
+    """
+    n = executor.evaluator.n_rows
+    result = result if result is not None else SearchResult(n)
+    alive = list(candidates)
+    rungs = halving_rungs(n, min_rows, eta)
+    for rung, rows in enumerate(rungs):
+        scores = executor.score([(p, rows) for p in alive], objective)
+        result.trials.extend(Trial(p, rows, s, bracket, rung) for p, s in zip(alive, scores))
+        if rows == n:
+            break
+        judged = sorted((s, i) for i, s in enumerate(scores) if not math.isnan(s))
+        keep = max(1, len(judged) // eta) if judged else 0
+        survivors = {i for _, i in judged[len(judged) - keep:]}
+        alive = [p for i, (p, s) in enumerate(zip(alive, scores)) if i in survivors or math.isnan(s)]
+    return result
+
+
+def hyperband(
+    executor: SearchExecutor,
+    space: Sequence[Param] = MOMENTUM_SPACE,
+    min_rows: int = 250,
+    eta: int = 3,
+    objective: Objective = "sharpe",
+    seed: Optional[int] = None,
+) -> SearchResult:
+    """
+    Successive halving over several brackets, from many candidates started on
+    min_rows bars to a few started on the full data, so a bad guess of how
+    early candidates can be told apart costs at most one bracket.
+    """
+    n = executor.evaluator.n_rows
+    s_max = len(halving_rungs(n, min_rows, eta)) - 1
+    result = SearchResult(n)
+    for s in range(s_max, -1, -1):
+        n_candidates = int(math.ceil((s_max + 1) / (s + 1) * eta**s))
+        start_rows = n // eta**s
+        candidates = sample_params(space, n_candidates, None if seed is None else seed + s)
+        successive_halving(executor, candidates, start_rows, eta, objective, bracket=s_max - s, result=result)
+    return result
+
+
+def parse_range(values: Sequence[str]) -> Tuple[float, float]:
+    low, high = (float(v) for v in values)
+    if low > high:
+        raise ValueError(f"Empty range {low} > {high}")
+    return low, high
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Search lookback and return_threshold of the momentum strategy")
+    parser.add_argument("--prices", required=True, help="Prices CSV")
+    parser.add_argument("--method", choices=("random", "halving", "hyperband"), default="halving", help="Search method")
+    parser.add_argument("--trials", type=int, default=81, help="Candidates for random search and successive halving")
+    parser.add_argument("--eta", type=int, default=3, help="Keep 1/eta of the candidates after each rung")
+    parser.add_argument("--min_rows", type=int, default=None, help="Bars in the first rung (default: rows / eta^2)")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="sharpe", help="Metric to maximize")
+    parser.add_argument("--lookback", nargs=2, default=("10", "750"), metavar=("LOW", "HIGH"), help="Lookback range")
+    parser.add_argument("--return_threshold", nargs=2, default=("0", "5"), metavar=("LOW", "HIGH"), help="Entry threshold range, in %%")
+    parser.add_argument("--initial_capital", type=float, default=1000.0)
+    parser.add_argument("--tx_cost", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores, 1 runs in-process)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--top", type=int, default=10, help="Best full-data trials to print")
+    parser.add_argument("--output", default=None, help="Optional CSV of every evaluation")
+    instrument.add_argument(parser)
+    args = parser.parse_args()
+
+    with instrument.session(args.instrument, args.instrument_top):
+        import time
+
+        lookback = parse_range(args.lookback)
+        threshold = parse_range(args.return_threshold)
+        space = (Param("lookback", *lookback, integer=True), Param("return_threshold", *threshold))
+        evaluator = MomentumEvaluator.from_csv(args.prices, initial_capital=args.initial_capital, tx_cost=args.tx_cost)
+        min_rows = args.min_rows or max(1, evaluator.n_rows // args.eta**2)
+
+        start = time.perf_counter()
+        with SearchExecutor(evaluator, args.workers) as executor:
+            if args.method == "random":
+                result = random_search(executor, space, args.trials, args.objective, args.seed)
+            elif args.method == "halving":
+                candidates = sample_params(space, args.trials, args.seed)
+                result = successive_halving(executor, candidates, min_rows, args.eta, args.objective)
+            else:
+                result = hyperband(executor, space, min_rows, args.eta, args.objective, args.seed)
+        elapsed = time.perf_counter() - start
+
+        frame = result.frame()
+        full = frame[frame["rows"] == evaluator.n_rows].sort_values("score", ascending=False)
+        print(f"{len(frame)} evaluations, {result.bars / evaluator.n_rows:.1f} full-data equivalents, {elapsed:.2f}s")
+        print(full.head(args.top).to_string(index=False))
+        if args.output:
+            frame.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
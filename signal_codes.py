@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Code used for "no action on this bar" (NIL, NaN, missing timestamp).
+NIL_CODE: int = -1
+# The cash symbol always takes the first slot of a table.
+CASH_CODE: int = 0
+
+PRODUCTS = ("PHOENIX_FEATHERS", "UNICORN_HORNS", "ELVEN_WINE", "VAMPIRE_BLOOD")
+
+# Spellings that all mean "no signal".
+NIL_LABELS = ("NIL", "NAN", "NONE", "")
+
+
+class SymbolTable:
+    """
+    Maps signal labels to compact int8 codes.
+
+    Code 0 is always the cash symbol, products follow in column order and
+    NIL_CODE (-1) means no action.
+    """
+
+    def __init__(self, products: Sequence[str], cash_symbol: str = "ORBS") -> None:
+        self.cash_symbol = cash_symbol.upper()
+        self.products = tuple(p.upper() for p in products)
+        self.symbols = (self.cash_symbol,) + self.products
+        if len(set(self.symbols)) != len(self.symbols):
+            raise ValueError(f"Duplicate symbols in table: {self.symbols}")
+        if len(self.symbols) > np.iinfo(np.int8).max:
+            raise ValueError("Too many symbols for an int8 code table")
+        self._index: Dict[str, int] = {s: i for i, s in enumerate(self.symbols)}
+        for label in NIL_LABELS:
+            self._index.setdefault(label, NIL_CODE)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def code(self, label: object) -> int:
+        """Encode a single label."""
+        if label is None or (isinstance(label, float) and np.isnan(label)):
+            return NIL_CODE
+        key = str(label).strip().upper()
+        if key not in self._index:
+            raise ValueError(f"Unknown signal symbol {label!r}; expected one of {self.symbols}")
+        return self._index[key]
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, SymbolTable) and self.symbols == other.symbols
+
+    def encode(self, labels: Iterable[object]) -> np.ndarray:
+        """
+        Encode an array of labels into int8 codes.
+
+        Labels are factorized first (or used as is when already categorical),
+        so only the distinct values go through the Python-level lookup.
+        """
+        if isinstance(getattr(labels, "dtype", None), pd.CategoricalDtype):
+            cat = pd.Categorical(labels)
+        else:
+            cat = pd.Categorical(np.asarray(labels, dtype=object))
+        lookup = np.array([self.code(c) for c in cat.categories] + [NIL_CODE], dtype=np.int8)
+        # Missing values have categorical code -1, which indexes the trailing NIL_CODE.
+        return lookup[cat.codes]
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Decode int8 codes back into an object array of labels."""
+        table = np.array(self.symbols + ("NIL",), dtype=object)
+        return table[np.asarray(codes, dtype=np.intp)]
+
+    def translate(self, other: SymbolTable) -> np.ndarray:
+        """
+        Lookup array that maps codes of this table onto codes of other.
+
+        Index with codes directly; NIL_CODE hits the trailing NIL slot.
+        """
+        return np.array([other.code(s) for s in self.symbols] + [NIL_CODE], dtype=np.int8)
+
+
+@dataclass
+class CodedSignals:
+    """
+    Signals as an int8 code array plus the table needed to read it.
+
+    timestamps is None for signals that are aligned to prices by row order.
+    """
+
+    codes: np.ndarray
+    table: SymbolTable
+    timestamps: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def recode(self, table: SymbolTable) -> CodedSignals:
+        if table == self.table:
+            return self
+        codes = self.table.translate(table)[self.codes.astype(np.intp)]
+        return CodedSignals(codes=codes, table=table, timestamps=self.timestamps)
+
+    def head(self, n: int) -> CodedSignals:
+        ts = None if self.timestamps is None else self.timestamps[:n]
+        return CodedSignals(codes=self.codes[:n], table=self.table, timestamps=ts)
+
+    def equals(self, other: CodedSignals) -> bool:
+        """Same timestamps and same symbols, compared as codes."""
+        other = other.recode(self.table)
+        if (self.timestamps is None) != (other.timestamps is None):
+            return False
+        if self.timestamps is not None and not np.array_equal(self.timestamps, other.timestamps):
+            return False
+        return np.array_equal(self.codes, other.codes)
+
+    def first_divergence(self, other: CodedSignals) -> Optional[int]:
+        """First row where the two differ in symbol or timestamp, len of the shorter if one is a prefix of the other, or None."""
+        other = other.recode(self.table)
+        n = min(len(self), len(other))
+        diff = self.codes[:n] != other.codes[:n]
+        if self.timestamps is not None and other.timestamps is not None:
+            diff |= self.timestamps[:n] != other.timestamps[:n]
+        elif (self.timestamps is None) != (other.timestamps is None):
+            return 0
+        hits = np.flatnonzero(diff)
+        if len(hits):
+            return int(hits[0])
+        return None if len(self) == len(other) else n
+
+    def to_frame(self) -> pd.DataFrame:
+        out = {"signal": self.table.decode(self.codes)}
+        if self.timestamps is not None:
+            out = {"timestamp": self.timestamps, **out}
+        return pd.DataFrame(out)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, table: SymbolTable) -> CodedSignals:
+        if "signal" not in df.columns:
+            raise ValueError("Signals must contain a 'signal' column")
+        ts = df["timestamp"].to_numpy(dtype=np.int64) if "timestamp" in df.columns else None
+        return cls(codes=table.encode(df["signal"]), table=table, timestamps=ts)
+
+
+def read_signals(path: str, table: Optional[SymbolTable] = None) -> CodedSignals:
+    """
+    Read a signals file into codes.
+
+    `.npz` files carry their own symbol table and are recoded onto table when
+    one is given. Anything else is read as CSV with a categorical signal
+    column, so each distinct label is parsed and looked up once.
+    """
+    if table is None:
+        table = SymbolTable(PRODUCTS)
+    if Path(path).suffix == ".npz":
+        with np.load(path, allow_pickle=False) as z:
+            symbols = [str(s) for s in z["symbols"]]
+            stored = SymbolTable(symbols[1:], cash_symbol=symbols[0])
+            ts = z["timestamp"] if "timestamp" in z.files else None
+            signals = CodedSignals(codes=z["code"].astype(np.int8), table=stored, timestamps=ts)
+        return signals.recode(table)
+    sdf = pd.read_csv(path, dtype={"signal": "category"})
+    return CodedSignals.from_frame(sdf, table)
+
+
+def write_signals(path: str, signals: CodedSignals) -> None:
+    """Write signals as `.npz` codes or as a `timestamp,signal` CSV, by extension."""
+    if Path(path).suffix == ".npz":
+        arrays = {"code": signals.codes, "symbols": np.array(signals.table.symbols)}
+        if signals.timestamps is not None:
+            arrays["timestamp"] = signals.timestamps
+        np.savez(path, **arrays)
+        return
+    signals.to_frame().to_csv(path, index=False)
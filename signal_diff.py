@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import argparse
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import instrument
+from signal_codes import PRODUCTS, CodedSignals, SymbolTable, read_signals
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+
+@dataclass
+class SignalDiff:
+    """
+    Row-by-row comparison of two signal series on one symbol table.
+
+    A row mismatches when its symbols or timestamps differ. Mismatching rows
+    are kept as [start, stop) ranges (the first max_ranges of them; n_ranges
+    counts all). confusion[i, j] counts rows where the left side held symbol
+    i and the right side symbol j, with NIL in the last slot.
+    """
+
+    table: SymbolTable
+    max_ranges: int = 1000
+    rows_left: int = 0
+    rows_right: int = 0
+    compared: int = 0
+    mismatches: int = 0
+    timestamp_mismatches: int = 0
+    first: Optional[int] = None
+    first_detail: Optional[Tuple[Optional[int], str, str]] = None
+    ranges: List[Tuple[int, int]] = field(default_factory=list)
+    n_ranges: int = 0
+    confusion: np.ndarray = field(init=False)
+    _last_stop: int = field(default=-1, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        k = len(self.table) + 1
+        self.confusion = np.zeros((k, k), dtype=np.int64)
+
+    @property
+    def identical(self) -> bool:
+        return self.mismatches == 0 and self.rows_left == self.rows_right
+
+    @property
+    def labels(self) -> Tuple[str, ...]:
+        return self.table.symbols + ("NIL",)
+
+    def update(self, left: CodedSignals, right: CodedSignals) -> None:
+        """Fold in the next rows of both sides; chunks must be the same length except at the end."""
+        left = left.recode(self.table)
+        right = right.recode(self.table)
+        self.rows_left += len(left)
+        self.rows_right += len(right)
+        n = min(len(left), len(right))
+        if n == 0:
+            return
+        offset = self.compared
+        lc = left.codes[:n]
+        rc = right.codes[:n]
+        # NIL_CODE is -1, so wrapping it to the last slot is a plain modulo
+        k = len(self.table) + 1
+        li = lc.astype(np.intp) % k
+        ri = rc.astype(np.intp) % k
+        self.confusion += np.bincount(li * k + ri, minlength=k * k).reshape(k, k)
+
+        diff = lc != rc
+        if left.timestamps is not None and right.timestamps is not None:
+            ts_diff = left.timestamps[:n] != right.timestamps[:n]
+            self.timestamp_mismatches += int(ts_diff.sum())
+            diff |= ts_diff
+        self.compared += n
+        self._add_ranges(diff, offset)
+        if self.first is None and self.n_ranges:
+            i = self.ranges[0][0] - offset
+            ts = int(left.timestamps[i]) if left.timestamps is not None else None
+            self.first = offset + i
+            self.first_detail = (ts, self.labels[li[i]], self.labels[ri[i]])
+
+    def _add_ranges(self, diff: np.ndarray, offset: int) -> None:
+        edges = np.diff(np.concatenate(([0], diff.view(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1) + offset
+        stops = np.flatnonzero(edges == -1) + offset
+        self.mismatches += int((stops - starts).sum())
+        if not len(starts):
+            return
+        # a range that runs up to the end of the previous chunk continues into this one
+        if starts[0] == self._last_stop:
+            if self.ranges and self.ranges[-1][1] == self._last_stop:
+                self.ranges[-1] = (self.ranges[-1][0], int(stops[0]))
+            self._last_stop = int(stops[0])
+            starts, stops = starts[1:], stops[1:]
+        if not len(starts):
+            return
+        room = self.max_ranges - len(self.ranges)
+        self.ranges.extend(zip(starts[:room].tolist(), stops[:room].tolist()))
+        self.n_ranges += len(starts)
+        self._last_stop = int(stops[-1])
+
+    def describe(self, max_ranges: int = 10) -> str:
+        lines = [f"compared {self.compared} rows (left {self.rows_left}, right {self.rows_right})"]
+        if self.identical:
+            lines.append("signals are identical")
+            return "\n".join(lines)
+        if self.first is not None:
+            ts, a, b = self.first_detail
+            at = f" (timestamp {ts})" if ts is not None else ""
+            lines.append(f"first divergence at row {self.first}{at}: {a} vs {b}")
+        elif self.rows_left != self.rows_right:
+            lines.append(f"first divergence at row {self.compared}: one side ends there")
+        if self.mismatches:
+            lines.append(
+                f"{self.mismatches} mismatching rows in {self.n_ranges} ranges"
+                + (f", {self.timestamp_mismatches} with different timestamps" if self.timestamp_mismatches else "")
+            )
+            shown = ", ".join(f"[{a}, {b})" for a, b in self.ranges[:max_ranges])
+            more = self.n_ranges - min(max_ranges, len(self.ranges))
+            lines.append("  " + shown + (f", ... {more} more" if more > 0 else ""))
+            lines.append("confusion (rows: left, columns: right):")
+            lines.append(self.confusion_frame().to_string())
+        return "\n".join(lines)
+
+    def confusion_frame(self) -> pd.DataFrame:
+        import pandas as pd
+
+        used = (self.confusion.sum(axis=0) + self.confusion.sum(axis=1)) > 0
+        labels = [l for l, u in zip(self.labels, used) if u]
+        return pd.DataFrame(self.confusion[np.ix_(used, used)], index=labels, columns=labels)
+
+
+def diff_signals(left: CodedSignals, right: CodedSignals, table: Optional[SymbolTable] = None, max_ranges: int = 1000) -> SignalDiff:
+    """Compare two in-memory signal series (on left's table unless one is given)."""
+    diff = SignalDiff(table or left.table, max_ranges=max_ranges)
+    diff.update(left, right)
+    return diff
+
+
+def _read_npy_header(f: IO[bytes]) -> Tuple[np.dtype, int]:
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+    if len(shape) != 1 or fortran:
+        raise ValueError("Expected a 1-d array in signals file")
+    return dtype, shape[0]
+
+
+def _npz_chunks(path: str, table: SymbolTable, chunk_rows: int) -> Iterator[CodedSignals]:
+    # each member is a .npy stream inside the zip, so it can be read piecewise after its header
+    with zipfile.ZipFile(path) as zf:
+        names = set(zf.namelist())
+        with zf.open("symbols.npy") as f:
+            symbols = [str(s) for s in np.lib.format.read_array(f)]
+        stored = SymbolTable(symbols[1:], cash_symbol=symbols[0])
+        code_f = zf.open("code.npy")
+        ts_f = zf.open("timestamp.npy") if "timestamp.npy" in names else None
+        try:
+            code_dtype, n = _read_npy_header(code_f)
+            ts_dtype = _read_npy_header(ts_f)[0] if ts_f is not None else None
+            for start in range(0, n, chunk_rows):
+                rows = min(chunk_rows, n - start)
+                codes = np.frombuffer(code_f.read(rows * code_dtype.itemsize), dtype=code_dtype).astype(np.int8)
+                ts = None
+                if ts_f is not None:
+                    ts = np.frombuffer(ts_f.read(rows * ts_dtype.itemsize), dtype=ts_dtype)
+                yield CodedSignals(codes=codes, table=stored, timestamps=ts).recode(table)
+        finally:
+            code_f.close()
+            if ts_f is not None:
+                ts_f.close()
+
+
+def iter_signal_chunks(path: str, table: SymbolTable, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[CodedSignals]:
+    """Signals file as consecutive CodedSignals of chunk_rows rows, never holding the whole file."""
+    if Path(path).suffix == ".npz":
+        yield from _npz_chunks(path, table, chunk_rows)
+        return
+    import pandas as pd
+
+    with pd.read_csv(path, dtype={"signal": "category"}, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield CodedSignals.from_frame(chunk, table)
+
+
+def stream_diff(
+    left: str, right: str, table: SymbolTable, chunk_rows: int = DEFAULT_CHUNK_ROWS, max_ranges: int = 1000
+) -> SignalDiff:
+    """Compare two signals files chunk by chunk; memory stays at about two chunks."""
+    diff = SignalDiff(table, max_ranges=max_ranges)
+    a = iter_signal_chunks(left, table, chunk_rows)
+    b = iter_signal_chunks(right, table, chunk_rows)
+    empty = CodedSignals(np.empty(0, dtype=np.int8), table)
+    while True:
+        ca = next(a, None)
+        cb = next(b, None)
+        if ca is None and cb is None:
+            return diff
+        diff.update(ca if ca is not None else empty, cb if cb is not None else empty)
+
+
+def file_diff(
+    left: str, right: str, table: SymbolTable, stream: bool = False, chunk_rows: int = DEFAULT_CHUNK_ROWS, max_ranges: int = 1000
+) -> SignalDiff:
+    if stream:
+        return stream_diff(left, right, table, chunk_rows, max_ranges)
+    return diff_signals(read_signals(left, table), read_signals(right, table), table, max_ranges)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare two signals files row by row")
+    parser.add_argument("left", help="Signals file (.csv or .npz)")
+    parser.add_argument("right", help="Signals file (.csv or .npz)")
+    parser.add_argument("--products", nargs="+", default=list(PRODUCTS), help="Product symbols, in code order")
+    parser.add_argument("--cash_symbol", default="ORBS", help="Cash symbol")
+    parser.add_argument("--stream", action="store_true", help="Read both files in chunks instead of loading them whole")
+    parser.add_argument("--chunk_rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per chunk with --stream")
+    parser.add_argument("--ranges", type=int, default=10, help="Mismatch ranges to print")
+    parser.add_argument("--output", default=None, help="Optional CSV of every recorded mismatch range")
+    instrument.add_argument(parser)
+    args = parser.parse_args(argv)
+
+    with instrument.session(args.instrument, args.instrument_top):
+        table = SymbolTable(args.products, cash_symbol=args.cash_symbol)
+        with instrument.stage("diff"):
+            diff = file_diff(args.left, args.right, table, args.stream, args.chunk_rows, max(args.ranges, 1000))
+        print(diff.describe(args.ranges))
+        if args.output:
+            import pandas as pd
+
+            pd.DataFrame(diff.ranges, columns=["start", "stop"]).to_csv(args.output, index=False)
+        if not diff.identical:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+ROOT = Path(__file__).resolve().parent
+
+# Entry points and their cold-start budgets for `--help`, in milliseconds of
+# cumulative import time (as reported by `python -X importtime`).
+BUDGETS_MS: Dict[str, float] = {
+    "backtest.py": 100.0,
+    "forward_bias.py": 100.0,
+    "worker_pool.py": 150.0,
+    "batch.py": 100.0,
+    "bias_scan.py": 100.0,
+    "paper_trade.py": 100.0,
+    "search.py": 100.0,
+    "golden.py": 100.0,
+}
+
+# Modules that must not be imported just to print usage.
+HEAVY_MODULES = ("numpy", "pandas", "tqdm", "pyarrow")
+
+
+@dataclass
+class StartupResult:
+    entry: str
+    import_ms: float
+    wall_ms: float
+    heavy: List[str]
+    budget_ms: float
+
+    @property
+    def ok(self) -> bool:
+        return self.import_ms <= self.budget_ms and not self.heavy
+
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    """Every imported module and its cumulative import time in ms; roots have no indent."""
+    modules: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        modules[name[1:].rstrip()] = int(cumulative) / 1000.0
+    return modules
+
+
+def measure(entry: str, budget_ms: float, repeat: int = 5) -> StartupResult:
+    script = str(ROOT / entry)
+    best_import = float("inf")
+    best_wall = float("inf")
+    heavy: List[str] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", script, "--help"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=ROOT,
+        )
+        best_wall = min(best_wall, (time.perf_counter() - start) * 1000.0)
+        modules = parse_importtime(proc.stderr)
+        # nested imports are indented under their parent, so roots sum to the total
+        best_import = min(best_import, sum(ms for name, ms in modules.items() if not name.startswith(" ")))
+        imported = {name.strip().split(".")[0] for name in modules}
+        heavy = [m for m in HEAVY_MODULES if m in imported]
+    return StartupResult(entry, best_import, best_wall, heavy, budget_ms)
+
+
+def run(entries: Sequence[str], repeat: int) -> List[StartupResult]:
+    return [measure(entry, BUDGETS_MS[entry], repeat=repeat) for entry in entries]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure CLI cold-start import time against budgets")
+    parser.add_argument("--entry", nargs="*", default=list(BUDGETS_MS), help="Entry point scripts to measure")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per entry point (best is kept)")
+    args = parser.parse_args()
+
+    results = run(args.entry, args.repeat)
+    for r in results:
+        status = "ok" if r.ok else "OVER BUDGET"
+        heavy = f" | heavy imports: {', '.join(r.heavy)}" if r.heavy else ""
+        print(
+            f"{r.entry:<16} imports: {r.import_ms:7.1f} ms (budget {r.budget_ms:.0f}) | "
+            f"wall: {r.wall_ms:7.1f} ms | {status}{heavy}"
+        )
+    if not all(r.ok for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import sys
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# strategies run as scripts from strat/, so make the repo root importable
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ranking import leaders
+from research import lagged_returns
+from signal_codes import CASH_CODE, NIL_CODE, CodedSignals, SymbolTable, write_signals
+
+# Candidate lookbacks are fixed, not derived from the data length: a grid that
+# grows with the file would change the early signals as bars are appended.
+LOOKBACKS = (20, 40, 80, 160, 320, 640)
+SCORE_WINDOW = 250  # bars of realized performance each lookback is judged on
+RETURN_THRESHOLD = 1.75  # % return the leader needs before it is bought
+SCORE_BITS = 32  # fixed-point resolution of scores; 2**-32 in log return is far below price noise
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Momentum whose lookback adapts per bar to trailing realized performance")
+    p.add_argument("-i", "--input", required=True, help="Input CSV path (must include 'timestamp')")
+    p.add_argument("-o", "--output", default="signals/signals.csv", help="Output CSV path for signals")
+    return p.parse_args()
+
+
+def returns_tensor(closes: np.ndarray, lookbacks: Sequence[int]) -> np.ndarray:
+    """(lookbacks, bars, products) percent returns, NaN on each lookback's warm-up rows."""
+    out = np.empty((len(lookbacks),) + closes.shape)
+    for k, lookback in enumerate(lookbacks):
+        out[k] = lagged_returns(closes, lookback)
+    return out
+
+
+def candidate_positions(rets: np.ndarray, threshold: float) -> np.ndarray:
+    """(lookbacks, bars) holding each lookback alone would pick: its leader once past threshold, else cash."""
+    pos = np.empty(rets.shape[:2], dtype=np.int8)
+    for k in range(len(rets)):
+        best, codes = leaders(rets[k])
+        pos[k] = np.where(best >= threshold, codes, CASH_CODE)  # NaN (warm-up) compares False
+    return pos
+
+
+def trailing_scores(closes: np.ndarray, pos: np.ndarray, window: int) -> np.ndarray:
+    """
+    (lookbacks, bars) log return each candidate earned over the last window bars,
+    in integer units of 2**-SCORE_BITS.
+
+    Bar t credits the holding chosen at t-1 with the move from close t-1 to
+    close t, so a score only uses prices up to its own bar. Windowed sums are
+    differences of one cumulative sum per lookback; summing integer ticks makes
+    them exact, so lookbacks that held the same thing tie exactly and a window
+    spent in cash scores exactly zero.
+    """
+    n = len(closes)
+    step = np.zeros((n, closes.shape[1] + 1), dtype=np.int64)  # column 0 is cash
+    with np.errstate(divide="ignore", invalid="ignore"):
+        moves = np.log(closes[1:] / closes[:-1])
+    step[1:, 1:] = np.where(np.isfinite(moves), np.round(moves * 2.0**SCORE_BITS), 0)
+    earned = np.zeros(pos.shape, dtype=np.int64)
+    earned[:, 1:] = step[np.arange(1, n)[None, :], pos[:, :-1].astype(np.intp)]
+    cum = np.cumsum(earned, axis=1)
+    scores = cum.copy()
+    scores[:, window:] -= cum[:, :-window]
+    return scores
+
+
+def adaptive_signals(
+    closes: np.ndarray,
+    lookbacks: Sequence[int] = LOOKBACKS,
+    window: int = SCORE_WINDOW,
+    threshold: float = RETURN_THRESHOLD,
+    rets: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Signal codes and the lookback followed on each bar.
+
+    Each bar follows the candidate lookback with the best trailing score and
+    holds what that lookback holds. When no candidate has made money over the
+    window the strategy sits in cash. Signals are emitted only when the holding
+    changes. rets may be a precomputed returns_tensor of the same lookbacks.
+    Cost is O(bars * lookbacks * products).
+    """
+    if window < 1:
+        raise ValueError("window must be positive")
+    if rets is None:
+        rets = returns_tensor(closes, lookbacks)
+    if rets.shape[:1] != (len(lookbacks),) or rets.shape[1:] != closes.shape:
+        raise ValueError(f"rets has shape {rets.shape}, expected {(len(lookbacks),) + closes.shape}")
+    n = len(closes)
+    pos = candidate_positions(rets, threshold)
+    scores = trailing_scores(closes, pos, window)
+    chosen = scores.argmax(axis=0)  # ties go to the shorter lookback
+    target = pos[chosen, np.arange(n)]
+    target[scores[chosen, np.arange(n)] <= 0] = CASH_CODE
+
+    prev = np.empty(n, dtype=np.int8)
+    prev[0] = CASH_CODE
+    prev[1:] = target[:-1]
+    signals = np.where(target != prev, target, NIL_CODE).astype(np.int8)
+    return signals, np.asarray(lookbacks)[chosen]
+
+
+def build_signals(df: pd.DataFrame) -> CodedSignals:
+    """Strategy logic on an in-memory input frame; main() wraps it with file I/O."""
+    products = ["UNICORN_HORNS", "ELVEN_WINE", "VAMPIRE_BLOOD", "PHOENIX_FEATHERS"]
+    # signals are int8 codes: 0 is ORBS, 1.. follow products, -1 is NIL
+    table = SymbolTable(products, cash_symbol="ORBS")
+    closes = df[[f"CLOSE_{p}" for p in products]].to_numpy(dtype=float)
+    signals, _ = adaptive_signals(closes)
+    return CodedSignals(signals, table, df["timestamp"].to_numpy())
+
+
+def main() -> None:
+    args = parse_args()
+    df = pd.read_csv(args.input)
+    signals = build_signals(df)
+
+    out_path = Path(args.output)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    write_signals(str(out_path), signals)
+    print(f"Wrote signals to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,59 @@
-import os 
+import argparse
 import subprocess
-import pandas as pd
+import sys
 import time
+from pathlib import Path
+
+import pandas as pd
+
+# run from the repo root; make it importable when started as strat/driver.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from result_cache import DEFAULT_CACHE_DIR, ResultCache
+from worker_pool import StrategyWorkerPool
 
-start_time = time.time()
-subprocess.run(["python3" ,"strat/testing.py"], capture_output=True)
 
-df = []
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backtest the momentum lookback sweep")
+    parser.add_argument("--cache_dir", default=DEFAULT_CACHE_DIR, help="Backtest result cache directory")
+    parser.add_argument("--no_cache", action="store_true", help="Always re-simulate and leave the cache alone")
+    parser.add_argument("--clear_cache", action="store_true", help="Empty the result cache before running")
+    args = parser.parse_args()
+    if args.clear_cache:
+        ResultCache(args.cache_dir).invalidate()
+    cache = None if args.no_cache else args.cache_dir
 
-for t in range(10, 750, 10):
-    result = subprocess.run(["python3", "backtest.py", "--prices" ,"data/input.csv", "--signals", f"data/signals{t}.csv"], capture_output=True)    
-    with open("results/summary.txt", "r") as f:
-        lines = f.readlines()
-        df.append([t] + [float(line.split(":")[1].strip()) for line in lines])
+    start_time = time.time()
+    subprocess.run(["python3" ,"strat/testing.py"], capture_output=True)
+
+    lookbacks = range(10, 750, 10)
+
+    # one resident worker pool instead of a fresh backtest.py process per lookback;
+    # unchanged (prices, signals, params) combinations come straight from the cache
+    jobs = [
+        {"op": "backtest", "prices": "data/input.csv", "signals": f"data/signals{t}.csv", "cache": cache}
+        for t in lookbacks
+    ]
+    with StrategyWorkerPool(preload_prices=["data/input.csv"]) as pool:
+        summaries = pool.run(jobs)
+
+    metrics = ["final_value", "total_trades", "max_drawdown", "volatility", "sharpe"]
+    df = [[t] + [float(summary[m]) for m in metrics] for t, summary in zip(lookbacks, summaries)]
 
     columns = ["t", "final_value", "total_trades", "max_drawdown ( in %)", "volatility", "sharpe"]
     summary_df = pd.DataFrame(df, columns=columns)
 
-end_time = time.time()
-total_time = round(end_time - start_time, 5)
+    end_time = time.time()
+    total_time = round(end_time - start_time, 5)
+
 
+    print(summary_df.to_markdown(index=False))
+    max_sharpe = summary_df['sharpe'].max()
+    max_total = summary_df['final_value'].max()
 
-print(summary_df.to_markdown(index=False))
-max_sharpe = summary_df['sharpe'].max()
-max_total = summary_df['final_value'].max()
+    print("Max Sharpe Ratio is :" , max_sharpe)
+    print("Total final_value is :", max_total)
+    print("Total time is", total_time, "s")
 
-print("Max Sharpe Ratio is :" , max_sharpe)
-print("Total final_value is :", max_total)
-print("Total time is", total_time, "s")
 
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
 import argparse
+import sys
 from pathlib import Path
 import pandas as pd
 import time
 import numpy as np
 
+# strategies run as scripts from strat/, so make the repo root importable
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from kernels import threshold_hold
+from ranking import leaders
+from signal_codes import NIL_CODE, CodedSignals, SymbolTable, write_signals
+
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Template strategy for generating signals from market data")
@@ -72,18 +79,17 @@ def generate_signals(df: pd.DataFrame) -> pd.DataFrame:
 
 
 
-def main() -> None:
-    
-    st = time.time()
-    args = parse_args()
-
-    df = pd.read_csv(args.input)
+def build_signals(df: pd.DataFrame) -> CodedSignals:
+    """Strategy logic on an in-memory input frame; main() wraps it with file I/O."""
     selected_cols = ["timestamp", "CLOSE_UNICORN_HORNS", "CLOSE_ELVEN_WINE", "CLOSE_VAMPIRE_BLOOD", "CLOSE_PHOENIX_FEATHERS"]
     
     df_sel = df[selected_cols]
     df_sel.columns = ["timestamp", "UNICORN_HORNS", "ELVEN_WINE", "VAMPIRE_BLOOD", "PHOENIX_FEATHERS"]
 
-    close_cols = df_sel.columns[1:]
+    close_cols = list(df_sel.columns[1:])
+    # signals are int8 codes: 0 is ORBS, 1.. follow close_cols, -1 is NIL
+    table = SymbolTable(close_cols, cash_symbol="ORBS")
+    closes = df_sel[close_cols].to_numpy(dtype=float)
     
     lookbacks = range(int(len(df)/50), int(len(df)/10), int(len(df)/40))
     
@@ -91,108 +97,50 @@ def main() -> None:
     
     for lookback in lookbacks:
         
-        df_rets = pd.DataFrame(index=df_sel.index)
-        
-        for col in close_cols:
-            
-            df_rets[f'{col}'] = ((df_sel[col] - df_sel[col].shift(lookback)) / df_sel[col].shift(lookback)) * 100
-            
-        df_rets["max_ret"] = df_rets[close_cols].max(axis=1)
+        prev = np.full_like(closes, np.nan)
+        prev[lookback:] = closes[: max(len(closes) - lookback, 0)]
+        rets = ((closes - prev) / prev) * 100
         
-        df_rets["Symbol_for_max_ret"] = df_rets[close_cols].idxmax(axis=1)
+        # leader per bar as a signal code; NIL on warm-up rows with no return yet
+        max_ret, sym_for_max_ret = leaders(rets)
         
-        returns_dict[lookback] = df_rets
+        returns_dict[lookback] = (rets, max_ret, sym_for_max_ret)
 
 
 
 
-    ffdf = pd.DataFrame()
+    best_signals = np.full(len(df_sel), NIL_CODE, dtype=np.int8)
     maxi = 0
     return_threshold = 1.75
-    total_points = len(df_sel)
 
 
 
     for lookback in lookbacks:
         
-        df_rets = returns_dict[lookback]
-        
-        signals = np.full(total_points, "NIL", dtype=object)
-        
-        orbs = 1000.0
-        
-        holdings = 0.0
-        
-        current_prod = "None"
-
-        signals[:lookback] = "NIL"
-
-        for t in range(lookback, total_points):
-            
-            df_max_ret = df_rets.at[t, 'max_ret']
-            
-            df_sym_for_max_ret = df_rets.at[t, 'Symbol_for_max_ret']
-            
-            if current_prod != "None" :
-                df_ret_curr_prod = df_rets.at[t, current_prod]
-            else :
-                df_ret_curr_prod = 0
-            
-            signal = ''
-            
-            if orbs == 0:
-                
-                if current_prod != df_sym_for_max_ret and current_prod != "None":
-                    
-                    signal = "ORBS"
-                    orbs = holdings * df_sel.at[t, current_prod]
-                    holdings = 0.0
-                    current_prod = "None"
-                    
-                elif current_prod == df_sym_for_max_ret and df_ret_curr_prod < return_threshold:
-                    
-                    signal = "ORBS"
-                    orbs = holdings * df_sel.at[t, current_prod]
-                    holdings = 0.0
-                    current_prod = "None"
-                    
-                elif current_prod == df_sym_for_max_ret and df_ret_curr_prod >= return_threshold:
-                    signal = "NIL"
-                    current_prod = current_prod
-                    
-            else:
-                
-                if df_max_ret >= return_threshold:
-                    
-                    signal = df_sym_for_max_ret
-                    holdings = orbs / df_sel.at[t, signal]
-                    orbs = 0.0
-                    current_prod = df_sym_for_max_ret
-                    
-                else:
-                    signal = "NIL"
-            
-            signals[t] = signal
+        rets, max_ret, sym_for_max_ret = returns_dict[lookback]
         
-        fdf = pd.DataFrame({
-            "timestamp": df_sel['timestamp'],
-            "signal": signals
-        })
-        
-        ans = orbs
-        
-        if current_prod != "None":
-            ans += holdings * df_sel.at[total_points-1, current_prod]
+        # threshold entry/exit state machine, run by the array kernel
+        signals, ans = threshold_hold(rets, max_ret, sym_for_max_ret, closes, lookback, return_threshold, 1000.0)
         
         if ans > maxi:
             maxi = ans
-            ffdf = fdf
-            
+            best_signals = signals
+
+    return CodedSignals(best_signals, table, df_sel["timestamp"].to_numpy())
+
+
+def main() -> None:
+    
+    st = time.time()
+    args = parse_args()
+
+    df = pd.read_csv(args.input)
+    signals = build_signals(df)
 
     out_path = Path(args.output)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    ffdf[['timestamp', 'signal']].to_csv(out_path, index=False)
+    write_signals(str(out_path), signals)
     print(f"Wrote signals to {out_path}")
     
     et = time.time()
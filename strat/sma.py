@@ -1,7 +1,15 @@
 import argparse
+import sys
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+# strategies run as scripts from strat/, so make the repo root importable
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from kernels import hold_until_change
+from ranking import leaders
+from signal_codes import CodedSignals, SymbolTable, write_signals
+
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Template strategy for generating signals from market data")
@@ -69,11 +77,8 @@ def generate_signals(df: pd.DataFrame) -> pd.DataFrame:
     return out
 
 
-def main() -> None:
-    
-    args = parse_args()
-
-    df = pd.read_csv(args.input)
+def build_signals(df: pd.DataFrame) -> CodedSignals:
+    """Strategy logic on an in-memory input frame; main() wraps it with file I/O."""
     
     selected_cols = ["timestamp", "CLOSE_UNICORN_HORNS", "CLOSE_ELVEN_WINE", "CLOSE_VAMPIRE_BLOOD", "CLOSE_PHOENIX_FEATHERS"]
     df_sel = df[selected_cols]
@@ -83,71 +88,44 @@ def main() -> None:
     # sma. 
 
     final_cols = [col for col in df_sel.columns if col != "timestamp"]
+    # signals are int8 codes: 0 is ORBS, 1.. follow final_cols, -1 is NIL
+    table = SymbolTable(final_cols, cash_symbol="ORBS")
 
-    df_sma = df_sel.copy()
     small = 50
-    large = 200
-    for col in final_cols : 
-        df_sma[f"{small}_{col}"] = df_sma[col].rolling(window=small).mean()
-        df_sma[f"{large}_{col}"] = df_sma[col].rolling(window=large).mean()
+    sma = df_sel[final_cols].rolling(window=small).mean().to_numpy()
 
     # we could write a small strategy based on sma and find out if it works or not. 
     # lets calculate the slope and generate trading signals. 
 
     lookback = 25
-    for col in final_cols:
-        df_sma[f"{col}"] = ((df_sma[f'50_{col}'] - df_sma[f'50_{col}'].shift(lookback))/df_sma[f'50_{col}'].shift(lookback)) * 100
+    prev = np.full_like(sma, np.nan)
+    prev[lookback:] = sma[: max(len(sma) - lookback, 0)]
+    slope = ((sma - prev) / prev) * 100
         
     # once we have found out the slope of this, let's go and find out the maximum slope. 
-    df_sma['max_slope'] = df_sma[[f"{col}" for col in final_cols]].max(axis=1)
-    df_sma['sym_max_slope'] = df_sma[[f"{col}" for col in final_cols]].idxmax(axis=1)
+    _, sym_max_slope = leaders(slope)
 
     # alright, now the dataset is ready, it's time to put it to the test. 
     # initialization variables. 
 
-    orbs = 1000
-    current_prod = "None"
-    holdings = 0
-    signal = ''
+    # buy the steepest product from cash, sell as soon as another one takes over
+    signals = hold_until_change(sym_max_slope, lookback + small)
 
-    ans = []
+    return CodedSignals(signals, table, df_sel["timestamp"].to_numpy())
 
-    for t in range(lookback + small):
-        ans.append({"timestamp": t, "signal" : "NIL"})
 
-    for t in range(lookback + small, 5000):
-        
-        
-        t_prod = df_sma.at[t, 'sym_max_slope']
-        t_price = df_sel.at[t, t_prod]
-        
-        if orbs == 0:
-            # we already have a prod at hand. 
-            # we could sell it or hold it.
-            
-            if (t_prod != current_prod) : 
-                # we sell it. 
-                orbs = df_sel.at[t, current_prod] * holdings
-                holdings = 0
-                current_prod = "None"
-                signal = "ORBS";
-            else : signal = "NIL"
-        
-        else : 
-            signal = t_prod
-            holdings = orbs/t_price
-            orbs = 0;
-            current_prod = t_prod
-        
-        ans.append({"timestamp" : t, "signal" : signal})
-
-    ans = pd.DataFrame(ans)
+def main() -> None:
     
+    args = parse_args()
+
+    df = pd.read_csv(args.input)
+    signals = build_signals(df)
+
     # Ensure directory exists
     out_path = Path(args.output)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    ans[['timestamp', 'signal']].to_csv(out_path, index=False)
+    write_signals(str(out_path), signals)
     print(f"Wrote signals to {out_path}")
 
 
@@ -1,7 +1,10 @@
 import argparse
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+from signal_codes import CASH_CODE, NIL_CODE, CodedSignals, SymbolTable, write_signals
+
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Template strategy for generating signals from market data")
@@ -69,10 +72,8 @@ def generate_signals(df: pd.DataFrame) -> pd.DataFrame:
     return out
 
 
-def main() -> None:
-    args = parse_args()
-
-    df = pd.read_csv(args.input)
+def build_signals(df: pd.DataFrame) -> CodedSignals:
+    """Strategy logic on an in-memory input frame; main() wraps it with file I/O."""
     
     selected_cols = ["timestamp", "CLOSE_UNICORN_HORNS", "CLOSE_ELVEN_WINE", "CLOSE_VAMPIRE_BLOOD", "CLOSE_PHOENIX_FEATHERS"]
     df_sel = df[selected_cols]
@@ -82,80 +83,54 @@ def main() -> None:
     # here, lets define the lookback. 
     lookback = 300
 
-    results_df = []
+    close_cols = list(df_sel.columns[1:])
+    # signals are int8 codes: 0 is ORBS, 1.. follow close_cols, -1 is NIL
+    table = SymbolTable(close_cols, cash_symbol="ORBS")
+    closes = df_sel[close_cols].to_numpy(dtype=float)
 
-    close_cols = df_sel.columns[1:]
-    df_rets = pd.DataFrame()
-    for col in close_cols:
-        df_rets[f'{col}'] = ((df_sel[col] - df_sel[col].shift(lookback)) / df_sel[col].shift(lookback)) * 100
+    prev = np.full_like(closes, np.nan)
+    prev[lookback:] = closes[: max(len(closes) - lookback, 0)]
+    rets = ((closes - prev) / prev) * 100
 
+    # code of the product with the max return, NIL while the lookback fills up
+    has_ret = ~np.isnan(rets).all(axis=1)
+    leader = np.where(has_ret, np.argmax(np.where(np.isnan(rets), -np.inf, rets), axis=1) + 1, NIL_CODE)
 
-
-    df_rets["max_ret"] = df_rets[1:].max(axis=1)
-    ret_cols = close_cols
-    df_rets["Symbol_for_max_ret"] = df_rets[ret_cols].idxmax(axis=1)
-
-
-    orbs = 1000
-    holdings = 0
-    signals = []
-    total_points = len(df)
-    products = [col.replace('CLOSE_', '') for col in close_cols]
-    return_threshold = 1.5 # this should be changed to different values.
+    total_points = len(df_sel)
 
     # for the lookback period, there will be no trading data. 
+    signals = np.full(total_points, NIL_CODE, dtype=np.int8)
 
-    for t in range(lookback):
-        signals.append({"timestamp" : df_sel['timestamp'].iloc[t], 'signal' : "NIL"})
-
-
-    current_prod = "None"
-
-    for t in range(lookback+1, total_points+1):
-        
-        timestamp = t
-        
-        df_max_ret = df_rets.at[t-1, 'max_ret']    
-        df_sym_for_max_ret = df_rets.at[t-1, 'Symbol_for_max_ret']
-        
-        signal = ''
-        
-        # all of them set. now logic. 
-        
-        # for the first iteration, we are not applying the minimum ratio concept here, 
-        # where the % ratio must be greater than a specified value. 
-        
-        if (orbs == 0):
+    current_prod = CASH_CODE
+    for t, sym_for_max_ret in enumerate(leader.tolist()):
+        if t < lookback or sym_for_max_ret == NIL_CODE:
+            continue
+
+        if current_prod != CASH_CODE:
             # here we have some product in the portfolio already. 
-            if (current_prod != df_sym_for_max_ret and current_prod != "None"):
-                # here, the current product is gone from the top leaderboard, 
+            if current_prod != sym_for_max_ret:
+                # the current product is gone from the top leaderboard, 
                 # therefore, we sell the current product.   
-                signal = "ORBS"
-                orbs = holdings * (df_sel.at[t-1, current_prod])   
-                current_prod = "None"
-                        
-            elif (current_prod == df_sym_for_max_ret):
-                current_prod = current_prod
-                signal = "NIL"
-                
-        else :
-            
-            signal = df_sym_for_max_ret
-            holdings = orbs/df_sel.at[t-1, signal]
-            orbs = 0
-            current_prod = df_sym_for_max_ret
-        
-        signals.append({"timestamp" : t, 'signal' : signal})
-
-        fdf = pd.DataFrame(signals)
-
-        
+                signals[t] = CASH_CODE
+                current_prod = CASH_CODE
+        else:
+            signals[t] = sym_for_max_ret
+            current_prod = sym_for_max_ret
+
+    return CodedSignals(signals, table, df_sel["timestamp"].to_numpy())
+
+
+def main() -> None:
+    args = parse_args()
+
+    df = pd.read_csv(args.input)
+    signals = build_signals(df)
 
     # Ensure directory exists
     out_path = Path(args.output)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    fdf[['timestamp', 'signal']].to_csv(out_path, index=False)
+    write_signals(str(out_path), signals)
     print(f"Wrote signals to {out_path}")
 
 
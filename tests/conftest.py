@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope="session")
+def prices() -> pd.DataFrame:
+    """The sample prices every CLI example in the README runs on."""
+    return pd.read_csv(ROOT / "data" / "input.csv")
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    config.addinivalue_line("markers", "slow: spawns interpreters or runs long; deselect with -m 'not slow'")
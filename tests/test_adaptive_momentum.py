@@ -0,0 +1,64 @@
+import math
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+from signal_codes import CASH_CODE, NIL_CODE
+from worker_pool import strategy_module
+
+adaptive = strategy_module(str(ROOT / "strat" / "adaptive_momentum.py"))
+
+
+def reference_signals(closes, lookbacks, window, threshold):
+    """adaptive_signals one bar, one lookback and one product at a time."""
+    n, m = closes.shape
+    tick = 2.0**adaptive.SCORE_BITS
+    pos = []
+    for lookback in lookbacks:
+        held = []
+        for t in range(n):
+            best, code = None, CASH_CODE
+            for j in range(m):
+                ret = (closes[t, j] - closes[t - lookback, j]) / closes[t - lookback, j] * 100 if t >= lookback else math.nan
+                if not math.isnan(ret) and (best is None or ret > best):
+                    best, code = ret, j + 1
+            held.append(code if best is not None and best >= threshold else CASH_CODE)
+        pos.append(held)
+
+    signals, followed = [], []
+    prev = CASH_CODE
+    for t in range(n):
+        scores = []
+        for k in range(len(lookbacks)):
+            score = 0
+            for s in range(max(1, t - window + 1), t + 1):
+                code = pos[k][s - 1]
+                if code != CASH_CODE:
+                    move = math.log(closes[s, code - 1] / closes[s - 1, code - 1])
+                    score += int(round(move * tick)) if math.isfinite(move) else 0
+            scores.append(score)
+        k = scores.index(max(scores))
+        target = pos[k][t] if scores[k] > 0 else CASH_CODE
+        signals.append(target if target != prev else NIL_CODE)
+        followed.append(lookbacks[k])
+        prev = target
+    return np.array(signals, dtype=np.int8), np.array(followed)
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_adaptive_signals_match_reference_loop(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(2, 120))
+    m = int(rng.integers(1, 5))
+    closes = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.02, (n, m)), axis=0))
+    if rng.random() < 0.3:
+        closes[rng.random((n, m)) < 0.05] = np.nan
+    lookbacks = tuple(sorted(set(rng.integers(1, 40, int(rng.integers(1, 5))).tolist())))
+    window = int(rng.integers(1, 60))
+    threshold = float(rng.choice([0.0, 0.5, 1.75, 5.0]))
+
+    got, got_followed = adaptive.adaptive_signals(closes, lookbacks, window, threshold)
+    want, want_followed = reference_signals(closes, lookbacks, window, threshold)
+    np.testing.assert_array_equal(got, want)
+    np.testing.assert_array_equal(got_followed, want_followed)
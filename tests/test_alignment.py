@@ -0,0 +1,21 @@
+import numpy as np
+
+from alignment import align_signals
+
+
+def _report(signal_ts, price_ts=np.arange(1, 1001)):
+    codes = np.zeros(len(signal_ts), dtype=np.int8)
+    return align_signals(price_ts, np.asarray(signal_ts), codes)[1]
+
+
+def test_row_numbered_signals_are_flagged():
+    report = _report(np.arange(0, 1000))
+    assert report.offset == -1 and report.early_signals == 1
+    assert report.has_issues() and "shifted by -1" in report.describe()
+
+
+def test_matching_and_sparse_signals_are_not_flagged():
+    assert _report(np.arange(1, 1001)).offset == 0
+    assert _report(np.arange(500, 1000)).offset == 0
+    # every other bar: most signals match as they are
+    assert _report(np.arange(3, 1003, 2)).offset == 0
@@ -0,0 +1,14 @@
+import pytest
+
+from backtest import close_prices, run_backtest
+from conftest import ROOT
+from worker_pool import strategy_module
+
+# strat/sma.py on data/input.csv with the defaults of backtest.py, filled at each signal's own close
+SMA_FINAL_VALUE = 501.871306
+
+
+def test_sma_backtest_final_value(prices):
+    sma = strategy_module(str(ROOT / "strat" / "sma.py"))
+    metrics, _ = run_backtest(close_prices(prices), sma.build_signals(prices))
+    assert metrics["final_value"] == pytest.approx(SMA_FINAL_VALUE, abs=1e-6)
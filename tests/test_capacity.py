@@ -0,0 +1,14 @@
+import numpy as np
+
+from capacity import simulate_capacity
+
+
+def test_zero_volume_bar_defers_the_order():
+    prices = np.array([[100.0], [100.0], [110.0], [110.0]])
+    volume = np.array([[1e6], [0.0], [1e6], [1e6]])
+    codes = np.array([-1, 1, -1, -1], dtype=np.int8)
+    curve = simulate_capacity([1000.0], codes, prices, volume, participation=None, impact=0.02)
+    # nothing fills on the empty bar: still all cash there, bought on the next bar
+    assert curve.values[0, 1] == 1000.0
+    assert curve.fills[0] == 1 and curve.behind[0] == 1
+    assert curve.values[0, -1] > 990.0
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from execution import FillPrices
+from kernels import (
+    _hold_until_change_events,
+    _threshold_hold_events,
+    hold_until_change_reference,
+    portfolio_path,
+    threshold_hold_reference,
+)
+from signal_codes import NIL_CODE, SymbolTable
+from utils import Portfolio, TradeExecutor
+
+
+def _random_case(rng: np.random.Generator, n: int, n_products: int):
+    closes = np.exp(np.cumsum(rng.normal(0, 0.02, (n, n_products)), axis=0)) * rng.uniform(50, 500, n_products)
+    lookback = int(rng.integers(1, max(2, n // 4)))
+    prev = np.full_like(closes, np.nan)
+    prev[lookback:] = closes[:-lookback]
+    rets = (closes - prev) / prev * 100
+    has = ~np.isnan(rets).all(axis=1)
+    masked = np.where(np.isnan(rets), -np.inf, rets)
+    max_ret = np.where(has, masked.max(axis=1), np.nan)
+    leaders = np.where(has, masked.argmax(axis=1) + 1, NIL_CODE).astype(np.int8)
+    # sticky leaders so holding periods last more than one bar
+    sticky = leaders.copy()
+    for t in range(1, n):
+        if rng.random() < 0.7:
+            sticky[t] = sticky[t - 1]
+    return closes, rets, max_ret, leaders, sticky, lookback
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_kernels_match_references(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(2, 400))
+    n_products = int(rng.integers(1, 5))
+    closes, rets, max_ret, leaders, sticky, lookback = _random_case(rng, n, n_products)
+    start = int(rng.integers(0, n))
+    for lead in (leaders, sticky):
+        np.testing.assert_array_equal(_hold_until_change_events(lead, start), hold_until_change_reference(lead, start))
+
+    threshold = float(rng.choice([0.0, 0.5, 2.0, 10.0]))
+    got_sig, got_val = _threshold_hold_events(rets, max_ret, leaders, closes, lookback, threshold, 1000.0)
+    want_sig, want_val = threshold_hold_reference(rets, max_ret, leaders, closes, lookback, threshold, 1000.0)
+    np.testing.assert_array_equal(got_sig, want_sig)
+    assert got_val == want_val
+
+    codes = rng.integers(-1, n_products + 1, n).astype(np.int8)
+    codes[rng.random(n) < 0.6] = NIL_CODE
+    tx_cost = float(rng.choice([0.0, 0.001, 0.01]))
+    spread = rng.uniform(0, 0.01, closes.shape) * closes
+    fills = FillPrices(sell=closes - spread, buy=closes + spread, lag=int(rng.integers(0, 2)))
+    products = [f"P{j}" for j in range(n_products)]
+    frame = pd.DataFrame(closes, columns=products)
+    frame.insert(0, "timestamp", np.arange(n))
+    portfolio = Portfolio(1000.0, tx_cost, "ORBS")
+    signals = pd.DataFrame({"signal": SymbolTable(products, "ORBS").decode(codes)})
+    executor = TradeExecutor(portfolio, frame, signals, "ORBS", fills=fills)
+    want = executor._run_loop(None, n)
+    got = portfolio_path(executor.fill_codes, fills.sell, fills.buy, closes, 1000.0, tx_cost)
+    np.testing.assert_array_equal(got.values, want.value)
+    np.testing.assert_array_equal(got.holding, want.holding)
+    assert got.final_value == executor.final_value
+    assert len(got.trades) == portfolio.num_trades
+    np.testing.assert_array_equal(np.bincount([t[0] for t in got.trades], minlength=n), want.trades)
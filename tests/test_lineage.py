@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from conftest import ROOT
+from forward_bias import in_process_runner, test_forward_bias as prefix_check
+from lineage import track_strategy
+from signal_codes import CodedSignals, SymbolTable
+from worker_pool import strategy_module
+
+
+def _frame(n: int = 50) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"timestamp": np.arange(1, n + 1), "CLOSE_A": 100 + rng.normal(size=n).cumsum()})
+
+
+def test_causal_strategy_is_tracked_and_clean():
+    def strategy(df):
+        closes = df["CLOSE_A"].to_numpy(dtype=float)
+        codes = np.where(closes > df["CLOSE_A"].shift(1).to_numpy(dtype=float), 1, 0).astype(np.int8)
+        return CodedSignals(codes, SymbolTable(["A"], "ORBS"), df["timestamp"].to_numpy())
+
+    report = track_strategy(strategy, _frame())
+    assert report.tracked and not report.biased
+
+
+def test_branch_on_later_row_is_inconclusive():
+    def strategy(df):
+        closes = df["CLOSE_A"].to_numpy(dtype=float)
+        up = closes > closes[0]
+        codes = np.where(up, 1, 0).astype(np.int8)
+        if closes[-1:].max() > closes[0]:  # hindsight: the whole path decides the rule
+            codes = np.where(up, 0, 1).astype(np.int8)
+        return CodedSignals(codes, SymbolTable(["A"], "ORBS"), df["timestamp"].to_numpy())
+
+    report = track_strategy(strategy, _frame())
+    assert not report.tracked
+    assert report.control == {"bool()": 49}
+
+
+def test_momentum_is_flagged_biased(prices):
+    path = str(ROOT / "strat" / "momentum.py")
+    module = strategy_module(path)
+    report = track_strategy(module.build_signals, prices, module)
+    # its lookback grid comes from len(df) and its best lookback from the final value
+    assert not report.tracked
+    assert {"len()", "bool()"} <= set(report.control)
+
+    # so the prefix check falls back to prefix runs, which diverge (its step is 0 below 40 rows)
+    data = prices.head(1000)
+    run = in_process_runner(path, data)
+    assert prefix_check(path, data, precision=50, runner=lambda n: run(max(n, 40)))
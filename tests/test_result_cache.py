@@ -0,0 +1,12 @@
+from conftest import ROOT
+from result_cache import ResultCache
+from worker_pool import run_backtest_job
+
+
+def test_explicit_and_omitted_defaults_share_an_entry(tmp_path):
+    prices = str(ROOT / "data" / "input.csv")
+    signals = str(ROOT / "signals" / "signals.csv")
+    implicit = run_backtest_job(prices, signals, {}, str(tmp_path))
+    explicit = run_backtest_job(prices, signals, {"tx_cost": 0, "initial_capital": 1000.0, "ffill": False}, str(tmp_path))
+    assert explicit == implicit
+    assert len(ResultCache(str(tmp_path)).entries()) == 1
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import close_prices, run_backtest
+from conftest import ROOT
+from rolling import rolling_from_results, trades_per_bar
+from signal_codes import CASH_CODE, NIL_CODE, CodedSignals, SymbolTable
+from worker_pool import strategy_module
+
+
+def test_full_window_matches_headline_metrics_on_hourly_bars(prices):
+    hourly = prices.assign(timestamp=1_700_000_000 + 3600 * prices["timestamp"])
+    sma = strategy_module(str(ROOT / "strat" / "sma.py"))
+    metrics, results = run_backtest(close_prices(hourly), sma.build_signals(hourly))
+    n = len(results.value)
+    last = rolling_from_results(results, [n]).iloc[-1]
+    # float32 columns
+    assert last[f"volatility_{n}"] == pytest.approx(metrics["volatility"], rel=1e-5)
+    assert last[f"sharpe_{n}"] == pytest.approx(metrics["sharpe"], rel=1e-5)
+
+
+@pytest.mark.parametrize("log", [False, True])
+def test_trades_on_the_final_bar_are_counted(log):
+    prices = pd.DataFrame({"timestamp": [1, 2, 3, 4], "A": [1.0, 1.1, 1.2, 1.3], "B": [2.0, 2.1, 2.2, 2.3]})
+    codes = np.array([1, NIL_CODE, NIL_CODE, 2], dtype=np.int8)
+    signals = CodedSignals(codes, SymbolTable(["A", "B"], "ORBS"), prices["timestamp"].to_numpy())
+    metrics, results = run_backtest(prices, signals, log=log)
+    # buy A on the first bar; sell A, buy B and liquidate B on the last
+    assert results.trades.tolist() == [1, 0, 0, 3]
+    assert results.trades.sum() == metrics["total_trades"]
+    assert rolling_from_results(results, [2])["trades_2"].iloc[-1] == 3
+
+
+def test_trades_per_bar_counts_the_liquidation_on_the_last_bar():
+    assert trades_per_bar(np.array([CASH_CODE, 1, 1, CASH_CODE])).tolist() == [1, 0, 0, 1]
@@ -0,0 +1,11 @@
+import pytest
+
+from startup_bench import BUDGETS_MS, measure
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("entry", sorted(BUDGETS_MS))
+def test_help_within_import_budget(entry):
+    result = measure(entry, BUDGETS_MS[entry], repeat=3)
+    assert not result.heavy, f"{entry} --help imports {', '.join(result.heavy)}"
+    assert result.import_ms <= result.budget_ms, f"{entry} --help imports take {result.import_ms:.1f} ms"
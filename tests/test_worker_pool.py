@@ -0,0 +1,25 @@
+import pandas as pd
+
+from conftest import ROOT
+from worker_pool import _strategy_signals, price_frame
+
+MUTATING = '''
+import numpy as np
+from signal_codes import CodedSignals, SymbolTable
+
+
+def build_signals(df):
+    df["EXTRA"] = 0.0
+    df.fillna(-1.0, inplace=True)
+    return CodedSignals(np.zeros(len(df), dtype=np.int8), SymbolTable(["A"], "ORBS"), df["timestamp"].to_numpy())
+'''
+
+
+def test_strategy_cannot_mutate_resident_prices(tmp_path):
+    strategy = tmp_path / "mutating.py"
+    strategy.write_text(MUTATING)
+    prices = str(ROOT / "data" / "input.csv")
+    before = price_frame(prices).copy()
+    _strategy_signals(str(strategy), prices, None)
+    _strategy_signals(str(strategy), prices, 100)
+    pd.testing.assert_frame_equal(price_frame(prices), before)
@@ -1,11 +1,18 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
 
+from alignment import align_to_prices
+from execution import FillPrices
+from kernels import portfolio_path
+from metrics import compute_metrics, infer_freq_per_year, trade_stats
+from results_io import ResultColumns, ResultWriter
+from signal_codes import CASH_CODE, NIL_CODE, CodedSignals, SymbolTable
+
 
 @dataclass
 class Trade:
@@ -21,6 +28,10 @@ class Trade:
 class Portfolio:
     """
     Manages a single-asset-or-cash portfolio with transaction costs.
+
+    The holding is tracked as a code into a SymbolTable; prices are passed as
+    arrays ordered like the table's products (code - 1). The string-keyed
+    methods convert once and delegate to the code-native ones.
     """
 
     def __init__(
@@ -29,22 +40,40 @@ class Portfolio:
         transaction_cost: float = 0.0,
         cash_symbol: str = "CASH",
         log: bool = False,
+        symbols: Optional[SymbolTable] = None,
     ) -> None:
         self.cash_symbol = cash_symbol
         self.transaction_cost = float(transaction_cost)
         self.base_ccy_cash: float = float(initial_capital)
-        self.holding_symbol: str = cash_symbol
+        self.holding_code: int = CASH_CODE
         self.holding_units: float = 0.0  # units of current product
         self.num_trades: int = 0
         self.trade_log: List[Trade] = []
         self.log = log
+        self.symbols = symbols
+
+    @property
+    def holding_symbol(self) -> str:
+        if self.holding_code == CASH_CODE:
+            return self.cash_symbol
+        return self.symbols.symbols[self.holding_code]
 
     def _apply_transaction_cost(self, notional: float) -> float:
         fee = abs(notional) * self.transaction_cost
         return fee
 
+    def _log_last_trade(self) -> None:
+        if self.log and self.trade_log:
+            last_trade = self.trade_log[-1]
+            print(
+                f"[{last_trade.timestamp}] {last_trade.from_asset} → {last_trade.to_asset} | "
+                f"Size(base): {last_trade.size_base_ccy:.2f} | "
+                f"Price_from: {last_trade.price_from} | Price_to: {last_trade.price_to} | "
+                f"Fee: {last_trade.transaction_cost:.2f}"
+            )
+
     def _liquidate_current(self, timestamp: int, price: Optional[float]) -> Tuple[float, float]:
-        if self.holding_symbol == self.cash_symbol:
+        if self.holding_code == CASH_CODE:
             return 0.0, 0.0
         if price is None or not np.isfinite(price):
             raise ValueError("Missing price to liquidate current holding")
@@ -52,7 +81,7 @@ class Portfolio:
         fee = self._apply_transaction_cost(notional)
         self.base_ccy_cash += notional - fee
         sold_symbol = self.holding_symbol
-        self.holding_symbol = self.cash_symbol
+        self.holding_code = CASH_CODE
         self.holding_units = 0.0
         self.num_trades += 1
         self.trade_log.append(
@@ -66,91 +95,85 @@ class Portfolio:
                 transaction_cost=fee,
             )
         )
-        if self.log and self.trade_log:
-                last_trade = self.trade_log[-1]
-                print(
-                    f"[{last_trade.timestamp}] {last_trade.from_asset} → {last_trade.to_asset} | "
-                    f"Size(base): {last_trade.size_base_ccy:.2f} | "
-                    f"Price_from: {last_trade.price_from} | Price_to: {last_trade.price_to} | "
-                    f"Fee: {last_trade.transaction_cost:.2f}"
-                )
-
+        self._log_last_trade()
         return notional, fee
 
-    def _buy_new(self, timestamp: int, symbol: str, price: Optional[float]) -> Tuple[float, float]:
-        if symbol == self.cash_symbol:
+    def _buy_new(self, timestamp: int, code: int, price: Optional[float]) -> Tuple[float, float]:
+        if code == CASH_CODE:
             return 0.0, 0.0
         if price is None or not np.isfinite(price):
             raise ValueError("Missing price to buy new holding")
         notional = self.base_ccy_cash
         if notional <= 0.0:
-            self.holding_symbol = self.cash_symbol
+            self.holding_code = CASH_CODE
             self.holding_units = 0.0
             return 0.0, 0.0
         fee = self._apply_transaction_cost(notional)
         investable = max(notional - fee, 0.0)
         units = investable / price if price > 0 else 0.0
         self.base_ccy_cash -= notional  # spend all cash
-        self.holding_symbol = symbol
+        self.holding_code = code
         self.holding_units = units
         self.num_trades += 1
         self.trade_log.append(
             Trade(
                 timestamp=timestamp,
                 from_asset=self.cash_symbol,
-                to_asset=symbol,
+                to_asset=self.holding_symbol,
                 price_from=None,
                 price_to=price,
                 size_base_ccy=notional,
                 transaction_cost=fee,
             )
         )
-
-        if self.log and self.trade_log:
-                last_trade = self.trade_log[-1]
-                print(
-                    f"[{last_trade.timestamp}] {last_trade.from_asset} → {last_trade.to_asset} | "
-                    f"Size(base): {last_trade.size_base_ccy:.2f} | "
-                    f"Price_from: {last_trade.price_from} | Price_to: {last_trade.price_to} | "
-                    f"Fee: {last_trade.transaction_cost:.2f}"
-                )
+        self._log_last_trade()
         return notional, fee
 
-    def rebalance(self, timestamp: int, target_symbol: str, price_map: Dict[str, Optional[float]]) -> None:
-
-        if target_symbol is None:
-            return;
-            
-        target_symbol = target_symbol.upper()
-        if target_symbol == "NIL" or target_symbol == "NAN":
-               return 
-        if target_symbol not in price_map and target_symbol != self.cash_symbol:
-            raise ValueError(f"Price for target symbol {target_symbol} not provided")
+    def _price_array(self, price_map: Dict[str, Optional[float]]) -> np.ndarray:
+        if self.symbols is None:
+            self.symbols = SymbolTable(list(price_map), cash_symbol=self.cash_symbol)
+        return np.array([price_map.get(p) for p in self.symbols.products], dtype=float)
 
-        if self.holding_symbol == target_symbol:
+    def rebalance_code(
+        self,
+        timestamp: int,
+        target_code: int,
+        prices: np.ndarray,
+        buy_prices: Optional[np.ndarray] = None,
+    ) -> None:
+        """prices fill the sale of the current holding, and the purchase too unless buy_prices is given."""
+        if target_code == NIL_CODE or target_code == self.holding_code:
             return
 
-        if self.holding_symbol != self.cash_symbol:
-            current_price = price_map.get(self.holding_symbol)
-            self._liquidate_current(timestamp, current_price)
+        if self.holding_code != CASH_CODE:
+            self._liquidate_current(timestamp, prices[self.holding_code - 1])
 
-        if target_symbol != self.cash_symbol:
-            buy_price = price_map.get(target_symbol)
-            self._buy_new(timestamp, target_symbol, buy_price)
+        if target_code != CASH_CODE:
+            buy_prices = prices if buy_prices is None else buy_prices
+            self._buy_new(timestamp, target_code, buy_prices[target_code - 1])
 
-    def value(self, price_map: Dict[str, Optional[float]]) -> float:
-        if self.holding_symbol == self.cash_symbol:
+    def rebalance(self, timestamp: int, target_symbol: str, price_map: Dict[str, Optional[float]]) -> None:
+        prices = self._price_array(price_map)
+        self.rebalance_code(timestamp, self.symbols.code(target_symbol), prices)
+
+    def value_at(self, prices: np.ndarray) -> float:
+        if self.holding_code == CASH_CODE:
             return float(self.base_ccy_cash)
-        price = price_map.get(self.holding_symbol)
-        if price is None or not np.isfinite(price):
+        price = prices[self.holding_code - 1]
+        if not np.isfinite(price):
             raise ValueError(f"Missing price for valuation of {self.holding_symbol}")
         return float(self.base_ccy_cash + self.holding_units * price)
 
-    def liquidate_all(self, timestamp: int, price_map: Dict[str, Optional[float]]) -> None:
-        if self.holding_symbol == self.cash_symbol:
+    def value(self, price_map: Dict[str, Optional[float]]) -> float:
+        return self.value_at(self._price_array(price_map))
+
+    def liquidate_all_at(self, timestamp: int, prices: np.ndarray) -> None:
+        if self.holding_code == CASH_CODE:
             return
-        price = price_map.get(self.holding_symbol)
-        self._liquidate_current(timestamp, price)
+        self._liquidate_current(timestamp, prices[self.holding_code - 1])
+
+    def liquidate_all(self, timestamp: int, price_map: Dict[str, Optional[float]]) -> None:
+        self.liquidate_all_at(timestamp, self._price_array(price_map))
 
 
 class TradeExecutor:
@@ -160,68 +183,145 @@ class TradeExecutor:
         self,
         portfolio: Portfolio,
         price_df: pd.DataFrame,
-        signal_df: pd.DataFrame,
+        signal_df: Union[pd.DataFrame, CodedSignals],
         cash_symbol: str = "CASH",
+        ffill: bool = False,
+        max_staleness: Optional[int] = None,
+        fills: Optional[FillPrices] = None,
     ) -> None:
         self.portfolio = portfolio
         self.price_df = price_df
         self.cash_symbol = cash_symbol
 
-        # normalize signals: dict {timestamp: signal}
-        self.signal_map = dict(
-            zip(signal_df["timestamp"].astype(int), signal_df["signal"].astype(str).str.upper())
-        )
-
         # product columns (assumes all non-timestamp columns are products)
         self.product_cols = [c for c in price_df.columns if c != "timestamp"]
-        #print(self.product_cols)
-
-    def run(self) -> pd.DataFrame:
-        records: List[Dict[str, object]] = []
-
-        for _, row in self.price_df.iterrows():
-            ts = int(row["timestamp"])
-            signal = self.signal_map.get(ts, None)
-
-
-            price_map: Dict[str, Optional[float]] = {c: row[c] for c in self.product_cols}
-            prev_holding_symbol = self.portfolio.holding_symbol
-            self.portfolio.rebalance(ts, signal, price_map)
-            pv = self.portfolio.value(price_map)
-
-            records.append(
-                {
-                    "timestamp": ts,
-                    "signal": signal,
-                    "holding": prev_holding_symbol,
-                    "new_portfolio_value": pv,
-                }
+        self.symbols = SymbolTable(self.product_cols, cash_symbol=cash_symbol)
+        self.portfolio.symbols = self.symbols
+        self.timestamps = price_df["timestamp"].to_numpy(dtype=np.int64)
+        self.prices = price_df[self.product_cols].to_numpy(dtype=float)
+        # trades fill at these prices (close unless an execution model says otherwise);
+        # holdings are always valued at close
+        if fills is not None and fills.sell.shape != self.prices.shape:
+            raise ValueError("Fill prices must have one row per bar and one column per product")
+        self.sell_prices = self.prices if fills is None else fills.sell
+        self.buy_prices = self.prices if fills is None else fills.buy
+
+        # normalize signals: one int8 code per price bar
+        if isinstance(signal_df, CodedSignals):
+            signals = signal_df.recode(self.symbols)
+        else:
+            signals = CodedSignals.from_frame(signal_df, self.symbols)
+        # joined on timestamp, or by row order (padded with cash) when signals have none
+        self.signal_codes, self.alignment = align_to_prices(
+            self.timestamps, signals, ffill=ffill, max_staleness=max_staleness
+        )
+        # codes on the bars their trades fill on; next-bar models trade one bar after the signal
+        self.fill_codes = self.signal_codes if fills is None else fills.schedule(self.signal_codes)
+
+    def run_columns(self, writer: Optional[ResultWriter] = None, chunk_size: int = 100_000) -> ResultColumns:
+        """
+        Simulate every bar into preallocated columns.
+
+        When a writer is given, chunks of chunk_size bars are handed to it.
+        A fresh portfolio without trade logging runs through the array kernel
+        (compounding once per trade); otherwise bars are stepped one by one,
+        printing trades and streaming chunks as the simulation goes.
+        """
+        p = self.portfolio
+        fresh = p.holding_code == CASH_CODE and p.num_trades == 0
+        if p.log or not fresh:
+            return self._run_loop(writer, chunk_size)
+
+        path = portfolio_path(
+            self.fill_codes, self.sell_prices, self.buy_prices, self.prices, p.base_ccy_cash, p.transaction_cost
+        )
+        cols = ResultColumns.allocate(self.timestamps, self.signal_codes, self.symbols)
+        cols.value[:] = path.values
+        cols.holding[:] = path.holding
+        if path.trades:
+            cols.trades[:] = np.bincount([t[0] for t in path.trades], minlength=len(cols))
+        for bar, from_code, to_code, price, notional, fee in path.trades:
+            selling = to_code == CASH_CODE
+            p.trade_log.append(
+                Trade(
+                    timestamp=int(self.timestamps[bar]),
+                    from_asset=self.symbols.symbols[from_code] if selling else self.cash_symbol,
+                    to_asset=self.cash_symbol if selling else self.symbols.symbols[to_code],
+                    price_from=price if selling else None,
+                    price_to=None if selling else price,
+                    size_base_ccy=notional,
+                    transaction_cost=fee,
+                )
             )
+        p.num_trades += len(path.trades)
+        p.base_ccy_cash = path.cash
+        self.final_value = path.final_value
+
+        if writer is not None:
+            n = len(self.timestamps)
+            step = max(1, chunk_size)
+            for start in range(0, n, step):
+                writer.write(cols.slice(start, min(start + step, n)))
+        return cols
+
+    def _run_loop(self, writer: Optional[ResultWriter], chunk_size: int) -> ResultColumns:
+        n = len(self.timestamps)
+        cols = ResultColumns.allocate(self.timestamps, self.signal_codes, self.symbols)
+        holding = cols.holding
+        value = cols.value
+        trades = cols.trades
+        chunk_size = max(1, chunk_size)
+        flushed = 0
+
+        for i in range(n):
+            holding[i] = self.portfolio.holding_code
+            before = self.portfolio.num_trades
+            self.portfolio.rebalance_code(
+                int(self.timestamps[i]), int(self.fill_codes[i]), self.sell_prices[i], self.buy_prices[i]
+            )
+            trades[i] = self.portfolio.num_trades - before
+            value[i] = self.portfolio.value_at(self.prices[i])
+
+            # the last chunk waits for the final liquidation below
+            if writer is not None and i + 1 - flushed == chunk_size and i + 1 < n:
+                writer.write(cols.slice(flushed, i + 1))
+                flushed = i + 1
 
         # Final liquidation
-        last_row = self.price_df.iloc[-1]
-        last_ts = int(last_row["timestamp"])
-        last_price_map: Dict[str, Optional[float]] = {c: last_row[c] for c in self.product_cols}
-        self.portfolio.liquidate_all(last_ts, last_price_map)
+        last_ts = int(self.timestamps[-1])
+        last_prices = self.prices[-1]
+        before = self.portfolio.num_trades
+        self.portfolio.liquidate_all_at(last_ts, self.sell_prices[-1])
+        trades[-1] += self.portfolio.num_trades - before
 
-        final_value = self.portfolio.value(last_price_map)
-        if records:
-            records[-1]["holding"] = self.portfolio.holding_symbol
-            records[-1]["portfolio_value"] = final_value
+        self.final_value = self.portfolio.value_at(last_prices)
+        holding[-1] = self.portfolio.holding_code
 
-        return pd.DataFrame.from_records(records)
+        if writer is not None:
+            writer.write(cols.slice(flushed, n))
+        return cols
+
+    def run(self) -> pd.DataFrame:
+        return self.run_columns().to_frame()
 
 
 class Evaluator:
     """Computes performance metrics from a portfolio value time series."""
 
-    def __init__(self, value_series: pd.Series, freq_per_year: Optional[int] = None) -> None:
+    def __init__(
+        self,
+        value_series: pd.Series,
+        freq_per_year: Optional[int] = None,
+        timestamps: Optional[np.ndarray] = None,
+    ) -> None:
         self.value_series = value_series.astype(float)
         self.returns = self.value_series.pct_change().fillna(0.0)
+        self.timestamps = timestamps
         self.freq_per_year = freq_per_year or self._infer_freq_per_year()
 
     def _infer_freq_per_year(self) -> int:
-        return 252
+        # from the bar spacing when timestamps are epoch times, else 252
+        return infer_freq_per_year(self.timestamps)
 
     def final_value(self) -> float:
         return float(self.value_series.iloc[-1])
@@ -255,3 +355,12 @@ class Evaluator:
             "volatility": self.volatility(),
             "sharpe": self.sharpe(risk_free_rate=risk_free_rate),
         }
+
+    def extended_summary(self, portfolio: Portfolio, risk_free_rate: float = 0.0) -> Dict[str, float]:
+        """summary() plus Sortino, Calmar, VaR/CVaR, drawdown durations, hit rate and turnover."""
+        values = self.value_series.to_numpy()
+        metrics = compute_metrics(values, self.freq_per_year, risk_free=risk_free_rate)
+        out = {name: float(v[0]) for name, v in metrics.items()}
+        out.update(trade_stats(portfolio.trade_log, values, self.freq_per_year))
+        out.update(self.summary(portfolio, risk_free_rate=risk_free_rate))
+        return out
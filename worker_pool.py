@@ -0,0 +1,411 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.pool import AsyncResult
+from pathlib import Path
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import instrument
+from backtest import close_prices, load_signals, run_backtest
+
+# pandas is loaded by the workers on first use, so `shutdown` and `--help` stay cheap.
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from signal_codes import CodedSignals
+
+# The socket and the key that authenticates clients live in a directory only
+# this user can enter: a client that authenticates can run any pickled job.
+RUNTIME_SUBDIR = "quant-guild"
+SOCKET_NAME = "workers.sock"
+AUTHKEY_NAME = "workers.key"
+
+# Per-process caches, keyed by resolved path and mtime so edited files are reloaded.
+_frames: Dict[str, Tuple[float, pd.DataFrame]] = {}
+_closes: Dict[str, Tuple[float, pd.DataFrame]] = {}
+_modules: Dict[str, Tuple[float, ModuleType]] = {}
+
+
+def runtime_dir() -> Path:
+    """Per-user 0700 directory under $XDG_RUNTIME_DIR (or ~/.cache) for the socket and key."""
+    base = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = Path(base, RUNTIME_SUBDIR)
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    st = path.stat()
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{path} must be owned by this user and closed to others (mode 0700)")
+    return path
+
+
+def default_socket() -> str:
+    return str(runtime_dir() / SOCKET_NAME)
+
+
+def authkey() -> bytes:
+    """This user's daemon key: random, created on first use, readable only by its owner."""
+    import secrets
+
+    path = runtime_dir() / AUTHKEY_NAME
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+    if path.stat().st_mode & 0o077:
+        raise PermissionError(f"{path} must be readable by its owner only (mode 0600)")
+    return path.read_bytes()
+
+
+def _key(path: str) -> Tuple[str, float]:
+    resolved = str(Path(path).resolve())
+    return resolved, os.path.getmtime(resolved)
+
+
+def price_frame(path: str) -> pd.DataFrame:
+    """Raw input CSV, read once per process."""
+    key, mtime = _key(path)
+    cached = _frames.get(key)
+    if cached is None or cached[0] != mtime:
+        import pandas as pd
+
+        cached = (mtime, pd.read_csv(key))
+        _frames[key] = cached
+    return cached[1]
+
+
+def close_frame(path: str) -> pd.DataFrame:
+    """CLOSE-only price frame as used by the backtester, derived once per process."""
+    key, mtime = _key(path)
+    cached = _closes.get(key)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, close_prices(price_frame(path)))
+        _closes[key] = cached
+    return cached[1]
+
+
+def strategy_module(path: str) -> ModuleType:
+    """Import a strategy script as a module, once per process."""
+    key, mtime = _key(path)
+    cached = _modules.get(key)
+    if cached is None or cached[0] != mtime:
+        name = f"_strategy_{abs(hash(key))}"
+        spec = importlib.util.spec_from_file_location(name, key)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        cached = (mtime, module)
+        _modules[key] = cached
+    return cached[1]
+
+
+def _run_main(module: ModuleType, df: pd.DataFrame) -> CodedSignals:
+    # Strategies without build_signals only speak --input/--output files.
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_csv = Path(tmpdir) / "input.csv"
+        output_csv = Path(tmpdir) / "output.csv"
+        df.to_csv(input_csv, index=False)
+        argv = sys.argv
+        sys.argv = [module.__file__, "--input", str(input_csv), "--output", str(output_csv)]
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                module.main()
+        finally:
+            sys.argv = argv
+        from signal_codes import read_signals
+
+        return read_signals(str(output_csv))
+
+
+def run_strategy_job(strategy: str, prices: str, n_rows: Optional[int] = None) -> CodedSignals:
+    with instrument.stage("strategy"):
+        return _strategy_signals(strategy, prices, n_rows)
+
+
+def _strategy_signals(strategy: str, prices: str, n_rows: Optional[int]) -> CodedSignals:
+    df = price_frame(prices)
+    if n_rows is not None:
+        df = df.head(n_rows)
+    module = strategy_module(strategy)
+    if hasattr(module, "build_signals"):
+        # a copy, so a strategy that edits its input cannot corrupt the resident frame for later jobs
+        with contextlib.redirect_stdout(io.StringIO()):
+            return module.build_signals(df.copy())
+    return _run_main(module, df)
+
+
+def run_backtest_job(
+    prices: str,
+    signals: Union[str, CodedSignals],
+    params: Optional[Dict[str, Any]] = None,
+    cache_dir: Optional[str] = None,
+) -> Dict[str, float]:
+    """Backtest summary; with cache_dir, looked up in (and saved to) the result cache first."""
+    with instrument.stage("backtest"):
+        return _backtest_metrics(prices, signals, dict(params or {}), cache_dir)
+
+
+def _backtest_metrics(
+    prices: str, signals: Union[str, CodedSignals], params: Dict[str, Any], cache_dir: Optional[str]
+) -> Dict[str, float]:
+    closes = close_frame(prices)
+    if isinstance(signals, str):
+        from signal_codes import SymbolTable
+
+        products = [c for c in closes.columns if c != "timestamp"]
+        table = SymbolTable(products, cash_symbol=params.get("cash_symbol", "ORBS"))
+        signals = load_signals(signals, table)
+    if cache_dir is None:
+        metrics, _ = run_backtest(closes, signals, **params)
+        return metrics
+
+    from result_cache import ResultCache, cache_key, file_digest
+
+    cache = ResultCache(cache_dir)
+    key = cache_key(file_digest(prices), signals, params)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit[0]
+    metrics, results = run_backtest(closes, signals, **params)
+    cache.put(key, metrics, results.value)
+    return metrics
+
+
+def evict(path: str) -> None:
+    """Drop a price file from this process's caches."""
+    key = str(Path(path).resolve())
+    _frames.pop(key, None)
+    _closes.pop(key, None)
+
+
+def execute(job: Dict[str, Any]) -> Any:
+    """Run one job dict in the current process."""
+    op = job.get("op")
+    if op == "strategy":
+        return run_strategy_job(job["strategy"], job["prices"], job.get("n_rows"))
+    if op == "backtest":
+        return run_backtest_job(job["prices"], job["signals"], job.get("params"), job.get("cache"))
+    if op == "pipeline":
+        # strategy then backtest on the same file; evict=True keeps one-off files from piling up
+        try:
+            signals = run_strategy_job(job["strategy"], job["prices"])
+            return run_backtest_job(job["prices"], signals, job.get("params"))
+        finally:
+            if job.get("evict"):
+                evict(job["prices"])
+    raise ValueError(f"Unknown job op {op!r}")
+
+
+def _execute_indexed(item: Tuple[int, Dict[str, Any]]) -> Tuple[int, str, Any]:
+    i, job = item
+    try:
+        return i, "ok", execute(job)
+    except Exception as e:  # reported per job so one bad input does not stop the rest
+        return i, "error", f"{type(e).__name__}: {e}"
+
+
+def _warm(strategies: Sequence[str], prices: Sequence[str]) -> None:
+    for path in strategies:
+        strategy_module(path)
+    for path in prices:
+        close_frame(path)
+
+
+class StrategyWorkerPool:
+    """
+    Process pool whose workers keep modules and price data resident between jobs.
+
+    Preloading happens in the parent before the workers fork, so they start
+    warm and share the price pages copy-on-write.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        preload_strategies: Sequence[str] = (),
+        preload_prices: Sequence[str] = (),
+        maxtasksperchild: Optional[int] = None,
+    ) -> None:
+        strategies = [str(Path(p).resolve()) for p in preload_strategies]
+        prices = [str(Path(p).resolve()) for p in preload_prices]
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        if ctx.get_start_method() == "fork":
+            _warm(strategies, prices)
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = ctx.Pool(
+            self.workers, initializer=_warm, initargs=(strategies, prices), maxtasksperchild=maxtasksperchild
+        )
+
+    def run(self, jobs: Sequence[Dict[str, Any]]) -> List[Any]:
+        """Run jobs across the workers; results come back in job order."""
+        return self._pool.map(execute, [_absolute(job) for job in jobs], chunksize=1)
+
+    def imap(self, jobs: Iterable[Dict[str, Any]]) -> Iterator[Tuple[int, str, Any]]:
+        """
+        Yield (job index, "ok" | "error", result or message) as jobs finish.
+
+        Failures come back as "error" entries instead of raising.
+        """
+        items = ((i, _absolute(job)) for i, job in enumerate(jobs))
+        return self._pool.imap_unordered(_execute_indexed, items, chunksize=1)
+
+    def submit(
+        self,
+        job: Dict[str, Any],
+        callback: Optional[Callable[[Any], None]] = None,
+        error_callback: Optional[Callable[[BaseException], None]] = None,
+    ) -> AsyncResult:
+        """Queue one job; the callbacks run on the pool's result thread."""
+        return self._pool.apply_async(execute, (_absolute(job),), callback=callback, error_callback=error_callback)
+
+    def close(self) -> None:
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self) -> StrategyWorkerPool:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def _absolute(job: Dict[str, Any]) -> Dict[str, Any]:
+    # Clients and workers may not share a working directory.
+    job = dict(job)
+    for field in ("strategy", "prices", "signals", "cache"):
+        if isinstance(job.get(field), str):
+            job[field] = str(Path(job[field]).resolve())
+    return job
+
+
+def _handle(conn: Connection, pool: StrategyWorkerPool, stop: threading.Event, address: str, key: bytes) -> None:
+    with conn:
+        while True:
+            try:
+                msg = conn.recv()
+            except EOFError:
+                return
+            if msg == "shutdown":
+                stop.set()
+                conn.send(("ok", None))
+                # wake the accept() loop so it sees the stop flag
+                with contextlib.suppress(OSError):
+                    Client(address, family="AF_UNIX", authkey=key).close()
+                return
+            try:
+                conn.send(("ok", pool.run(msg)))
+            except Exception as e:  # report job failures to the client, keep serving
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def _daemon_alive(address: str, key: bytes) -> bool:
+    try:
+        Client(address, family="AF_UNIX", authkey=key).close()
+    except (FileNotFoundError, ConnectionRefusedError):
+        return False
+    except (OSError, EOFError, multiprocessing.AuthenticationError):
+        return True  # something answers, just not to our key
+    return True
+
+
+def serve(address: Optional[str], pool: StrategyWorkerPool, key: Optional[bytes] = None) -> None:
+    """
+    Accept job batches on a Unix socket until a client sends "shutdown".
+
+    A socket file left by a daemon that died is replaced; one that a live
+    daemon still answers on is not.
+    """
+    address = address or default_socket()
+    key = authkey() if key is None else key
+    if os.path.exists(address):
+        if _daemon_alive(address, key):
+            raise RuntimeError(f"A worker daemon is already listening on {address}")
+        os.unlink(address)
+    stop = threading.Event()
+    with Listener(address, family="AF_UNIX", authkey=key) as listener:
+        while not stop.is_set():
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                continue
+            if stop.is_set():
+                conn.close()
+                break
+            threading.Thread(target=_handle, args=(conn, pool, stop, address, key), daemon=True).start()
+
+
+class WorkerClient:
+    """Client side of the socket daemon; one connection, batches run in parallel on the server."""
+
+    def __init__(self, address: Optional[str] = None, key: Optional[bytes] = None) -> None:
+        self._conn = Client(address or default_socket(), family="AF_UNIX", authkey=authkey() if key is None else key)
+
+    def run(self, jobs: Sequence[Dict[str, Any]]) -> List[Any]:
+        self._conn.send([_absolute(job) for job in jobs])
+        status, payload = self._conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Worker job failed: {payload}")
+        return payload
+
+    def run_strategy(self, strategy: str, prices: str, n_rows: Optional[int] = None) -> CodedSignals:
+        return self.run([{"op": "strategy", "strategy": strategy, "prices": prices, "n_rows": n_rows}])[0]
+
+    def backtest(self, prices: str, signals: Union[str, CodedSignals], **params: Any) -> Dict[str, float]:
+        return self.run([{"op": "backtest", "prices": prices, "signals": signals, "params": params}])[0]
+
+    def shutdown(self) -> None:
+        self._conn.send("shutdown")
+        self._conn.recv()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> WorkerClient:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Persistent strategy/backtest worker daemon")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_serve = sub.add_parser("serve", help="Start the daemon")
+    p_serve.add_argument("--socket", default=None, help="Unix socket path (default: workers.sock in the per-user runtime directory)")
+    p_serve.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    p_serve.add_argument("--preload", nargs="*", default=[], help="Strategy files to import up front")
+    p_serve.add_argument("--prices", nargs="*", default=[], help="Price files to keep resident")
+    instrument.add_argument(p_serve)
+    p_stop = sub.add_parser("shutdown", help="Stop a running daemon")
+    p_stop.add_argument("--socket", default=None, help="Unix socket path (default: workers.sock in the per-user runtime directory)")
+    args = parser.parse_args()
+
+    if args.command == "shutdown":
+        with WorkerClient(args.socket) as client:
+            client.shutdown()
+        return
+
+    address = args.socket or default_socket()
+    if os.path.exists(address) and _daemon_alive(address, authkey()):
+        parser.error(f"a worker daemon is already listening on {address}")
+    # with --instrument the report covers every job the workers ran, printed on shutdown
+    with instrument.session(args.instrument, args.instrument_top, name="serve"), StrategyWorkerPool(args.workers, args.preload, args.prices) as pool:
+        print(f"Serving {pool.workers} workers on {address}")
+        serve(address, pool)
+    if os.path.exists(address):
+        os.unlink(address)
+
+
+if __name__ == "__main__":
+    main()